@@ -0,0 +1,340 @@
+"""Benchmark the query and download hot paths against the mock server.
+
+Each operation runs in a fresh process with a new client, so nothing is cached
+between runs, against a mock server (see mock_server.py) built at each scale.
+For every operation the wall time, the round trips to the server, the bytes
+sent and received, and the peak memory growth of the process are reported.
+
+Round trips and bytes don't depend on the machine, so they catch a change that
+makes more or larger requests even where timings are noisy. Save a run with
+--save and compare later runs against it with --baseline to fail on regressions:
+
+    python benchmarks/hot_paths.py --scale small medium --save baseline.json
+    python benchmarks/hot_paths.py --scale small medium --baseline baseline.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+from mock_server import MockServer, MockData
+
+# mock data sizes: studies and volumes per study, jobs run on the benchmarked volume,
+# job ids polled at once, and rows in each job result
+SCALES = {
+    "small": {"studies": 10, "volumes": 10, "jobs": 100, "poll_jobs": 100, "rows": 10000},
+    "medium": {"studies": 100, "volumes": 100, "jobs": 1000, "poll_jobs": 1000, "rows": 1000000},
+    "large": {
+        "studies": 100,
+        "volumes": 1000,
+        "jobs": 10000,
+        "poll_jobs": 10000,
+        "rows": 10000000,
+    },
+}
+
+OPERATIONS = [
+    "get_study_id",
+    "load_and_hash_volume",
+    "get_volume_jobs",
+    "poll_job_status",
+    "request_to_df",
+    "download_job_result",
+    "download_to_file",
+]
+
+# metrics compared against a baseline, round trips must not grow at all
+METRICS = ["seconds", "requests", "bytes", "peak_mib"]
+
+
+def parse_args(args):
+    """Get arguments."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-s",
+        "--scale",
+        help="Optional, data scale(s) to run, {}. Default: small".format(", ".join(SCALES)),
+        nargs="+",
+        choices=list(SCALES),
+        default=["small"],
+    )
+    parser.add_argument(
+        "-o",
+        "--operation",
+        help="Optional, operation(s) to run. Default: all",
+        nargs="+",
+        choices=OPERATIONS,
+        default=OPERATIONS,
+    )
+    parser.add_argument(
+        "-r", "--repeat", help="Optional, runs per operation. Default: 3", type=int, default=3
+    )
+    parser.add_argument(
+        "--latency",
+        help="Optional, seconds the server adds to every request. Default: 0",
+        type=float,
+        default=0.0,
+    )
+    parser.add_argument(
+        "--save", help="Optional, write the results to this json file", default=None
+    )
+    parser.add_argument(
+        "--baseline",
+        help="Optional, json file saved with --save to compare against, fails on regressions",
+        default=None,
+    )
+    parser.add_argument(
+        "--tolerance",
+        help="Optional, allowed growth of seconds, bytes, and peak memory over the baseline. Default: 0.25",
+        type=float,
+        default=0.25,
+    )
+    # used internally to run one operation in a child process
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    parser.add_argument("--fixture", help=argparse.SUPPRESS)
+
+    return parser.parse_args(args)
+
+
+def build_server(scale, latency):
+    """Start a mock server with the data of a scale. The benchmarked study is the last one,
+    so resolving its name pages through every study, and its first volume gets the jobs.
+    Returns the server and the fixture the operations run on."""
+
+    sizes = SCALES[scale]
+    data = MockData(
+        n_orgs=1,
+        n_studies=sizes["studies"],
+        n_volumes=sizes["volumes"],
+        n_jobs=1,
+        n_rows=sizes["rows"],
+    )
+
+    study = data.orgs[0]["_studies"][-1]
+    volume = study["_volumes"][0]
+    hash_job = volume["_jobs"][0]["id"]
+
+    # list and hash jobs, one a minute, all completed
+    for i in range(sizes["jobs"]):
+        operation = "VOLUME_HASH" if i % 2 else "VOLUME_LIST"
+        data.make_job(volume, operation, datetime(2024, 2, 1) + timedelta(minutes=i))
+
+    fixture = {
+        "study_name": study["name"],
+        "volume_id": volume["id"],
+        "hash_job": hash_job,
+        "job_ids": [job["id"] for job in volume["_jobs"][: sizes["poll_jobs"]]],
+    }
+
+    return MockServer(data, latency=latency).start(), fixture
+
+
+def reset_peak_memory():
+    """Reset the peak resident memory of this process to its current size, on linux.
+    A child process otherwise starts with the peak of the parent it was forked from."""
+
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_memory():
+    """Get the peak resident memory of this process in bytes."""
+
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    # ru_maxrss is KiB on linux and bytes on macos
+    scale = 1 if sys.platform == "darwin" else 1024
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def run_operation(operation, fixture):
+    """Run an operation once with a new client and return its seconds and peak memory growth."""
+
+    import dewrangle as qf
+
+    # load the lazily imported modules first, their cost is measured by import_time.py
+    import requests  # noqa: F401
+    import dewrangle.jobs  # noqa: F401
+    import dewrangle.results  # noqa: F401
+    import dewrangle.download  # noqa: F401
+
+    client = qf.create_gql_client(
+        fixture["url"],
+        api_key="mock",
+        schema=None,
+        result_cache_size=0,
+        volume_index_to_disk=False,
+    )
+    dw = qf.AsyncDewrangleClient(client, api_key="mock", rest_endpoint=fixture["rest_url"])
+
+    async def download(tmp_dir):
+        async with dw:
+            if operation == "download_job_result":
+                await dw.download_job_result(fixture["hash_job"])
+            else:
+                await dw.download_job_result_to_file(
+                    fixture["hash_job"], os.path.join(tmp_dir, "result.csv"), workers=4
+                )
+
+    reset_peak_memory()
+    base = peak_memory()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+
+        if operation == "get_study_id":
+            with client:
+                qf.get_study_id(client, fixture["study_name"])
+        elif operation == "load_and_hash_volume":
+            with client:
+                job_id = qf.load_and_hash_volume(
+                    "bucket-new-{}".format(os.getpid()),
+                    fixture["study_name"],
+                    "us-east-1",
+                    client=client,
+                )
+            # errors are printed and return None, a failed run must not pass as a fast one
+            if job_id is None:
+                raise RuntimeError("load_and_hash_volume returned no job id")
+        elif operation == "get_volume_jobs":
+            with client:
+                qf.get_volume_jobs(client, fixture["volume_id"])
+        elif operation == "poll_job_status":
+            with client:
+                jobs, errors = qf.get_job_info_many(fixture["job_ids"], client=client)
+            missing = [job_id for job_id in fixture["job_ids"] if job_id not in jobs]
+            if errors or missing:
+                raise RuntimeError(
+                    "poll_job_status missed {} job(s): {}".format(
+                        len(missing), list(errors.values())[:3]
+                    )
+                )
+        elif operation == "request_to_df":
+            qf.request_to_df(
+                fixture["rest_url"] + fixture["hash_job"] + "/result",
+                headers={"X-Api-Key": "mock"},
+            )
+        else:
+            asyncio.run(download(tmp_dir))
+
+        seconds = time.perf_counter() - start
+
+    peak = peak_memory() - base
+
+    return {"seconds": seconds, "peak_mib": peak / 2**20}
+
+
+def compare(results, baseline, tolerance):
+    """List the metrics that regressed from the baseline."""
+
+    regressions = []
+
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        for metric in METRICS:
+            old = baseline[key][metric]
+            allowed = old if metric == "requests" else old * (1 + tolerance)
+            # ignore noise in tiny timings and memory
+            if metric in ["seconds", "peak_mib"]:
+                allowed = max(allowed, old + 0.05 if metric == "seconds" else old + 5)
+            if result[metric] > allowed:
+                regressions.append(
+                    "{} {}: {:.6g}, baseline {:.6g}".format(key, metric, result[metric], old)
+                )
+
+    return regressions
+
+
+def main(args):
+    """Main, take args, run benchmark."""
+    args = parse_args(args[1:])
+
+    if args.run:
+        with open(args.fixture) as f:
+            fixture = json.load(f)
+        print(json.dumps(run_operation(args.run, fixture)))
+        return
+
+    results = {}
+
+    print(
+        "{:<8}{:<24}{:>10}{:>10}{:>16}{:>12}".format(
+            "scale", "operation", "seconds", "requests", "MiB transferred", "peak MiB"
+        )
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for scale in args.scale:
+            server, fixture = build_server(scale, args.latency)
+            fixture.update(url=server.url, rest_url=server.rest_url)
+            fixture_path = os.path.join(tmp_dir, "{}.json".format(scale))
+            with open(fixture_path, "w") as f:
+                json.dump(fixture, f)
+
+            with server:
+                for operation in args.operation:
+                    runs = []
+                    for _ in range(args.repeat):
+                        before = dict(server.stats)
+                        child = subprocess.run(
+                            [sys.executable, __file__, "--run", operation, "--fixture", fixture_path],
+                            capture_output=True,
+                            text=True,
+                        )
+                        # a failed operation fails the benchmark instead of being timed
+                        if child.returncode != 0:
+                            sys.exit(
+                                "{}/{} failed:\n{}".format(scale, operation, child.stderr)
+                            )
+                        run = json.loads(child.stdout.splitlines()[-1])
+                        stats = {key: server.stats[key] - before[key] for key in before}
+                        run["requests"] = stats["graphql"] + stats["rest"]
+                        run["bytes"] = stats["bytes_sent"] + stats["bytes_received"]
+                        runs.append(run)
+
+                    # report the fastest run
+                    best = min(runs, key=lambda run: run["seconds"])
+                    results["{}/{}".format(scale, operation)] = best
+                    print(
+                        "{:<8}{:<24}{:>10.3f}{:>10}{:>16.2f}{:>12.1f}".format(
+                            scale,
+                            operation,
+                            best["seconds"],
+                            best["requests"],
+                            best["bytes"] / 2**20,
+                            best["peak_mib"],
+                        )
+                    )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("FAIL: {}".format(regression))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main(sys.argv)
@@ -0,0 +1,114 @@
+"""Benchmark the cold start time of importing dewrangle.
+
+Each target is imported in a fresh process, so nothing is cached between runs,
+and the heavy modules it loaded are reported. The run fails if a target loads a
+module it shouldn't, e.g. pandas for the query functions, or with --max-seconds
+if the query functions take longer than that to import, so cron-driven scripts
+keep starting quickly.
+"""
+import sys
+import json
+import argparse
+import subprocess
+
+HEAVY_MODULES = ["gql", "graphql", "aiohttp", "requests", "numpy", "pandas", "pyarrow"]
+
+# code run for each target, and the heavy modules it must not load
+TARGETS = {
+    "package": ("import dewrangle", HEAVY_MODULES),
+    "query functions": (
+        "import dewrangle; dewrangle.get_job_info_many",
+        ["requests", "numpy", "pandas", "pyarrow"],
+    ),
+    # pandas loads pyarrow itself when it is installed
+    "dataframes": ("import dewrangle; dewrangle.diff_results", ["requests"]),
+}
+
+
+def parse_args(args):
+    """Get arguments."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-r", "--repeat", help="Optional, runs per target. Default: 5", type=int, default=5
+    )
+    parser.add_argument(
+        "--max-seconds",
+        help="Optional, fail if importing the query functions takes longer. Default: no limit",
+        type=float,
+        default=None,
+    )
+    # used internally to run one target in a child process
+    parser.add_argument("--target", help=argparse.SUPPRESS)
+
+    return parser.parse_args(args)
+
+
+def run_target(target):
+    """Run the target's code once and print the seconds it took and the heavy modules loaded."""
+
+    import time
+
+    code = TARGETS[target][0]
+
+    start = time.perf_counter()
+    exec(code, {})
+    seconds = time.perf_counter() - start
+
+    loaded = [module for module in HEAVY_MODULES if module in sys.modules]
+    print(json.dumps({"seconds": seconds, "loaded": loaded}))
+
+
+def main(args):
+    """Main, take args, run benchmark."""
+    args = parse_args(args[1:])
+
+    if args.target:
+        run_target(args.target)
+        return
+
+    failures = []
+
+    print("{:<18}{:>12}  {}".format("target", "seconds", "heavy modules loaded"))
+    for target, (_, forbidden) in TARGETS.items():
+        runs = []
+        for _ in range(args.repeat):
+            out = subprocess.run(
+                [sys.executable, __file__, "--target", target],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            runs.append(json.loads(out))
+
+        # report the fastest run
+        best = min(runs, key=lambda run: run["seconds"])
+        print(
+            "{:<18}{:>12.3f}  {}".format(
+                target, best["seconds"], ", ".join(best["loaded"]) or "-"
+            )
+        )
+
+        unexpected = [module for module in best["loaded"] if module in forbidden]
+        if unexpected:
+            failures.append("{} loaded {}".format(target, ", ".join(unexpected)))
+        if (
+            target == "query functions"
+            and args.max_seconds is not None
+            and best["seconds"] > args.max_seconds
+        ):
+            failures.append(
+                "{} took {:.3f}s, more than {:.3f}s".format(
+                    target, best["seconds"], args.max_seconds
+                )
+            )
+
+    for failure in failures:
+        print("FAIL: {}".format(failure))
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main(sys.argv)
@@ -0,0 +1,696 @@
+"""Local stand-in for the Dewrangle GraphQL and REST APIs.
+
+Serves the subset of the API the query functions use, built from
+mock_schema.graphql, which is written from the package's queries: organizations, studies, volumes,
+credentials, billing groups, jobs with their children, the mutations that
+create studies and volumes and start jobs, and the REST job result endpoint
+with range requests. Data is synthetic and sized from the command line, so
+performance work can be measured offline, from a handful of studies
+
+    python benchmarks/mock_server.py --studies 10
+
+up to a hundred thousand volumes and ten million row results
+
+    python benchmarks/mock_server.py --studies 100 --volumes 1000 --rows 10000000
+
+Latency, HTTP and GraphQL errors, dropped downloads, and the page size limit
+are configurable to see how the client behaves against a slow or flaky server.
+Point a client at it with
+
+    client = create_gql_client("http://localhost:8765/api/graphql", api_key="mock")
+    AsyncDewrangleClient(client, api_key="mock", rest_endpoint="http://localhost:8765/api/rest/jobs/")
+
+Result rows are generated on the fly with a fixed width, so any byte range of
+a large result is rendered without keeping the result in memory.
+"""
+import os
+import sys
+import time
+import json
+import base64
+import socket
+import asyncio
+import argparse
+import threading
+import random
+import zlib
+import functools
+from datetime import datetime, timedelta
+import numpy as np
+from aiohttp import web
+from graphql import build_schema, graphql
+
+# schema served by the mock, see the note at the top of the file
+MOCK_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_schema.graphql")
+
+RESULT_HEADER = b"path,size,etag,md5,sha1,sha256,crc32c\n"
+
+# rows rendered at a time when streaming a result
+CHUNK_ROWS = 16384
+
+# two hex digits of each byte value, read back from memory as ascii
+HEX_PAIRS = np.frombuffer(b"".join(b"%02x" % i for i in range(256)), dtype=np.uint16)
+
+MASK = 2**64 - 1
+
+
+def encode_cursor(position):
+    """Cursor of an item's position in a connection."""
+    return base64.b64encode("cursor:{}".format(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Position of the item a cursor points to."""
+    return int(base64.b64decode(cursor).decode().split(":")[1])
+
+
+def format_time(dt):
+    """Format a datetime like Dewrangle timestamps, e.g. 2024-01-01T00:00:00.000Z."""
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def mix(values, salt):
+    """splitmix64 of an array of uint64 values, a cheap deterministic stand-in for a hash."""
+
+    z = values + np.uint64((salt * 0x9E3779B97F4A7C15) & MASK)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+
+    return z ^ (z >> np.uint64(31))
+
+
+def decimal_columns(values, width):
+    """Zero padded decimal digits of uint64 values, one row of ascii bytes per value."""
+
+    powers = np.uint64(10) ** np.arange(width - 1, -1, -1, dtype=np.uint64)
+
+    return ((values[:, None] // powers) % np.uint64(10) + np.uint64(48)).astype(np.uint8)
+
+
+def hex_columns(values, width, salt):
+    """Hex digits of a hash of the values, width digits per value."""
+
+    words = [mix(values, salt + word) for word in range((width + 15) // 16)]
+    # big endian bytes of the hash words, each byte looked up as two digits
+    hash_bytes = np.stack(words, axis=1).astype(">u8").view(np.uint8)
+
+    return HEX_PAIRS[hash_bytes].view(np.uint8)[:, :width]
+
+
+def constant_columns(text, rows):
+    """The same ascii bytes on every row."""
+    return np.broadcast_to(np.frombuffer(text, dtype=np.uint8), (rows, len(text)))
+
+
+class SyntheticResult:
+    """A hash result csv of a volume, rendered on demand. Every row has the same width,
+    so the rows behind any byte range are found with arithmetic. Sizes and hashes are
+    rendered once for a block of CHUNK_ROWS rows and repeat after it, only the paths
+    are rendered for every row, which keeps rendering faster than the client reads."""
+
+    def __init__(self, volume_name, rows):
+        self.prefix = "s3://{}/dir".format(volume_name).encode()
+        self.rows = rows
+        self.block = self.render_block(zlib.crc32(volume_name.encode()) * 8)
+        self.row_width = self.block.shape[1]
+        self.size = len(RESULT_HEADER) + rows * self.row_width
+
+        # where the directory and file numbers of the path start
+        self.dir_column = len(self.prefix)
+        self.file_column = self.dir_column + len(b"000/file_")
+
+    def render_block(self, seed):
+        """Render the first rows, up to CHUNK_ROWS, as an array of ascii bytes."""
+
+        index = np.arange(max(min(self.rows, CHUNK_ROWS), 1), dtype=np.uint64)
+        rows = len(index)
+
+        columns = [
+            constant_columns(self.prefix, rows),
+            decimal_columns(index % np.uint64(1000), 3),
+            constant_columns(b"/file_", rows),
+            decimal_columns(index, 10),
+            constant_columns(b".cram,", rows),
+            decimal_columns(mix(index, seed) % np.uint64(10**12), 12),
+        ]
+        for salt, width in enumerate([32, 32, 40, 64, 8], start=1):
+            columns.append(constant_columns(b",", rows))
+            columns.append(hex_columns(index, width, seed + salt * 4))
+        columns.append(constant_columns(b"\n", rows))
+
+        return np.concatenate(columns, axis=1)
+
+    def render_rows(self, start, stop):
+        """Render rows start to stop as csv lines."""
+
+        index = np.arange(start, stop, dtype=np.uint64)
+        out = self.block[index % np.uint64(len(self.block))]
+        out[:, self.dir_column : self.dir_column + 3] = decimal_columns(
+            index % np.uint64(1000), 3
+        )
+        out[:, self.file_column : self.file_column + 10] = decimal_columns(index, 10)
+
+        return out.tobytes()
+
+    def iter_bytes(self, start, stop):
+        """Yield the bytes from start up to stop in chunks."""
+
+        header = len(RESULT_HEADER)
+        if start < header:
+            yield RESULT_HEADER[start:stop]
+            start = header
+
+        for first in range((start - header) // self.row_width, self.rows, CHUNK_ROWS):
+            if start >= stop:
+                return
+            chunk_start = header + first * self.row_width
+            last = min(first + CHUNK_ROWS, self.rows)
+            chunk = self.render_rows(first, last)
+            chunk = chunk[start - chunk_start : stop - chunk_start]
+            start += len(chunk)
+            yield chunk
+
+
+@functools.lru_cache(maxsize=8)
+def synthetic_result(volume_name, rows):
+    """The synthetic result of a volume's jobs, the last few kept for repeated downloads."""
+    return SyntheticResult(volume_name, rows)
+
+
+class MockData:
+    """Synthetic Dewrangle data: orgs, each with studies, each with volumes and a credential,
+    and n_jobs completed list and hash jobs per volume. Nodes are dictionaries keyed by
+    schema field, with connections and internal links in _ prefixed keys."""
+
+    def __init__(self, n_orgs=1, n_studies=10, n_volumes=10, n_jobs=1, n_rows=1000):
+        self.nodes = {}
+        self.counter = 0
+        self.n_rows = n_rows
+        self.orgs = []
+        # result csv bodies that replace the synthetic result of a job, job id: bytes
+        self.results = {}
+
+        start = datetime(2024, 1, 1)
+        for o in range(n_orgs):
+            org = self.add("Organization", name="org-{}".format(o), _studies=[], _billing_groups=[])
+            self.orgs.append(org)
+            org["_billing_groups"].append(self.add("BillingGroup", name="billing-{}".format(o)))
+
+            for s in range(n_studies):
+                study = self.add_study(org, "study-{}-{}".format(o, s))
+                study["_credentials"].append(
+                    self.add("Credential", name="credential-{}-{}".format(o, s), key="AKIAMOCK")
+                )
+                for v in range(n_volumes):
+                    volume = self.add_volume(study, "bucket-{}-{}-{}".format(o, s, v))
+                    for j in range(n_jobs):
+                        self.make_job(volume, "VOLUME_LIST_AND_HASH", start + timedelta(hours=j))
+
+    def add(self, typename, **fields):
+        """Add a node with a new id."""
+
+        self.counter += 1
+        node = {"__typename": typename, "id": "{}-{}".format(typename.lower(), self.counter)}
+        node.update(fields)
+        self.nodes[node["id"]] = node
+
+        return node
+
+    def add_study(self, org, name):
+        """Add a study to an organization."""
+
+        study = self.add(
+            "Study",
+            name=name,
+            globalId="SD_{:08X}".format(self.counter),
+            organization=org,
+            _volumes=[],
+            _credentials=[],
+        )
+        org["_studies"].append(study)
+
+        return study
+
+    def add_volume(self, study, name):
+        """Add a volume to a study."""
+
+        volume = self.add("Volume", name=name, _study=study, _jobs=[])
+        study["_volumes"].append(volume)
+
+        return volume
+
+    def make_job(self, volume, operation, created, seconds=0):
+        """Add a job run on a volume, completing seconds after it was created.
+        A list and hash job also gets list and hash children."""
+
+        def add_job(operation, parent=None):
+            job = self.add(
+                "Job",
+                operation=operation,
+                createdAt=format_time(created),
+                completedAt=None,
+                parentJob=parent,
+                children=[],
+                billingGroup=None,
+                cost={"cents": 10 if parent is None else 5},
+                _errors=[],
+                _volume=volume,
+                _done_at=created + timedelta(seconds=seconds),
+            )
+            volume["_jobs"].append(job)
+            if parent is not None:
+                parent["children"].append(job)
+
+            return job
+
+        job = add_job(operation)
+        if operation == "VOLUME_LIST_AND_HASH":
+            for child in ["VOLUME_LIST", "VOLUME_HASH"]:
+                add_job(child, job)
+
+        return job
+
+    def result(self, job_id):
+        """Get the result of a job, bytes or a SyntheticResult, or None if there is no such job."""
+
+        if job_id in self.results:
+            return self.results[job_id]
+
+        job = self.nodes.get(job_id)
+        if job is None or job["__typename"] != "Job":
+            return None
+
+        return synthetic_result(job["_volume"]["name"], self.n_rows)
+
+
+class MockServer:
+    """Serve MockData over the GraphQL and REST endpoints.
+    Each request waits latency seconds, and error_rate of requests fail with error_status,
+    graphql_error_rate of GraphQL requests with a GraphQL error instead. Connections return
+    at most max_page_size items per page. Jobs started by mutations complete after
+    job_seconds. Downloads ignore range requests without ranges, and with drop_after the
+    first drops downloads are cut off after that many bytes. Request counts and the bytes of
+request and response bodies are kept in stats.
+    Use start to run the server in a background thread, e.g. from a benchmark:
+
+        with MockServer(MockData(n_studies=100)).start() as server:
+            client = create_gql_client(server.url, api_key="mock")
+    """
+
+    def __init__(
+        self,
+        data=None,
+        latency=0.0,
+        error_rate=0.0,
+        error_status=503,
+        graphql_error_rate=0.0,
+        max_page_size=100,
+        job_seconds=0,
+        ranges=True,
+        drop_after=None,
+        drops=0,
+        seed=0,
+    ):
+        self.data = MockData() if data is None else data
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.graphql_error_rate = graphql_error_rate
+        self.max_page_size = max_page_size
+        self.job_seconds = job_seconds
+        self.ranges = ranges
+        self.drop_after = drop_after
+        self.drops = drops
+        self.random = random.Random(seed)
+        self.stats = {"graphql": 0, "rest": 0, "errors": 0, "bytes_received": 0, "bytes_sent": 0}
+        self.schema = self.build_schema()
+        self.port = None
+        self.loop = None
+        self.runner = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return "http://localhost:{}/api/graphql".format(self.port)
+
+    @property
+    def rest_url(self):
+        return "http://localhost:{}/api/rest/jobs/".format(self.port)
+
+    def connection(self, items, first=None, after=None):
+        """Page of a Relay connection, capped at max_page_size items."""
+
+        if self.max_page_size is not None:
+            first = self.max_page_size if first is None else min(first, self.max_page_size)
+
+        start = 0 if after is None else decode_cursor(after) + 1
+        stop = len(items) if first is None else min(len(items), start + first)
+        edges = [{"cursor": encode_cursor(i), "node": items[i]} for i in range(start, stop)]
+
+        return {
+            "edges": edges,
+            "pageInfo": {
+                "hasNextPage": stop < len(items),
+                "hasPreviousPage": start > 0,
+                "startCursor": edges[0]["cursor"] if edges else None,
+                "endCursor": edges[-1]["cursor"] if edges else None,
+            },
+        }
+
+    def build_schema(self):
+        """Build the mock schema with resolvers over the mock data."""
+
+        data = self.data
+        with open(MOCK_SCHEMA_PATH) as f:
+            schema = build_schema(f.read())
+
+        def connection_resolver(key):
+            def resolve(node, info, first=None, after=None):
+                return self.connection(node[key], first, after)
+
+            return resolve
+
+        def completed_at(job, info):
+            # jobs complete once their time has come
+            if job["completedAt"] is None and datetime.utcnow() >= job["_done_at"]:
+                job["completedAt"] = format_time(job["_done_at"])
+            return job["completedAt"]
+
+        def organization_users(user, info, first=None, after=None):
+            org_users = [
+                {"__typename": "OrganizationUser", "id": "orguser-" + org["id"], "organization": org}
+                for org in data.orgs
+            ]
+            return self.connection(org_users, first, after)
+
+        fields = schema.type_map
+        fields["Organization"].fields["studies"].resolve = connection_resolver("_studies")
+        fields["Organization"].fields["billingGroups"].resolve = connection_resolver("_billing_groups")
+        fields["Study"].fields["volumes"].resolve = connection_resolver("_volumes")
+        fields["Study"].fields["credentials"].resolve = connection_resolver("_credentials")
+        fields["Volume"].fields["jobs"].resolve = connection_resolver("_jobs")
+        fields["Job"].fields["errors"].resolve = connection_resolver("_errors")
+        fields["Job"].fields["completedAt"].resolve = completed_at
+        fields["User"].fields["organizationUsers"].resolve = organization_users
+
+        query = schema.query_type.fields
+        query["node"].resolve = lambda root, info, id: data.nodes.get(id)
+        query["viewer"].resolve = lambda root, info: {"__typename": "User", "id": "user-1"}
+
+        def error(message):
+            return [{"__typename": "MutationError", "message": message, "field": None}]
+
+        def volume_create(root, info, input):
+            study = data.nodes.get(input["studyId"])
+            if study is None or study["__typename"] != "Study":
+                return {"errors": error("Study not found"), "volume": None}
+            return {"errors": None, "volume": data.add_volume(study, input["name"])}
+
+        def study_create(root, info, input):
+            org = data.nodes.get(input["organizationId"])
+            if org is None or org["__typename"] != "Organization":
+                return {"errors": error("Organization not found"), "study": None}
+            return {"errors": None, "study": data.add_study(org, input["name"])}
+
+        def volume_job(operation):
+            def resolve(root, info, id, input=None):
+                volume = data.nodes.get(id)
+                if volume is None or volume["__typename"] != "Volume":
+                    return {"errors": error("Volume not found"), "job": None}
+                job = data.make_job(volume, operation, datetime.utcnow(), self.job_seconds)
+                return {"errors": None, "job": job}
+
+            return resolve
+
+        def volume_delete(root, info, id):
+            volume = data.nodes.get(id)
+            if volume is None or volume["__typename"] != "Volume":
+                return {"errors": error("Volume not found")}
+            del data.nodes[id]
+            volume["_study"]["_volumes"].remove(volume)
+            return {"errors": None}
+
+        mutation = schema.mutation_type.fields
+        mutation["volumeCreate"].resolve = volume_create
+        mutation["studyCreate"].resolve = study_create
+        mutation["volumeList"].resolve = volume_job("VOLUME_LIST")
+        mutation["volumeListAndHash"].resolve = volume_job("VOLUME_LIST_AND_HASH")
+        mutation["volumeDelete"].resolve = volume_delete
+
+        return schema
+
+    async def delay(self):
+        """Wait the latency, then return an error response for error_rate of requests."""
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=self.error_status, text="Injected error")
+
+        return None
+
+    async def graphql_handler(self, request):
+        """Run a GraphQL request against the mock schema."""
+
+        self.stats["graphql"] += 1
+        text = await request.text()
+        self.stats["bytes_received"] += len(text.encode())
+        body = json.loads(text)
+
+        response = await self.delay()
+        if response is not None:
+            return response
+
+        if self.graphql_error_rate and self.random.random() < self.graphql_error_rate:
+            self.stats["errors"] += 1
+            return web.json_response({"data": None, "errors": [{"message": "Injected error"}]})
+
+        result = await graphql(
+            self.schema,
+            body["query"],
+            variable_values=body.get("variables"),
+            operation_name=body.get("operationName"),
+        )
+        out = {"data": result.data}
+        if result.errors:
+            out["errors"] = [e.formatted for e in result.errors]
+
+        text = json.dumps(out)
+        self.stats["bytes_sent"] += len(text.encode())
+
+        return web.Response(text=text, content_type="application/json")
+
+    async def result_handler(self, request):
+        """Stream a job result, or the requested byte range of it."""
+
+        self.stats["rest"] += 1
+
+        response = await self.delay()
+        if response is not None:
+            return response
+
+        result = self.data.result(request.match_info["job_id"])
+        if result is None:
+            return web.Response(status=404, text="Job not found")
+
+        size = len(result) if isinstance(result, bytes) else result.size
+        start, stop = 0, size
+        status = 200
+        headers = {"Content-Type": "text/csv"}
+
+        byte_range = request.headers.get("Range")
+        if self.ranges:
+            headers["Accept-Ranges"] = "bytes"
+            if byte_range:
+                first, last = byte_range.split("=")[1].split("-")
+                start = int(first)
+                stop = min(int(last) + 1 if last else size, size)
+                if start >= size:
+                    return web.Response(
+                        status=416, headers={"Content-Range": "bytes */{}".format(size)}
+                    )
+                status = 206
+                headers["Content-Range"] = "bytes {}-{}/{}".format(start, stop - 1, size)
+
+        response = web.StreamResponse(status=status, headers=headers)
+        response.content_length = stop - start
+        await response.prepare(request)
+
+        # cut the download off part way through for the first drops downloads
+        limit = stop
+        if self.drop_after is not None and self.drops > 0 and stop - start > self.drop_after:
+            self.drops -= 1
+            limit = start + self.drop_after
+
+        if isinstance(result, bytes):
+            chunks = (result[i : min(i + 2**16, limit)] for i in range(start, limit, 2**16))
+        else:
+            chunks = result.iter_bytes(start, limit)
+
+        for chunk in chunks:
+            await response.write(chunk)
+            self.stats["bytes_sent"] += len(chunk)
+
+        if limit < stop:
+            request.transport.close()
+            return response
+
+        await response.write_eof()
+
+        return response
+
+    def app(self):
+        """Create the aiohttp application."""
+
+        app = web.Application(client_max_size=64 * 2**20)
+        app.router.add_post("/api/graphql", self.graphql_handler)
+        app.router.add_get("/api/rest/jobs/{job_id}/result", self.result_handler)
+
+        return app
+
+    def start(self, port=0):
+        """Serve in a background thread, on a free port by default."""
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("localhost", port))
+        self.port = sock.getsockname()[1]
+
+        self.loop = asyncio.new_event_loop()
+        self.runner = web.AppRunner(self.app())
+        self.loop.run_until_complete(self.runner.setup())
+        self.loop.run_until_complete(web.SockSite(self.runner, sock).start())
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+        return self
+
+    def stop(self):
+        """Stop a server started with start."""
+
+        if self.loop is None:
+            return
+
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def parse_args(args):
+    """Get arguments."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-p", "--port", help="Optional, port. Default: 8765", type=int, default=8765)
+    parser.add_argument(
+        "--orgs", help="Optional, number of organizations. Default: 1", type=int, default=1
+    )
+    parser.add_argument(
+        "--studies", help="Optional, studies per organization. Default: 10", type=int, default=10
+    )
+    parser.add_argument(
+        "--volumes", help="Optional, volumes per study. Default: 10", type=int, default=10
+    )
+    parser.add_argument(
+        "--jobs", help="Optional, list and hash jobs per volume. Default: 1", type=int, default=1
+    )
+    parser.add_argument(
+        "--rows", help="Optional, rows in each job result. Default: 1000", type=int, default=1000
+    )
+    parser.add_argument(
+        "--latency",
+        help="Optional, seconds added to every request. Default: 0",
+        type=float,
+        default=0.0,
+    )
+    parser.add_argument(
+        "--error-rate",
+        help="Optional, fraction of requests that fail with --error-status. Default: 0",
+        type=float,
+        default=0.0,
+    )
+    parser.add_argument(
+        "--error-status",
+        help="Optional, HTTP status of injected errors. Default: 503",
+        type=int,
+        default=503,
+    )
+    parser.add_argument(
+        "--graphql-error-rate",
+        help="Optional, fraction of GraphQL requests answered with a GraphQL error. Default: 0",
+        type=float,
+        default=0.0,
+    )
+    parser.add_argument(
+        "--page-size",
+        help="Optional, most items the server returns per page, 0 for no limit. Default: 100",
+        type=int,
+        default=100,
+    )
+    parser.add_argument(
+        "--job-seconds",
+        help="Optional, seconds until jobs started by mutations complete. Default: 0",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "--no-ranges",
+        help="Optional, ignore range requests for job results",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--drop-after",
+        help="Optional, cut result downloads off after this many bytes, see --drops",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--drops",
+        help="Optional, number of downloads cut off by --drop-after. Default: 1",
+        type=int,
+        default=1,
+    )
+    parser.add_argument("--seed", help="Optional, seed of injected errors. Default: 0", type=int, default=0)
+
+    return parser.parse_args(args)
+
+
+def main(args):
+    """Main, take args, run the server."""
+    args = parse_args(args[1:])
+
+    start = time.perf_counter()
+    data = MockData(args.orgs, args.studies, args.volumes, args.jobs, args.rows)
+    print(
+        "Built {} nodes in {:.1f}s".format(len(data.nodes), time.perf_counter() - start),
+        file=sys.stderr,
+    )
+
+    server = MockServer(
+        data,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        graphql_error_rate=args.graphql_error_rate,
+        max_page_size=args.page_size or None,
+        job_seconds=args.job_seconds,
+        ranges=not args.no_ranges,
+        drop_after=args.drop_after,
+        drops=args.drops,
+        seed=args.seed,
+    )
+
+    web.run_app(server.app(), host="localhost", port=args.port)
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main(sys.argv)
@@ -0,0 +1,137 @@
+"""Benchmark parsing a job result csv with each engine.
+
+Writes a synthetic hash result with the given number of rows and parses it with
+the old line splitting parser and each engine of dewrangle.results, each one in
+a fresh process so peak memory isn't shared between runs.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+import pandas as pd
+from dewrangle.results import parse_result_csv, has_pyarrow
+
+
+def parse_args(args):
+    """Get arguments."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-n",
+        "--rows",
+        help="Optional, number of rows in the result. Default: 1000000",
+        type=int,
+        default=1000000,
+    )
+    parser.add_argument(
+        "-r", "--repeat", help="Optional, runs per engine. Default: 3", type=int, default=3
+    )
+    # used internally to run one engine in a child process
+    parser.add_argument("--engine", help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+
+    return parser.parse_args(args)
+
+
+def write_result(path, rows):
+    """Write a synthetic hash result csv."""
+
+    rand = random.Random(0)
+    with open(path, "w") as f:
+        f.write("path,size,etag,md5,sha1,sha256,crc32c\n")
+        for i in range(rows):
+            f.write(
+                "s3://bucket/dir{}/file_{}.cram,{},{:032x},{:032x},{:040x},{:064x},{:08x}\n".format(
+                    i % 100,
+                    i,
+                    rand.getrandbits(40),
+                    rand.getrandbits(128),
+                    rand.getrandbits(128),
+                    rand.getrandbits(160),
+                    rand.getrandbits(256),
+                    rand.getrandbits(32),
+                )
+            )
+
+
+def split_lines(path):
+    """The line splitting parser the result download used before the parsing engines."""
+
+    my_data = []
+    with open(path, "rb") as f:
+        for line in f:
+            my_data.append(line.rstrip(b"\r\n").decode().split(","))
+
+    my_cols = my_data.pop(0)
+    return pd.DataFrame(my_data, columns=my_cols)
+
+
+def run_engine(engine, path):
+    """Parse the file once and print rows, seconds, and peak memory growth in MiB."""
+
+    # ru_maxrss is KiB on linux and bytes on macos
+    scale = 1 if sys.platform == "darwin" else 1024
+
+    with open(path, "rb") as f:
+        body = f.read()
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    start = time.perf_counter()
+    if engine == "split":
+        df = split_lines(path)
+    else:
+        df = parse_result_csv(body, engine)
+    seconds = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale - base
+    print(len(df), seconds, peak / 2**20)
+
+
+def main(args):
+    """Main, take args, run benchmark."""
+    args = parse_args(args[1:])
+
+    if args.engine:
+        run_engine(args.engine, args.file)
+        return
+
+    engines = ["split", "pandas"]
+    if has_pyarrow():
+        engines.append("pyarrow")
+    else:
+        print("pyarrow is not installed, skipping the pyarrow engine")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "result.csv")
+        write_result(path, args.rows)
+        print(
+            "{} rows, {:.1f} MiB csv".format(args.rows, os.path.getsize(path) / 2**20)
+        )
+        print("{:<10}{:>14}{:>12}{:>16}".format("engine", "rows/s", "seconds", "peak MiB"))
+
+        for engine in engines:
+            runs = []
+            for _ in range(args.repeat):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--engine", engine, "--file", path],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout.split()
+                runs.append((int(out[0]), float(out[1]), float(out[2])))
+
+            # report the fastest run
+            rows, seconds, peak = min(runs, key=lambda run: run[1])
+            print(
+                "{:<10}{:>14,.0f}{:>12.2f}{:>16.1f}".format(
+                    engine, rows / seconds, seconds, peak
+                )
+            )
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main(sys.argv)
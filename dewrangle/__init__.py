@@ -1 +1,64 @@
-from .query_functions import *
+"""Python API for connecting to Dewrangle.
+
+Submodules are imported the first time one of their names is used, so
+`import dewrangle` stays fast: the query functions load gql and aiohttp,
+and pandas and numpy are only loaded by the functions that return or parse
+dataframes.
+"""
+import importlib
+
+# names that live outside query_functions, and the submodule each comes from
+SUBMODULE_NAMES = {
+    "AsyncDewrangleClient": "async_client",
+    "parse_result_csv": "results",
+    "read_result": "results",
+    "convert_result_csv": "results",
+    "diff_results": "diff",
+    "diff_result_files": "diff",
+    "changed_prefixes": "diff",
+    "VolumeJobIndex": "jobs",
+    "job_operation": "jobs",
+}
+
+
+def __getattr__(name):
+    """Import the submodule a public name comes from the first time the name is used."""
+
+    if name == "__all__":
+        # from dewrangle import *
+        return public_names()
+
+    if name.startswith("_"):
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+    module = importlib.import_module(
+        "." + SUBMODULE_NAMES.get(name, "query_functions"), __name__
+    )
+    if hasattr(module, name):
+        value = getattr(module, name)
+    else:
+        # a submodule, e.g. dewrangle.utils
+        try:
+            value = importlib.import_module("." + name, __name__)
+        except ModuleNotFoundError:
+            raise AttributeError(
+                "module {!r} has no attribute {!r}".format(__name__, name)
+            ) from None
+
+    # later lookups find the name without calling __getattr__
+    globals()[name] = value
+
+    return value
+
+
+def public_names():
+    """List the names the package exports: everything in query_functions and SUBMODULE_NAMES."""
+
+    query_functions = importlib.import_module(".query_functions", __name__)
+    names = [name for name in vars(query_functions) if not name.startswith("_")]
+
+    return sorted(set(names) | set(SUBMODULE_NAMES))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(public_names()))
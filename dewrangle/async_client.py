@@ -0,0 +1,1894 @@
+"""Asyncio client to run Dewrangle Graphql queries over one long-lived session."""
+import os
+import sys
+import asyncio
+import time
+import tempfile
+import traceback
+from gql.transport.exceptions import TransportQueryError
+from .cache import ResolutionCache, VolumeIndex, RESOLUTION_TTL, VOLUME_INDEX_MAX_AGE
+from .download import download, CHUNK_SIZE, DOWNLOAD_TIMEOUT
+from .queries import get_query, get_nodes_query, get_bulk_mutation, fragment_type
+from .results import (
+    parse_result_csv,
+    pick_format,
+    require_pyarrow,
+    convert_result_csv,
+    FORMAT_EXTENSIONS,
+    save_result_csv,
+)
+from .utils import (
+    check_mutation_result,
+    pick_external_id,
+    create_gql_client,
+    create_rest_creds,
+    StudyContext,
+)
+
+# number of nodes requested per page of a connection
+PAGE_SIZE = 100
+
+# number of ids looked up in one aliased node query
+NODE_BATCH_SIZE = 50
+
+# number of mutations run in one aliased bulk request
+MUTATION_BATCH_SIZE = 50
+
+# job results downloaded at the same time
+DOWNLOAD_WORKERS = 8
+
+# seconds between job status checks
+POLL_MIN_INTERVAL = 5
+POLL_MAX_INTERVAL = 120
+
+
+def index_studies(studies):
+    """Index a dictionary of studies by id, global id, and name."""
+
+    index = {}
+
+    for study, info in studies.items():
+        for key in {study, info["global_id"], info["name"]}:
+            index.setdefault(key, []).append(study)
+
+    return index
+
+
+class AsyncDewrangleClient:
+    """Async version of the Dewrangle query functions.
+
+    The client connects once and reuses the same aiohttp session for every
+    GraphQL query and REST download, so many coroutines can run concurrently:
+
+        async with AsyncDewrangleClient() as dw:
+            jobs = await asyncio.gather(*[dw.get_job_info(j) for j in job_ids])
+    """
+
+    def __init__(self, client=None, endpoint=None, api_key=None, rest_endpoint=None):
+        """Use an existing gql client or create one from endpoint and api key.
+        Name to id lookups are cached in the gql client's resolution cache, completed
+        job results in its result cache, and the studies of each volume name in its
+        volume index, if it has them."""
+
+        if client is None:
+            client = create_gql_client(endpoint, api_key)
+
+        self.client = client
+        self.cache = getattr(client, "resolution_cache", None)
+        if self.cache is None:
+            self.cache = ResolutionCache()
+        self.results = getattr(client, "result_cache", None)
+        self.volume_index = getattr(client, "volume_index", None)
+        if self.volume_index is None:
+            self.volume_index = VolumeIndex()
+        self.api_key = api_key
+        self.rest_endpoint = rest_endpoint
+        self.session = None
+        self.owns_session = False
+
+    async def connect(self):
+        """Open the gql session (and the aiohttp session underneath it).
+        If the gql client is already open (see DewrangleGqlClient.open), reuse its session."""
+
+        if self.session is None:
+            persistent_session = getattr(self.client, "persistent_session", None)
+            if persistent_session is not None:
+                if asyncio.get_running_loop() is not self.client.loop:
+                    raise RuntimeError(
+                        "The gql client is open in another event loop. Close it or run on its loop."
+                    )
+                self.session = persistent_session
+                self.owns_session = False
+            else:
+                self.session = await self.client.connect_async()
+                self.owns_session = True
+
+        return self
+
+    async def close(self):
+        """Close the gql session, unless it belongs to an open gql client."""
+
+        if self.session is not None:
+            self.session = None
+            if self.owns_session:
+                await self.client.close_async()
+                # an open gql client writes its cache when it closes instead
+                self.cache.flush()
+
+        return
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def execute(self, query, variable_values=None):
+        """Execute a query on the open session."""
+
+        if self.session is None:
+            await self.connect()
+
+        return await self.session.execute(query, variable_values=variable_values)
+
+    async def iter_connection(
+        self, query_name, variables, path, page_size=PAGE_SIZE, prefetch=False, after=None
+    ):
+        """Yield the nodes of a Relay connection, querying one page at a time.
+        Inputs: registered query name (taking $first and $after), its other variables,
+        and the list of keys from the query result to the connection.
+        With prefetch, the next page is requested while the current one is consumed."""
+
+        query = get_query(query_name)
+
+        async def fetch(cursor):
+            params = dict(variables, first=page_size, after=cursor)
+            connection = await self.execute(query, variable_values=params)
+            for key in path:
+                connection = connection[key]
+            return connection
+
+        page = fetch(after)
+
+        try:
+            while page is not None:
+                connection = await page
+                page = None
+
+                page_info = connection["pageInfo"]
+                if page_info["hasNextPage"]:
+                    page = fetch(page_info["endCursor"])
+                    if prefetch:
+                        page = asyncio.ensure_future(page)
+
+                for edge in connection["edges"]:
+                    yield edge["node"]
+        finally:
+            # clean up the next page if iteration stopped early
+            if isinstance(page, asyncio.Future):
+                page.cancel()
+            elif page is not None:
+                page.close()
+
+    async def add_volume(self, study_id, prefix, region, bucket, aws_cred):
+        """Run Dewrangle create volume mutation."""
+
+        # prepare mutation
+
+        mutation = get_query("VolumeCreateMutation")
+
+        params = {
+            "input": {
+                "name": bucket,
+                "region": region,
+                "studyId": study_id,
+                "credentialId": aws_cred,
+            }
+        }
+
+        if prefix is not None:
+            params["input"]["pathPrefix"] = prefix
+
+        # run mutation
+        result = await self.execute(mutation, variable_values=params)
+
+        check_mutation_result(result)
+
+        volume_id = result["volumeCreate"]["volume"]["id"]
+
+        # the study has a new volume
+        self.cache.invalidate("study_volumes", study_id)
+        self.cache.invalidate("study_context", study_id)
+        self.volume_index.invalidate(study_id)
+
+        return volume_id
+
+    async def create_study(self, study_name, org_id, run):
+        """Run Dewrangle create study mutation."""
+
+        study_id = None
+
+        # prepare mutation
+        mutation = get_query("StudyCreateMutation")
+
+        params = {
+            "input": {
+                "name": study_name,
+                "organizationId": org_id,
+            }
+        }
+
+        # check if run is given and run mutation
+        if run:
+            result = await self.execute(mutation, variable_values=params)
+            check_mutation_result(result)
+            study_id = result["studyCreate"]["study"]["id"]
+            self.cache.invalidate("studies")
+        else:
+            print("{} was not created. Run option was not provided.".format(study_name))
+
+        return study_id
+
+    async def list_volume(self, volume_id):
+        """Run Dewrangle list volume mutation."""
+
+        # prepare mutation
+        mutation = get_query("VolumeListMutation")
+
+        params = {"id": volume_id}
+
+        # run mutation
+        result = await self.execute(mutation, variable_values=params)
+
+        check_mutation_result(result)
+
+        job_id = result["volumeList"]["job"]["id"]
+
+        return job_id
+
+    async def list_and_hash_volume(self, volume_id, billing_id):
+        """Run Dewrangle list and hash volume mutation."""
+
+        # prepare mutation
+        mutation = get_query("VolumeListHashMutation")
+
+        params = {"id": volume_id}
+        params["input"] = {"billingGroupId": billing_id}
+
+        # run mutation
+        result = await self.execute(mutation, variable_values=params)
+
+        check_mutation_result(result)
+
+        job_id = result["volumeListAndHash"]["job"]["id"]
+
+        return job_id
+
+    async def run_bulk_mutation(
+        self, mutation, variables, batch_size=MUTATION_BATCH_SIZE, max_concurrency=4
+    ):
+        """Run a mutation many times, batch_size at a time in one aliased request per batch.
+        Inputs: name of the mutation in queries.BULK_MUTATIONS and a list with the variables
+        of each run, e.g. [{"id": volume_id, "input": {...}}, ...].
+        Output: list of (result, error) in the same order as variables, where result is the
+        mutation payload and error the error message of a run that failed, so one failed
+        run doesn't abort the rest of its batch."""
+
+        results = [(None, None)] * len(variables)
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run_batch(start):
+            batch = variables[start : start + batch_size]
+            query = get_bulk_mutation(mutation, len(batch))
+            params = {}
+            for i, run in enumerate(batch):
+                for name, value in run.items():
+                    params["{}{}".format(name, i)] = value
+
+            async with semaphore:
+                try:
+                    result = await self.execute(query, variable_values=params)
+                    query_errors = []
+                except TransportQueryError as e:
+                    # errors for single runs come with the results of the others
+                    result = e.data or {}
+                    query_errors = e.errors or []
+                except Exception as e:
+                    for i in range(len(batch)):
+                        results[start + i] = (None, str(e))
+                    return
+
+            # match errors to the alias they happened on
+            alias_errors = {}
+            for error in query_errors:
+                path = error.get("path") or [None]
+                alias_errors.setdefault(path[0], []).append(error.get("message"))
+
+            aliases = ["m{}".format(i) for i in range(len(batch))]
+            mutation_errors = check_mutation_result(
+                {alias: result.get(alias) for alias in aliases}, raise_errors=False
+            )
+
+            for i, alias in enumerate(aliases):
+                if alias in alias_errors:
+                    error = "; ".join(alias_errors[alias])
+                elif alias in mutation_errors:
+                    error = "; ".join(alias_errors.get(None, [mutation_errors[alias]]))
+                else:
+                    error = None
+                results[start + i] = (result.get(alias), error)
+
+        await asyncio.gather(
+            *[run_batch(start) for start in range(0, len(variables), batch_size)]
+        )
+
+        return results
+
+    async def add_volumes(self, rows, batch_size=MUTATION_BATCH_SIZE):
+        """Run the create volume mutation for many volumes in bulk requests.
+        Inputs: list of dicts with add_volume keyword arguments
+        (study_id, prefix, region, bucket, aws_cred).
+        Output: list of {"volume_id", "error"} dicts in the same order as rows."""
+
+        variables = []
+        for row in rows:
+            volume_input = {
+                "name": row["bucket"],
+                "region": row["region"],
+                "studyId": row["study_id"],
+                "credentialId": row["aws_cred"],
+            }
+            if row.get("prefix") is not None:
+                volume_input["pathPrefix"] = row["prefix"]
+            variables.append({"input": volume_input})
+
+        results = await self.run_bulk_mutation("volumeCreate", variables, batch_size)
+
+        # the studies have new volumes
+        for study_id in {row["study_id"] for row in rows}:
+            self.cache.invalidate("study_volumes", study_id)
+            self.cache.invalidate("study_context", study_id)
+            self.volume_index.invalidate(study_id)
+
+        return [
+            {
+                "volume_id": None if error else result["volume"]["id"],
+                "error": error,
+            }
+            for result, error in results
+        ]
+
+    async def list_volumes(self, volume_ids, batch_size=MUTATION_BATCH_SIZE):
+        """Run the list volume mutation for many volumes in bulk requests.
+        Output: list of {"job_id", "error"} dicts in the same order as volume_ids."""
+
+        results = await self.run_bulk_mutation(
+            "volumeList", [{"id": volume_id} for volume_id in volume_ids], batch_size
+        )
+
+        return [
+            {"job_id": None if error else result["job"]["id"], "error": error}
+            for result, error in results
+        ]
+
+    async def list_and_hash_volumes(self, rows, batch_size=MUTATION_BATCH_SIZE):
+        """Run the list and hash volume mutation for many volumes in bulk requests.
+        Inputs: list of dicts with list_and_hash_volume keyword arguments (volume_id, billing_id).
+        Output: list of {"job_id", "error"} dicts in the same order as rows."""
+
+        variables = [
+            {"id": row["volume_id"], "input": {"billingGroupId": row["billing_id"]}}
+            for row in rows
+        ]
+
+        results = await self.run_bulk_mutation(
+            "volumeListAndHash", variables, batch_size
+        )
+
+        return [
+            {"job_id": None if error else result["job"]["id"], "error": error}
+            for result, error in results
+        ]
+
+    async def get_cred_id(self, study_id, cred_name=None):
+        """Get credential id"""
+
+        cred_id = None
+
+        # get all credentials in study
+        credentials = await self.get_study_credentials(study_id)
+
+        cred_id = pick_external_id(cred_name, credentials, "credential")
+
+        return cred_id
+
+    async def get_study_credentials(self, study_id):
+        """Get credential ids from a study."""
+
+        async def fetch():
+            credentials = {}
+
+            # loop through all credentials in the study
+            async for cred in self.iter_study_credentials(study_id):
+                cid = cred["id"]
+                name = cred["name"]
+                key = cred["key"]
+                credentials[cid] = {"name": name, "key": key}
+
+            return credentials
+
+        credentials = await self.cache.get_or_fetch("credentials", study_id, fetch)
+
+        return dict(credentials)
+
+    async def iter_study_credentials(self, study_id, page_size=PAGE_SIZE, prefetch=False):
+        """Yield the credentials in a study one page at a time."""
+
+        async for cred in self.iter_connection(
+            "Study_Credentials_Query",
+            {"id": study_id},
+            ["study", "credentials"],
+            page_size,
+            prefetch,
+        ):
+            yield cred
+
+    async def get_org_id(self, org_name):
+        """Query all available organizations, return org id"""
+
+        org_id = ""
+        org_ids = []
+
+        async def fetch():
+            return [
+                {"id": org["id"], "name": org["name"]}
+                async for org in self.iter_organizations()
+            ]
+
+        orgs = await self.cache.get_or_fetch("organizations", None, fetch)
+
+        # loop through all available organizations, find the one we're looking for
+        for org in orgs:
+            if org["name"] == org_name:
+                org_ids.append(org["id"])
+
+        if len(org_ids) == 1:
+            org_id = org_ids[0]
+        elif len(org_ids) == 0:
+            raise ValueError("Organization {} not found".format(org_name))
+        else:
+            raise ValueError(
+                "Organization {} found multiple times. Please delete or rename studies so there is only one {}".format(
+                    org_name, org_name
+                )
+            )
+
+        return org_id
+
+    async def iter_organizations(self, page_size=PAGE_SIZE, prefetch=False):
+        """Yield the organizations the user belongs to one page at a time."""
+
+        async for org_user in self.iter_connection(
+            "Organizations_Query",
+            {},
+            ["viewer", "organizationUsers"],
+            page_size,
+            prefetch,
+        ):
+            yield org_user["organization"]
+
+    async def get_org_id_from_study(self, study_id):
+        """Query study id and get the id of the organization it's in"""
+
+        org_id = ""
+        # set up query to get all available studies
+        query = get_query("Study_Org_Query")
+
+        params = {"id": study_id}
+
+        async def fetch():
+            # run query
+            result = await self.execute(query, params)
+            return result["study"]["organization"]["id"]
+
+        org_id = await self.cache.get_or_fetch("study_org", study_id, fetch)
+
+        return org_id
+
+    async def get_all_studies(self):
+        """Query all available studies, return study ids and names"""
+
+        async def fetch():
+            studies = {}
+
+            async for study in self.iter_all_studies():
+                id = study["id"]
+                name = study["name"]
+                global_id = study["globalId"]
+                studies[id] = {"name": name, "global_id": global_id}
+
+            return studies
+
+        studies = await self.cache.get_or_fetch("studies", None, fetch)
+
+        return dict(studies)
+
+    async def iter_all_studies(self, page_size=PAGE_SIZE, prefetch=False):
+        """Yield all available studies in all organizations one page at a time.
+        The first page of each organization's studies comes with the organization,
+        later pages are queried from the organization."""
+
+        async for org_user in self.iter_connection(
+            "All_Studies_Query",
+            {},
+            ["viewer", "organizationUsers"],
+            page_size,
+            prefetch,
+        ):
+            org = org_user["organization"]
+            for study_edge in org["studies"]["edges"]:
+                yield study_edge["node"]
+
+            page_info = org["studies"]["pageInfo"]
+            if page_info["hasNextPage"]:
+                async for study in self.iter_connection(
+                    "Org_Studies_Query",
+                    {"id": org["id"]},
+                    ["organization", "studies"],
+                    page_size,
+                    prefetch,
+                    after=page_info["endCursor"],
+                ):
+                    yield study
+
+    async def get_study_id(self, study_name):
+        """Query all available studies, return study id"""
+
+        study_id = ""
+        study_ids = []
+
+        # get a dictionary of all study ids and names
+        studies = await self.get_all_studies()
+
+        # look the study up by id, global id, or name
+        index = self.cache.get_index("studies", None, index_studies)
+        if index is None:
+            index = index_studies(studies)
+
+        for study in index.get(study_name, []):
+            print(studies[study]["global_id"])
+            study_ids.append(study)
+
+        if len(study_ids) == 1:
+            study_id = study_ids[0]
+        elif len(study_ids) == 0:
+            raise ValueError("Study {} not found".format(study_name))
+        else:
+            raise ValueError(
+                "Study {} found multiple times. Please delete or rename studies so there is only one {}".format(
+                    study_name, study_name
+                )
+            )
+
+        return study_id
+
+    async def get_study_volumes(self, study_id):
+        """Query study id, and return volumes in that study"""
+
+        async def fetch():
+            study_volumes = {}
+
+            async for volume in self.iter_study_volumes(study_id):
+                vid = volume["id"]
+                vname = volume["name"]
+                study_volumes[vid] = vname
+
+            return study_volumes
+
+        study_volumes = await self.cache.get_or_fetch("study_volumes", study_id, fetch)
+
+        return dict(study_volumes)
+
+    async def iter_study_volumes(
+        self, study_id, page_size=PAGE_SIZE, prefetch=False, after=None
+    ):
+        """Yield the volumes in a study one page at a time, optionally starting after a cursor."""
+
+        async for volume in self.iter_connection(
+            "Study_Volumes_Query",
+            {"id": study_id},
+            ["study", "volumes"],
+            page_size,
+            prefetch,
+            after=after,
+        ):
+            yield volume
+
+    async def remove_volume_from_study(self, vid, run):
+        """Remove a volume from the study using the study and volume ids."""
+
+        # prepare mutation
+        mutation = get_query("VolumeDelete")
+
+        params = {"id": vid}
+
+        # check if run is given and run mutation
+        if run:
+            result = await self.execute(mutation, params)
+            check_mutation_result(result)
+            # the study of the volume isn't known here, so drop all cached volumes
+            self.cache.invalidate("study_volumes")
+            self.cache.invalidate("study_context")
+            self.volume_index.invalidate(volume_id=vid)
+            print("{} successfully deleted".format(vid))
+        else:
+            print("{} was not deleted. Run option was not provided.".format(vid))
+
+        return
+
+    async def get_billing_groups(self, org_id):
+        """Get available billing groups for an organization."""
+
+        async def fetch():
+            billing_groups = {}
+
+            async for bg in self.iter_billing_groups(org_id):
+                name = bg["name"]
+                id = bg["id"]
+                billing_groups[id] = {"name": name}
+
+            return billing_groups
+
+        billing_groups = await self.cache.get_or_fetch("billing_groups", org_id, fetch)
+
+        return dict(billing_groups)
+
+    async def iter_billing_groups(self, org_id, page_size=PAGE_SIZE, prefetch=False):
+        """Yield the billing groups in an organization one page at a time."""
+
+        async for bg in self.iter_connection(
+            "Org_Query",
+            {"id": org_id},
+            ["organization", "billingGroups"],
+            page_size,
+            prefetch,
+        ):
+            yield bg
+
+    async def get_billing_id(self, org_id, billing=None):
+        "Get billing group id. If a name is provided, check it exists. If not return org default."
+
+        # first get a list of organizations and billing groups
+        billing_groups = await self.get_billing_groups(org_id)
+
+        billing_id = pick_external_id(billing, billing_groups, "billing_group")
+
+        return billing_id
+
+    async def get_study_context(self, study_id):
+        """Query the organization, billing groups, volumes, and credentials of a study in one
+        fused query. Connections with more than one page are finished with their own queries.
+        The context is cached, so every volume in the same study reuses it.
+        Output: StudyContext"""
+
+        query = get_query("Study_Context_Query")
+
+        params = {"id": study_id, "first": PAGE_SIZE}
+
+        async def all_nodes(connection, query_name, node_id, path):
+            nodes = [edge["node"] for edge in connection["edges"]]
+            page_info = connection["pageInfo"]
+            if page_info["hasNextPage"]:
+                async for node in self.iter_connection(
+                    query_name, {"id": node_id}, path, after=page_info["endCursor"]
+                ):
+                    nodes.append(node)
+            return nodes
+
+        async def fetch():
+            # run query
+            result = await self.execute(query, params)
+            study = result["study"]
+            if study is None:
+                raise ValueError("Study {} not found".format(study_id))
+            org_id = study["organization"]["id"]
+
+            billing_groups = {
+                bg["id"]: {"name": bg["name"]}
+                for bg in await all_nodes(
+                    study["organization"]["billingGroups"],
+                    "Org_Query",
+                    org_id,
+                    ["organization", "billingGroups"],
+                )
+            }
+            volumes = {
+                volume["id"]: volume["name"]
+                for volume in await all_nodes(
+                    study["volumes"],
+                    "Study_Volumes_Query",
+                    study_id,
+                    ["study", "volumes"],
+                )
+            }
+            credentials = {
+                cred["id"]: {"name": cred["name"], "key": cred["key"]}
+                for cred in await all_nodes(
+                    study["credentials"],
+                    "Study_Credentials_Query",
+                    study_id,
+                    ["study", "credentials"],
+                )
+            }
+
+            # the single lookups reuse what came with the context
+            self.cache.set("study_org", study_id, org_id)
+            self.cache.set("billing_groups", org_id, billing_groups)
+            self.cache.set("study_volumes", study_id, volumes)
+            self.cache.set("credentials", study_id, credentials)
+
+            return {
+                "org_id": org_id,
+                "billing_groups": billing_groups,
+                "volumes": volumes,
+                "credentials": credentials,
+            }
+
+        context = await self.cache.get_or_fetch("study_context", study_id, fetch)
+
+        return StudyContext(
+            study_id,
+            context["org_id"],
+            dict(context["billing_groups"]),
+            dict(context["volumes"]),
+            dict(context["credentials"]),
+        )
+
+    async def get_job_info(self, jobid):
+        """Query job info with job id.
+        The first page of errors comes with the job, any more are queried and added to it."""
+
+        query = get_query("Job_Query")
+
+        params = {"id": jobid, "first": PAGE_SIZE}
+
+        # run query
+        result = await self.execute(query, variable_values=params)
+
+        if result["job"] is not None:
+            await self.add_remaining_job_errors(result["job"])
+
+        return result
+
+    async def add_remaining_job_errors(self, job):
+        """Query the errors past the first page for a job, its parent, and its children
+        and add them to the job's errors."""
+
+        related_jobs = [job, job.get("parentJob")] + job.get("children", [])
+        for related_job in related_jobs:
+            if related_job is None:
+                continue
+            errors = related_job["errors"]
+            if errors["pageInfo"]["hasNextPage"]:
+                async for error in self.iter_job_errors(
+                    related_job["id"], after=errors["pageInfo"]["endCursor"]
+                ):
+                    errors["edges"].append({"node": error})
+
+        return
+
+    async def get_nodes(
+        self,
+        ids,
+        fragment="NodeFields",
+        batch_size=NODE_BATCH_SIZE,
+        variables=None,
+        max_concurrency=4,
+    ):
+        """Look up many nodes by id, batch_size at a time in one aliased query per batch.
+        Inputs: list of ids, name of the registered fragment to select on each node
+        (see queries.FRAGMENTS) and values for the variables the fragment uses.
+        Output: dictionary of id: node for the nodes found, and a dictionary of id: error
+        message for the ids that weren't, or that are a different type than the fragment,
+        so one bad id doesn't fail the rest of its batch.
+        Failures of a whole request, e.g. a dropped connection or a server error, are raised."""
+
+        # drop duplicate ids, keeping the order
+        ids = list(dict.fromkeys(ids))
+
+        node_type = fragment_type(fragment)
+        nodes = {}
+        errors = {}
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run_batch(batch):
+            query = get_nodes_query(fragment, len(batch))
+            params = dict(variables or {})
+            for i, id in enumerate(batch):
+                params["id{}".format(i)] = id
+
+            async with semaphore:
+                try:
+                    result = await self.execute(query, variable_values=params)
+                    query_errors = []
+                except TransportQueryError as e:
+                    # errors for single nodes come with the data for the others,
+                    # without data the whole query failed
+                    if e.data is None:
+                        raise
+                    result = e.data
+                    query_errors = e.errors or []
+
+            # match errors to the node alias they happened on
+            alias_errors = {}
+            for error in query_errors:
+                path = error.get("path") or [None]
+                alias_errors.setdefault(path[0], []).append(error.get("message"))
+
+            for i, id in enumerate(batch):
+                alias = "n{}".format(i)
+                node = result.get(alias)
+                if alias in alias_errors:
+                    errors[id] = "; ".join(alias_errors[alias])
+                elif node is None:
+                    errors[id] = "; ".join(alias_errors.get(None, ["Node not found"]))
+                elif node_type != "Node" and node["__typename"] != node_type:
+                    errors[id] = "Node {} is a {}, not a {}".format(
+                        id, node["__typename"], node_type
+                    )
+                else:
+                    node.pop("__typename", None)
+                    nodes[id] = node
+
+        await asyncio.gather(
+            *[
+                run_batch(ids[start : start + batch_size])
+                for start in range(0, len(ids), batch_size)
+            ]
+        )
+
+        # return results in the order they were asked for
+        nodes = {id: nodes[id] for id in ids if id in nodes}
+        errors = {id: errors[id] for id in ids if id in errors}
+
+        return nodes, errors
+
+    async def get_job_info_many(self, job_ids, batch_size=NODE_BATCH_SIZE):
+        """Query job info for many job ids with batched node lookups.
+        Output: dictionary of job id: {"job": job info} in the get_job_info format,
+        and a dictionary of job id: error message."""
+
+        jobs, errors = await self.get_nodes(
+            job_ids, "JobFields", batch_size, {"first": PAGE_SIZE}
+        )
+
+        for job in jobs.values():
+            await self.add_remaining_job_errors(job)
+
+        return {jid: {"job": job} for jid, job in jobs.items()}, errors
+
+    async def get_volumes_many(self, volume_ids, batch_size=NODE_BATCH_SIZE):
+        """Query volume names for many volume ids with batched node lookups.
+        Output: dictionary of volume id: {"id", "name"}, and a dictionary of volume id: error message."""
+        return await self.get_nodes(volume_ids, "VolumeFields", batch_size)
+
+    async def iter_finished_jobs(
+        self,
+        job_ids,
+        min_interval=POLL_MIN_INTERVAL,
+        max_interval=POLL_MAX_INTERVAL,
+        backoff=2,
+        timeout=None,
+        batch_size=NODE_BATCH_SIZE,
+    ):
+        """Poll jobs until they complete, yielding each one as soon as it does.
+        Every tick checks all unfinished jobs with batched node lookups. The wait between
+        ticks starts at min_interval seconds, is multiplied by backoff after every tick
+        where no job finished (up to max_interval) and goes back to min_interval when one does.
+        Yields {"job_id", "job", "error"} dicts in completion order, where job has the
+        id, operation, createdAt and completedAt of the job, and error is set for ids
+        that couldn't be found or aren't jobs. A tick that fails in transport, e.g. on a dropped
+        connection or a server error, is retried like a tick where no job finished.
+        Raises TimeoutError if jobs are still running after timeout seconds."""
+
+        waiting = list(dict.fromkeys(job_ids))
+        interval = min_interval
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        last_error = None
+
+        while waiting:
+            try:
+                jobs, errors = await self.get_nodes(
+                    waiting, "JobStatusFields", batch_size
+                )
+                last_error = None
+            except TransportQueryError:
+                raise
+            except Exception as e:
+                # nothing is known about the jobs, poll them again after the backoff
+                jobs, errors = {}, {}
+                last_error = e
+
+            finished = []
+            for jid in waiting:
+                if jid in errors:
+                    finished.append(jid)
+                    yield {"job_id": jid, "job": None, "error": errors[jid]}
+                elif jid in jobs and jobs[jid]["completedAt"]:
+                    finished.append(jid)
+                    yield {"job_id": jid, "job": jobs[jid], "error": None}
+
+            waiting = [jid for jid in waiting if jid not in finished]
+            if not waiting:
+                break
+
+            # poll again soon if something changed, otherwise back off
+            if finished:
+                interval = min_interval
+            else:
+                interval = min(interval * backoff, max_interval)
+
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        "Timed out waiting for {} job(s): {}".format(
+                            len(waiting), ", ".join(waiting)
+                        )
+                    ) from last_error
+                interval = min(interval, remaining)
+
+            await asyncio.sleep(interval)
+
+    async def wait_for_jobs(self, job_ids, **kwargs):
+        """Wait for jobs to complete, see iter_finished_jobs.
+        Output: list of {"job_id", "job", "error"} dicts in completion order."""
+        return [job async for job in self.iter_finished_jobs(job_ids, **kwargs)]
+
+    async def iter_job_errors(self, jobid, page_size=PAGE_SIZE, prefetch=False, after=None):
+        """Yield the errors of a job one page at a time."""
+
+        async for error in self.iter_connection(
+            "Job_Errors_Query",
+            {"id": jobid},
+            ["job", "errors"],
+            page_size,
+            prefetch,
+            after=after,
+        ):
+            yield error
+
+    async def get_volume_jobs(self, vid):
+        """Query volume for a list of jobs.
+        Output: dictionary of job id: {"operation", "createdAt", "completedAt"},
+        completedAt is None for jobs that are still running."""
+
+        job_index = await self.get_volume_job_index(vid)
+
+        return job_index.to_dict()
+
+    async def get_volume_job_index(self, vid):
+        """Query all jobs of a volume once into a VolumeJobIndex."""
+
+        from .jobs import VolumeJobIndex
+
+        nodes = [node async for node in self.iter_volume_jobs(vid, prefetch=True)]
+
+        return VolumeJobIndex.from_nodes(nodes)
+
+    async def iter_volume_jobs(self, vid, page_size=PAGE_SIZE, prefetch=False):
+        """Yield the jobs run on a volume one page at a time."""
+
+        async for job in self.iter_connection(
+            "Volume_Job_Query",
+            {"id": vid},
+            ["volume", "jobs"],
+            page_size,
+            prefetch,
+        ):
+            yield job
+
+    async def get_most_recent_job(self, vid, job_type, job_index=None):
+        """Query volume and get most recent job.
+        Pass a job_index from get_volume_job_index to look it up without querying again."""
+
+        from .jobs import job_operation
+
+        job_type = job_operation(job_type)
+
+        if job_index is None:
+            job_index = await self.get_volume_job_index(vid)
+
+        jid = job_index.latest(job_type)
+
+        if jid is None:
+            raise ValueError(
+                "no job(s) matching job type: {} found in volume".format(job_type)
+            )
+
+        return jid
+
+    async def request_to_df(self, url, engine="auto", **kwargs):
+        """Call api on the open session and return response as a pandas dataframe.
+        The csv is parsed in a worker thread with the given engine, see results.parse_result_csv."""
+
+        if self.session is None:
+            await self.connect()
+
+        kwargs.setdefault("timeout", DOWNLOAD_TIMEOUT)
+
+        async with self.client.transport.session.get(url, **kwargs) as response:
+            # check if the request was successful
+            if response.status != 200:
+                raise RuntimeError(
+                    "Failed to fetch the CSV. Status code: {}".format(response.status)
+                )
+            body = await response.read()
+
+        # parse off the event loop so other queries keep running
+        return await asyncio.get_running_loop().run_in_executor(
+            None, parse_result_csv, body, engine
+        )
+
+    async def request_to_file(
+        self,
+        url,
+        path,
+        chunk_size=CHUNK_SIZE,
+        workers=1,
+        resume=False,
+        progress=None,
+        **kwargs
+    ):
+        """Call api on the open session and stream the response body to a file.
+        With workers > 1 the body is fetched with that many concurrent range requests, and
+        with resume an interrupted ranged download picks up where it stopped, see download.py.
+        progress is called with the bytes done and the total, e.g. download.ProgressReporter()."""
+
+        if self.session is None:
+            await self.connect()
+
+        return await download(
+            self.client.transport.session,
+            url,
+            path,
+            chunk_size,
+            workers,
+            resume,
+            progress,
+            **kwargs
+        )
+
+    async def get_study_volumes_many(self, study_ids, batch_size=NODE_BATCH_SIZE):
+        """Query the volumes of many studies with batched node lookups.
+        Output: dictionary of study id: {volume id: volume name} for the studies found,
+        and a dictionary of study id: error message."""
+
+        studies, errors = await self.get_nodes(
+            study_ids, "StudyVolumesFields", batch_size, {"first": PAGE_SIZE}
+        )
+
+        study_volumes = {}
+        for study_id, study in studies.items():
+            connection = study["volumes"]
+            volumes = {edge["node"]["id"]: edge["node"]["name"] for edge in connection["edges"]}
+
+            # the first page comes with the study, later pages are queried from it
+            page_info = connection["pageInfo"]
+            if page_info["hasNextPage"]:
+                async for volume in self.iter_study_volumes(
+                    study_id, after=page_info["endCursor"]
+                ):
+                    volumes[volume["id"]] = volume["name"]
+
+            study_volumes[study_id] = volumes
+            self.cache.set("study_volumes", study_id, volumes)
+
+        return study_volumes, errors
+
+    async def refresh_volume_index(self, max_age=VOLUME_INDEX_MAX_AGE):
+        """Bring the volume index up to date, querying only the volumes of studies that are
+        new, were changed by a mutation, or were indexed more than max_age seconds ago.
+        Returns the number of studies queried."""
+
+        studies = await self.get_all_studies()
+
+        self.volume_index.retain(studies)
+        stale = self.volume_index.stale_studies(studies, max_age)
+
+        if stale:
+            study_volumes, errors = await self.get_study_volumes_many(stale)
+            self.volume_index.update(study_volumes)
+            for study_id, error in errors.items():
+                print(
+                    "Could not index the volumes of {}: {}".format(study_id, error),
+                    file=sys.stderr,
+                )
+
+        return len(stale)
+
+    async def get_study_from_volume(self, volume_name, offline=False, max_age=RESOLUTION_TTL):
+        """Get study id from volume name.
+        Returns the study_id, a warning message if a study is loaded multiple times or not at all,
+        and a list of all study_ids where the volume is loaded.
+        The volume is looked up in the volume index, after querying the studies indexed more
+        than max_age seconds ago (see refresh_volume_index), or with offline only read from disk."""
+
+        message = None
+
+        if not offline:
+            await self.refresh_volume_index(max_age)
+
+        study_ids = self.volume_index.lookup(volume_name)
+
+        if not study_ids and not offline and max_age > RESOLUTION_TTL:
+            # the volume may have been added since the studies were indexed
+            await self.refresh_volume_index(RESOLUTION_TTL)
+            study_ids = self.volume_index.lookup(volume_name)
+
+        # check if the volume is found or if it's found multiple times
+        if len(study_ids) == 0:
+            message = "Volume not found"
+        elif len(study_ids) > 1:
+            study_ids = list(set(study_ids))
+            if len(study_ids) == 1:
+                message = "Volume loaded multiple times in one study"
+            else:
+                message = "Volume loaded to multiple studies"
+
+        return study_ids, message
+
+    async def load_and_hash_volume(
+        self,
+        volume_name,
+        study_name,
+        region,
+        prefix=None,
+        billing=None,
+        cred=None,
+        incremental=False,
+    ):
+        """Wrapper function that checks if a volume is loaded, and hashes it.
+        Inputs: AWS bucket name, study name, aws region, and optional volume prefix.
+        With incremental, a volume that hasn't changed since its last hash isn't hashed
+        again, see check_volume_changes.
+        Output: job id of parent job creaated when volume is hashed, or of the last hash
+        job if the volume was unchanged."""
+
+        job_id = None
+
+        try:
+            job_id = await self._load_and_hash_volume(
+                volume_name, study_name, region, prefix, billing, cred, incremental
+            )
+
+        except Exception:
+            print(
+                "The following error occurred trying to hash {}: {}".format(
+                    volume_name, traceback.format_exc()
+                ),
+                file=sys.stderr,
+            )
+
+        return job_id
+
+    async def _load_and_hash_volume(
+        self,
+        volume_name,
+        study_name,
+        region,
+        prefix=None,
+        billing=None,
+        cred=None,
+        incremental=False,
+    ):
+        """Load a volume to a study if needed and hash it, raising on any error."""
+
+        plan = await self.plan_load_and_hash(
+            volume_name, study_name, region, prefix, billing, cred, incremental
+        )
+
+        if plan["job_id"] is not None:
+            return plan["job_id"]
+
+        volume_id = plan["volume_id"]
+        if volume_id is None:
+            # load if it's not
+            volume_id = await self.add_volume(**plan["create"])
+
+        # hash
+        job_id = await self.list_and_hash_volume(volume_id, plan["billing_id"])
+
+        return job_id
+
+    async def plan_load_and_hash(
+        self,
+        volume_name,
+        study_name,
+        region,
+        prefix=None,
+        billing=None,
+        cred=None,
+        incremental=False,
+    ):
+        """Run the lookups needed to load and hash a volume, without running any mutation.
+        Output: dictionary with the "billing_id" to hash with, the "volume_id" if the volume
+        is loaded already, otherwise the add_volume keyword arguments to "create" it, and
+        the last hash "job_id" if the hash can be skipped (see check_volume_changes)."""
+
+        plan = {"billing_id": None, "volume_id": None, "create": None, "job_id": None}
+
+        # get study id, and its org, billing groups, volumes and credentials in one query
+        study_id = await self.get_study_id(study_name)
+        context = await self.get_study_context(study_id)
+
+        # get billing group id
+        plan["billing_id"] = context.billing_id(billing)
+
+        # check if volume loaded to study
+        volume_id = context.volume_id(volume_name)
+        plan["volume_id"] = volume_id
+
+        if volume_id is None:
+            # if we need to load, get credential
+            aws_cred_id = context.cred_id(cred)
+
+            plan["create"] = {
+                "study_id": study_id,
+                "prefix": prefix,
+                "region": region,
+                "bucket": volume_name,
+                "aws_cred": aws_cred_id,
+            }
+
+        elif incremental:
+            # skip the hash if nothing changed since the last one
+            changes = await self.check_volume_changes(volume_id)
+            plan["job_id"] = self.unchanged_hash_job(volume_name, changes)
+
+        return plan
+
+    def unchanged_hash_job(self, volume_name, changes):
+        """Get the last hash job of a volume if nothing changed since it, so its hash
+        can be skipped, otherwise None. Prints which of the two it is."""
+
+        if changes["hash_job"] is not None and changes["changes"].empty:
+            print(
+                "{} is unchanged since hash job {}, skipping hash".format(
+                    volume_name, changes["hash_job"]
+                )
+            )
+            return changes["hash_job"]
+
+        if changes["prefixes"]:
+            print(
+                "{} changed under: {}".format(volume_name, ", ".join(changes["prefixes"]))
+            )
+
+        return None
+
+    async def get_last_hash_job(self, volume_id):
+        """Get the id of the most recent completed hash job of a volume, or None."""
+
+        job_index = await self.get_volume_job_index(volume_id)
+
+        return job_index.latest("VOLUME_HASH", completed=True)
+
+    async def check_volume_changes(self, volume_id, timeout=None):
+        """Check what changed in a volume since its last hash.
+        Runs a list job, which is much cheaper than hashing, waits for it, and compares
+        the path, size, and etag of every file against the result of the last completed
+        hash job.
+        Output: dictionary with the last "hash_job" id (None if the volume was never hashed),
+        the "list_job" id, the "changes" dataframe of added, removed, and modified files
+        (see diff.diff_results), and the smallest set of directory "prefixes" covering them."""
+
+        hash_job = await self.get_last_hash_job(volume_id)
+        if hash_job is None:
+            return await self.compare_listing(None, None)
+
+        list_job = await self.list_volume(volume_id)
+        finished = await self.wait_for_jobs([list_job], timeout=timeout)
+        if finished[0]["error"] is not None:
+            raise RuntimeError(
+                "List job {} failed: {}".format(list_job, finished[0]["error"])
+            )
+
+        return await self.compare_listing(hash_job, list_job)
+
+    async def compare_listing(self, hash_job, list_job):
+        """Compare the result of a finished list job of a volume against its last hash job,
+        see check_volume_changes for the report. Without a hash job nothing is compared."""
+
+        import pandas as pd
+        from .diff import changed_prefixes, CHANGE_COLUMNS
+
+        report = {
+            "hash_job": hash_job,
+            "list_job": list_job,
+            "changes": pd.DataFrame(columns=CHANGE_COLUMNS),
+            "prefixes": [],
+        }
+        if hash_job is None:
+            return report
+
+        changes = await self.diff_job_results(hash_job, list_job)
+        # a listing has no hashes, so only the size and etag are compared
+        changes = changes[changes["change"] != "hash_changed"].reset_index(drop=True)
+
+        report["changes"] = changes
+        report["prefixes"] = changed_prefixes(changes["path"])
+
+        return report
+
+    async def skip_unchanged_volumes(self, rows, plans, semaphore, batch_size):
+        """Set the job id of the plans whose volume hasn't changed since its last hash,
+        for load_and_hash_volumes with incremental. The list jobs of all loaded volumes are
+        submitted in bulk requests and polled together, and each result is diffed against
+        the volume's last hash as soon as its list job completes."""
+
+        # rows of the same volume share its check
+        checks = {}
+        for row, plan in zip(rows, plans):
+            if not plan["error"] and plan["volume_id"] is not None and plan["incremental"]:
+                checks.setdefault(plan["volume_id"], []).append((row, plan))
+
+        def fail(volume_id, error):
+            for row, plan in checks[volume_id]:
+                plan["error"] = error
+
+        async def last_hash_job(volume_id):
+            async with semaphore:
+                try:
+                    return await self.get_last_hash_job(volume_id)
+                except Exception as e:
+                    fail(volume_id, str(e))
+
+        volume_ids = list(checks)
+        hash_jobs = dict(
+            zip(volume_ids, await asyncio.gather(*[last_hash_job(v) for v in volume_ids]))
+        )
+
+        # never hashed volumes are hashed without a listing
+        listed = [volume_id for volume_id in volume_ids if hash_jobs[volume_id]]
+        list_jobs = {}
+        for volume_id, res in zip(listed, await self.list_volumes(listed, batch_size)):
+            if res["error"]:
+                fail(volume_id, res["error"])
+            else:
+                list_jobs[res["job_id"]] = volume_id
+
+        async def compare(volume_id, list_job):
+            async with semaphore:
+                try:
+                    changes = await self.compare_listing(hash_jobs[volume_id], list_job)
+                except Exception as e:
+                    fail(volume_id, str(e))
+                    return
+            for row, plan in checks[volume_id]:
+                plan["job_id"] = self.unchanged_hash_job(row.get("volume_name"), changes)
+
+        comparisons = []
+        try:
+            async for finished in self.iter_finished_jobs(list(list_jobs)):
+                volume_id = list_jobs.pop(finished["job_id"])
+                if finished["error"] is not None:
+                    fail(
+                        volume_id,
+                        "List job {} failed: {}".format(
+                            finished["job_id"], finished["error"]
+                        ),
+                    )
+                else:
+                    comparisons.append(
+                        asyncio.ensure_future(compare(volume_id, finished["job_id"]))
+                    )
+        except Exception as e:
+            # the list jobs still running can't be checked
+            for list_job, volume_id in list_jobs.items():
+                fail(volume_id, "Could not poll list job {}: {}".format(list_job, e))
+        finally:
+            await asyncio.gather(*comparisons)
+
+        return
+
+    async def load_and_hash_volumes(
+        self,
+        rows,
+        max_concurrency=10,
+        incremental=False,
+        batch_size=MUTATION_BATCH_SIZE,
+    ):
+        """Load and hash many volumes.
+        The lookups of each volume run with at most max_concurrency in flight, then the
+        volumes that aren't loaded yet are created, and all of them hashed, batch_size
+        mutations at a time in bulk requests.
+        Inputs: list of dicts with load_and_hash_volume keyword arguments
+        (volume_name, study_name, region, and optionally prefix, billing, cred),
+        and incremental to skip volumes that haven't changed since their last hash,
+        see skip_unchanged_volumes.
+        Output: list of {"job_id", "error"} dicts in the same order as rows."""
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def plan_row(row):
+            async with semaphore:
+                try:
+                    # the volumes are checked for changes together below
+                    plan = await self.plan_load_and_hash(
+                        **dict(row, incremental=False)
+                    )
+                    plan["incremental"] = row.get("incremental", incremental)
+                    plan["error"] = None
+                except Exception as e:
+                    plan = {"job_id": None, "error": str(e)}
+                return plan
+
+        plans = await asyncio.gather(*[plan_row(row) for row in rows])
+
+        if any(plan.get("incremental") for plan in plans):
+            await self.skip_unchanged_volumes(rows, plans, semaphore, batch_size)
+
+        # load the volumes that aren't in their study yet, each one once even if
+        # several rows need it, the first row's arguments create it like a sequential load
+        creates = {}
+        for plan in plans:
+            if not plan["error"] and plan["create"]:
+                key = (plan["create"]["study_id"], plan["create"]["bucket"])
+                creates.setdefault(key, []).append(plan)
+        if creates:
+            created = await self.add_volumes(
+                [create_plans[0]["create"] for create_plans in creates.values()],
+                batch_size,
+            )
+            for create_plans, res in zip(creates.values(), created):
+                for plan in create_plans:
+                    plan["volume_id"] = res["volume_id"]
+                    plan["error"] = res["error"]
+
+        # hash
+        hashes = [
+            plan for plan in plans if not plan["error"] and plan["job_id"] is None
+        ]
+        if hashes:
+            submitted = await self.list_and_hash_volumes(
+                [
+                    {"volume_id": plan["volume_id"], "billing_id": plan["billing_id"]}
+                    for plan in hashes
+                ],
+                batch_size,
+            )
+            for plan, res in zip(hashes, submitted):
+                plan["job_id"] = res["job_id"]
+                plan["error"] = res["error"]
+
+        for row, plan in zip(rows, plans):
+            if plan["error"]:
+                print(
+                    "The following error occurred trying to hash {}: {}".format(
+                        row.get("volume_name"), plan["error"]
+                    ),
+                    file=sys.stderr,
+                )
+
+        return [{"job_id": plan["job_id"], "error": plan["error"]} for plan in plans]
+
+    async def get_job_result_url(self, jobid):
+        """Check if a job is complete and find the url of its result.
+        If the job is a list and hash job, the url is the one of the hash result.
+        Returns the job status and the url, or None if there is nothing to download."""
+
+        job_info = await self.get_job_info(jobid)
+
+        return self.job_result_url(job_info)
+
+    def job_result_url(self, job_info):
+        """Check if a job is complete and find the url of its result from its job info
+        (needs the id, operation, completedAt, and children of the job).
+        Returns the job status and the url, or None if there is nothing to download."""
+
+        endpoint, req_header = create_rest_creds(self.rest_endpoint, self.api_key)
+
+        job_status = None
+
+        url = None
+
+        jobid = job_info["job"]["id"]
+
+        # check if it's done
+        if (
+            job_info["job"]["completedAt"] != ""
+            and job_info["job"]["completedAt"] is not None
+        ):
+            job_status = "Complete"
+
+        else:
+            job_status = "Incomplete"
+
+        if job_status == "Complete":
+            job_type = job_info["job"]["operation"]
+            # we can only download results for hash or list jobs so check that the job is one of those
+            if job_type in ["VOLUME_LIST", "VOLUME_HASH", "VOLUME_LIST_AND_HASH"]:
+                # if the job is a parent job, find the hash job to get it's result
+                if (
+                    job_type == "VOLUME_LIST_AND_HASH"
+                    and len(job_info["job"]["children"]) != 0
+                ):
+                    for child_job in job_info["job"]["children"]:
+                        if child_job["operation"] == "VOLUME_HASH":
+                            jobid = child_job["id"]
+                url = endpoint + jobid + "/result"
+            else:
+                print("Job type {} does not have results to download".format(job_type))
+
+        return job_status, url
+
+    async def download_job_result(self, jobid, engine="auto"):
+        """Check if a job is complete, download results if it is.
+        If the job is a list and hash job, only download the hash result.
+        The result is parsed with engine ("auto", "pandas", or "pyarrow")."""
+
+        job_result = None
+        loop = asyncio.get_running_loop()
+
+        # completed results are served from the result cache without querying Dewrangle
+        cached = await self.get_cached_result(jobid)
+        if cached is not None:
+            job_result = await loop.run_in_executor(None, parse_result_csv, cached, engine)
+            return "Complete", job_result
+
+        job_status, url = await self.get_job_result_url(jobid)
+
+        if url is not None:
+            if self.results is not None:
+                # download to a temp file, which is added to the result cache if it fits
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    csv_path = await self.save_result_url(
+                        url, os.path.join(tmp_dir, "result.csv"), jobid=jobid
+                    )
+                    job_result = await loop.run_in_executor(
+                        None, parse_result_csv, csv_path, engine
+                    )
+            else:
+                _, req_header = create_rest_creds(self.rest_endpoint, self.api_key)
+                job_result = await self.request_to_df(url, engine, headers=req_header)
+
+        return job_status, job_result
+
+    async def get_cached_result(self, jobid):
+        """Get the path of a job's cached result csv, or None if it isn't cached."""
+
+        if self.results is None:
+            return None
+
+        # the integrity check reads the whole file, so keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.results.get, jobid
+        )
+
+    async def download_job_result_to_file(
+        self,
+        jobid,
+        path,
+        chunk_size=CHUNK_SIZE,
+        output_format=None,
+        compression="default",
+        row_group_size=None,
+        workers=1,
+        resume=False,
+        progress=None,
+    ):
+        """Check if a job is complete, stream its result to path if it is.
+        If the job is a list and hash job, only download the hash result.
+        output_format is "csv", "parquet", or "arrow" (Arrow IPC), by default picked from
+        the extension of path, see save_result_url for the other options.
+        Returns the job status and the path written, or None if there was nothing to download."""
+
+        output_format = pick_format(path, output_format)
+        if output_format != "csv":
+            # fail before downloading anything if pyarrow is missing
+            require_pyarrow("Writing {} files".format(output_format))
+
+        cached = await self.get_cached_result(jobid)
+        if cached is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None,
+                save_result_csv,
+                cached,
+                path,
+                output_format,
+                compression,
+                row_group_size,
+            )
+            return "Complete", path
+
+        job_status, url = await self.get_job_result_url(jobid)
+
+        if url is None:
+            return job_status, None
+
+        await self.save_result_url(
+            url,
+            path,
+            output_format,
+            chunk_size,
+            compression,
+            row_group_size,
+            workers,
+            resume,
+            progress,
+            jobid,
+        )
+
+        return job_status, path
+
+    async def save_result_url(
+        self,
+        url,
+        path,
+        output_format="csv",
+        chunk_size=CHUNK_SIZE,
+        compression="default",
+        row_group_size=None,
+        workers=1,
+        resume=False,
+        progress=None,
+        jobid=None,
+    ):
+        """Stream a job result from its url to path as csv, Parquet, or Arrow IPC.
+        Parquet and Arrow results are streamed to a temp csv first and converted,
+        see results.convert_result_csv for compression and row_group_size.
+        workers, resume, and progress are passed on to request_to_file.
+        With the id of the completed job, the result csv is added to the result cache
+        after the download if it fits, and concurrent calls for the same job share one
+        download by copying its result from the cache."""
+
+        if jobid is None or self.results is None:
+            await self.fetch_result_url(
+                url,
+                path,
+                output_format,
+                chunk_size,
+                compression,
+                row_group_size,
+                workers,
+                resume,
+                progress,
+            )
+            return path
+
+        pending = self.results.pending
+        if jobid in pending:
+            # the cached path once the other download finishes, None if it couldn't be cached
+            cached = await asyncio.shield(pending[jobid])
+            if cached is not None:
+                await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    save_result_csv,
+                    cached,
+                    path,
+                    output_format,
+                    compression,
+                    row_group_size,
+                )
+                return path
+
+        shared = asyncio.get_running_loop().create_future()
+        pending[jobid] = shared
+        cached = None
+        try:
+            cached = await self.fetch_result_url(
+                url,
+                path,
+                output_format,
+                chunk_size,
+                compression,
+                row_group_size,
+                workers,
+                resume,
+                progress,
+                jobid,
+            )
+        finally:
+            # waiting calls download the result themselves if it wasn't cached
+            shared.set_result(cached)
+            if pending.get(jobid) is shared:
+                del pending[jobid]
+
+        return path
+
+    async def fetch_result_url(
+        self,
+        url,
+        path,
+        output_format="csv",
+        chunk_size=CHUNK_SIZE,
+        compression="default",
+        row_group_size=None,
+        workers=1,
+        resume=False,
+        progress=None,
+        jobid=None,
+    ):
+        """Download a job result to path, see save_result_url. The download goes straight
+        to path, or for Parquet and Arrow to a csv next to it, never through the cache
+        directory. With jobid the csv is then added to the result cache, hard linked when
+        possible, if it fits.
+        Returns the cached path, or None if the result wasn't cached."""
+
+        _, req_header = create_rest_creds(self.rest_endpoint, self.api_key)
+        cached = None
+        loop = asyncio.get_running_loop()
+
+        if output_format == "csv":
+            await self.request_to_file(
+                url, path, chunk_size, workers, resume, progress, headers=req_header
+            )
+            if jobid is not None:
+                cached = await loop.run_in_executor(
+                    None, self.results.put, jobid, path, False
+                )
+        else:
+            # keep the csv name stable so an interrupted download can be resumed
+            csv_path = path + ".download.csv"
+            try:
+                await self.request_to_file(
+                    url, csv_path, chunk_size, workers, resume, progress, headers=req_header
+                )
+                await loop.run_in_executor(
+                    None,
+                    convert_result_csv,
+                    csv_path,
+                    path,
+                    output_format,
+                    compression,
+                    row_group_size,
+                )
+                if jobid is not None:
+                    cached = await loop.run_in_executor(
+                        None, self.results.put, jobid, csv_path
+                    )
+            finally:
+                if os.path.exists(csv_path):
+                    os.remove(csv_path)
+
+        return cached
+
+    async def download_job_results(
+        self,
+        job_ids,
+        out_dir,
+        workers=DOWNLOAD_WORKERS,
+        output_format="csv",
+        chunk_size=CHUNK_SIZE,
+        compression="default",
+        row_group_size=None,
+    ):
+        """Download the results of many jobs into out_dir, workers at a time over the open session.
+        Results in the result cache are copied from it, the other jobs, and the hash jobs of
+        list and hash jobs, are looked up in batched queries first, and incomplete jobs are
+        skipped. Results are saved as <job id>_output.<format>.
+        Output: list of {"job_id", "status", "path", "bytes", "seconds", "cached", "error"}
+        dicts in the same order as job_ids, with duplicate ids downloaded once."""
+
+        if output_format != "csv":
+            require_pyarrow("Writing {} files".format(output_format))
+
+        # drop duplicate ids, keeping the order
+        job_ids = list(dict.fromkeys(job_ids))
+
+        cached_paths = await asyncio.gather(
+            *[self.get_cached_result(jobid) for jobid in job_ids]
+        )
+        cached = {
+            jobid: cached_path
+            for jobid, cached_path in zip(job_ids, cached_paths)
+            if cached_path is not None
+        }
+
+        jobs, errors = await self.get_nodes(
+            [jobid for jobid in job_ids if jobid not in cached], "JobResultFields"
+        )
+
+        os.makedirs(out_dir, exist_ok=True)
+        extension = FORMAT_EXTENSIONS[output_format]
+        semaphore = asyncio.Semaphore(workers)
+
+        async def download_job(jobid):
+            report = {
+                "job_id": jobid,
+                "status": None,
+                "path": None,
+                "bytes": None,
+                "seconds": None,
+                "cached": jobid in cached,
+                "error": errors.get(jobid),
+            }
+            path = os.path.join(out_dir, jobid + "_output" + extension)
+
+            if jobid in cached:
+                report["status"], url = "Complete", None
+            elif jobid in jobs:
+                report["status"], url = self.job_result_url({"job": jobs[jobid]})
+                if url is None:
+                    return report
+            else:
+                return report
+
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    if jobid in cached:
+                        await asyncio.get_running_loop().run_in_executor(
+                            None,
+                            save_result_csv,
+                            cached[jobid],
+                            path,
+                            output_format,
+                            compression,
+                            row_group_size,
+                        )
+                    else:
+                        await self.save_result_url(
+                            url,
+                            path,
+                            output_format,
+                            chunk_size,
+                            compression,
+                            row_group_size,
+                            jobid=jobid,
+                        )
+                except Exception as e:
+                    print(
+                        "The following error occurred downloading the result of {}: {}".format(
+                            jobid, e
+                        ),
+                        file=sys.stderr,
+                    )
+                    report["error"] = str(e)
+                    return report
+                report["seconds"] = time.perf_counter() - start
+
+            report["path"] = path
+            report["bytes"] = os.path.getsize(path)
+
+            return report
+
+        return await asyncio.gather(*[download_job(jobid) for jobid in job_ids])
+
+    async def diff_job_results(self, old_job, new_job, partitions=None, out_path=None):
+        """Diff the hash results of two jobs of the same volume, see diff.diff_result_files.
+        Both results are downloaded at the same time into a temp directory. With partitions,
+        results too big for memory are diffed one partition at a time, and with out_path
+        the change set is written there as csv.
+        Output: change set dataframe, or with out_path the number of changes of each type."""
+
+        from .diff import diff_result_files
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            downloads = await asyncio.gather(
+                *[
+                    self.download_job_result_to_file(
+                        jobid, os.path.join(tmp_dir, "{}.csv".format(i))
+                    )
+                    for i, jobid in enumerate([old_job, new_job])
+                ]
+            )
+
+            for jobid, (job_status, path) in zip([old_job, new_job], downloads):
+                if path is None:
+                    raise ValueError(
+                        "Job {} has no result to diff. Job status: {}".format(
+                            jobid, job_status
+                        )
+                    )
+
+            return await asyncio.get_running_loop().run_in_executor(
+                None,
+                diff_result_files,
+                downloads[0][1],
+                downloads[1][1],
+                partitions,
+                out_path,
+            )
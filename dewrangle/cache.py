@@ -0,0 +1,483 @@
+"""Caches of Dewrangle lookups and job results.
+
+Organizations, studies, study organizations, billing groups, credentials and
+study volumes are cached for a configurable time to live, optionally backed by
+a JSON file so the cache survives between runs. Mutations invalidate the
+entries they change.
+
+Completed job results are cached on disk, see ResultCache, and the studies
+each volume name is loaded in are indexed on disk, see VolumeIndex.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import shutil
+import hashlib
+
+# default seconds to keep a lookup
+RESOLUTION_TTL = 300
+
+RESOLUTION_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".dewrangle", "cache", "resolution"
+)
+
+# default bytes of job results kept on disk
+RESULT_CACHE_SIZE = 10 * 2**30
+
+RESULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".dewrangle", "cache", "results")
+
+# default seconds before the volumes of a study are indexed again
+VOLUME_INDEX_MAX_AGE = 24 * 60 * 60
+
+VOLUME_INDEX_DIR = os.path.join(os.path.expanduser("~"), ".dewrangle", "cache", "volumes")
+
+
+def resolution_cache_path(endpoint, api_key):
+    """Path of the on-disk resolution cache for an endpoint and api key."""
+    key = hashlib.sha256("{}\n{}".format(endpoint, api_key).encode()).hexdigest()[:16]
+    return os.path.join(RESOLUTION_CACHE_DIR, key + ".json")
+
+
+def volume_index_path(endpoint, api_key):
+    """Path of the on-disk volume index for an endpoint and api key."""
+    key = hashlib.sha256("{}\n{}".format(endpoint, api_key).encode()).hexdigest()[:16]
+    return os.path.join(VOLUME_INDEX_DIR, key + ".json")
+
+
+class ResolutionCache:
+    """Time limited cache of lookups, keyed by kind (e.g. "studies") and scope (e.g. a study id).
+    A ttl of 0 turns caching off. Changes are written to the backing file by flush(),
+    which the clients call when they close, so a batch of lookups is written once."""
+
+    def __init__(self, ttl=RESOLUTION_TTL, path=None):
+        self.ttl = ttl
+        self.path = path
+        self.entries = {}
+        self.pending = {}
+        # changed since the backing file was last written
+        self.dirty = False
+
+        if self.path is not None:
+            self.load()
+
+    def get(self, kind, scope=None):
+        """Get a cached value, or None if it is missing or expired."""
+
+        entry = self.entries.get((kind, scope))
+
+        if entry is None or time.time() - entry["time"] > self.ttl:
+            return None
+
+        return entry["value"]
+
+    def set(self, kind, scope, value):
+        """Cache a value."""
+
+        if self.ttl:
+            self.entries[(kind, scope)] = {"time": time.time(), "value": value}
+            self.dirty = True
+
+        return
+
+    def invalidate(self, kind=None, scope=None):
+        """Drop cached values. Without a kind everything is dropped,
+        without a scope every value of the kind is dropped."""
+
+        for entry_kind, entry_scope in list(self.entries):
+            if kind is None or (
+                entry_kind == kind and (scope is None or entry_scope == scope)
+            ):
+                del self.entries[(entry_kind, entry_scope)]
+                self.dirty = True
+
+        return
+
+    def get_index(self, kind, scope, build):
+        """Get an index built from a cached value with build(value),
+        building it the first time it is asked for. None if the value is not cached."""
+
+        if self.get(kind, scope) is None:
+            return None
+
+        entry = self.entries[(kind, scope)]
+        if "index" not in entry:
+            entry["index"] = build(entry["value"])
+
+        return entry["index"]
+
+    async def get_or_fetch(self, kind, scope, fetch):
+        """Get a cached value, or await fetch() and cache the result.
+        Concurrent callers asking for the same missing value share one fetch."""
+
+        value = self.get(kind, scope)
+        if value is not None:
+            return value
+
+        key = (kind, scope)
+
+        async def fetch_and_set():
+            try:
+                value = await fetch()
+                self.set(kind, scope, value)
+                return value
+            finally:
+                del self.pending[key]
+
+        if key not in self.pending:
+            self.pending[key] = asyncio.ensure_future(fetch_and_set())
+
+        return await asyncio.shield(self.pending[key])
+
+    def load(self):
+        """Read cached values from the backing file."""
+
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        for entry in stored:
+            self.entries[(entry["kind"], entry["scope"])] = {
+                "time": entry["time"],
+                "value": entry["value"],
+            }
+
+        return
+
+    def flush(self):
+        """Write cached values to the backing file if they changed since the last write."""
+
+        if self.dirty:
+            self.save()
+
+        return
+
+    def save(self):
+        """Write cached values to the backing file, if there is one."""
+
+        self.dirty = False
+        if self.path is None:
+            return
+
+        stored = [
+            {"kind": kind, "scope": scope, "time": entry["time"], "value": entry["value"]}
+            for (kind, scope), entry in self.entries.items()
+        ]
+
+        # write to a temp file and rename so readers never see a partial cache
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(stored, f)
+        os.replace(tmp_path, self.path)
+
+        return
+
+
+class VolumeIndex:
+    """Reverse index of volume name to the ids of the studies it is loaded in.
+
+    The volumes are kept per study with the time they were queried, so the index
+    is refreshed one study at a time, and optionally backed by a JSON file so
+    lookups can be answered offline. The file is read on first use, and the name
+    to study ids index is built from the studies on the first lookup after a change."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.studies = {}
+        self.names = None
+        # nothing to read without a backing file
+        self.loaded = path is None
+
+    def ensure_loaded(self):
+        """Read the index from the backing file, if it hasn't been read yet."""
+
+        if not self.loaded:
+            self.load()
+
+        return
+
+    def lookup(self, volume_name):
+        """Get the ids of the studies a volume is loaded in, once per time it is loaded."""
+
+        self.ensure_loaded()
+        if self.names is None:
+            self.names = {}
+            for study_id, entry in self.studies.items():
+                for name in entry["volumes"].values():
+                    self.names.setdefault(name, []).append(study_id)
+
+        return list(self.names.get(volume_name, []))
+
+    def stale_studies(self, study_ids, max_age=VOLUME_INDEX_MAX_AGE):
+        """List the studies that aren't indexed or were indexed more than max_age seconds ago."""
+
+        self.ensure_loaded()
+        now = time.time()
+
+        return [
+            study_id
+            for study_id in study_ids
+            if study_id not in self.studies
+            or now - self.studies[study_id]["time"] > max_age
+        ]
+
+    def update(self, study_volumes):
+        """Index the volumes of studies, from a dictionary of study id: {volume id: name}."""
+
+        self.ensure_loaded()
+        now = time.time()
+        for study_id, volumes in study_volumes.items():
+            self.studies[study_id] = {"time": now, "volumes": dict(volumes)}
+
+        self.names = None
+        self.save()
+
+        return
+
+    def retain(self, study_ids):
+        """Drop the studies that aren't in study_ids, e.g. deleted or no longer visible."""
+
+        self.ensure_loaded()
+        study_ids = set(study_ids)
+        removed = [study_id for study_id in self.studies if study_id not in study_ids]
+
+        for study_id in removed:
+            del self.studies[study_id]
+
+        if removed:
+            self.names = None
+            self.save()
+
+        return
+
+    def invalidate(self, study_id=None, volume_id=None):
+        """Mark a study as stale so it is queried on the next refresh, either by id or by
+        the id of one of its volumes. Without either, every study is marked stale."""
+
+        self.ensure_loaded()
+        changed = False
+        for entry_study_id, entry in self.studies.items():
+            if entry["time"] and (
+                (study_id is None and volume_id is None)
+                or entry_study_id == study_id
+                or volume_id in entry["volumes"]
+            ):
+                entry["time"] = 0
+                changed = True
+
+        # only rewrite the file if a study was marked stale
+        if changed:
+            self.save()
+
+        return
+
+    def load(self):
+        """Read the index from the backing file."""
+
+        self.loaded = True
+        try:
+            with open(self.path) as f:
+                self.studies = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        self.names = None
+
+        return
+
+    def save(self):
+        """Write the index to the backing file, if there is one."""
+
+        if self.path is None:
+            return
+
+        # write to a temp file and rename so readers never see a partial index
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(self.studies, f)
+        os.replace(tmp_path, self.path)
+
+        return
+
+
+class ResultCache:
+    """On-disk cache of completed job result csv files, keyed by job id.
+
+    The result of a completed job never changes, so a cached result is served
+    without querying Dewrangle at all. Each result is stored as <key>.csv with a
+    <key>.json file holding its job id, size, and sha256, which are checked
+    before a result is used. The json file's modification time records the last
+    use, and the least recently used results are evicted once the cache is
+    larger than max_size bytes."""
+
+    def __init__(
+        self,
+        directory=RESULT_CACHE_DIR,
+        max_size=RESULT_CACHE_SIZE,
+        namespace="",
+        verify=True,
+    ):
+        self.directory = directory
+        self.max_size = max_size
+        self.namespace = namespace
+        self.verify = verify
+        # in-flight downloads, job id: future of the cached path, shared by concurrent callers
+        self.pending = {}
+
+    def key(self, job_id):
+        """File name stem for a job, unique per namespace (the endpoint)."""
+        return hashlib.sha256(
+            "{}\n{}".format(self.namespace, job_id).encode()
+        ).hexdigest()[:32]
+
+    def result_path(self, job_id):
+        """Path of the cached result csv of a job."""
+        return os.path.join(self.directory, self.key(job_id) + ".csv")
+
+    def get(self, job_id):
+        """Get the path of the cached result of a job, or None if it isn't cached.
+        Results that fail the size or sha256 check are dropped."""
+
+        path = self.result_path(job_id)
+        meta_path = os.path.splitext(path)[0] + ".json"
+
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            size = os.path.getsize(path)
+        except (OSError, ValueError):
+            return None
+
+        if meta.get("job_id") != job_id or meta.get("size") != size or (
+            self.verify and meta.get("sha256") != file_sha256(path)
+        ):
+            print(
+                "Cached result of {} failed its integrity check, dropping it".format(
+                    job_id
+                ),
+                file=sys.stderr,
+            )
+            self.remove(job_id)
+            return None
+
+        # mark as recently used
+        os.utime(meta_path)
+
+        return path
+
+    def put(self, job_id, src_path, move=True):
+        """Add a downloaded result csv to the cache and evict old results if needed.
+        The file is moved into the cache, or with move=False hard linked so src_path stays,
+        and copied instead if the cache is on another file system.
+        Returns the cached path, or None if the result is too big to cache."""
+
+        size = os.path.getsize(src_path)
+        if size > self.max_size:
+            return None
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.result_path(job_id)
+        meta_path = os.path.splitext(path)[0] + ".json"
+
+        meta = {"job_id": job_id, "size": size, "sha256": file_sha256(src_path)}
+
+        # add under a temp name and rename so readers never see a partial result
+        csv_tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            if move:
+                os.replace(src_path, csv_tmp_path)
+            else:
+                os.link(src_path, csv_tmp_path)
+        except OSError:
+            shutil.copyfile(src_path, csv_tmp_path)
+        os.replace(csv_tmp_path, path)
+
+        tmp_path = "{}.{}.tmp".format(meta_path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+        self.evict()
+
+        return path
+
+    def remove(self, job_id):
+        """Drop the cached result of a job."""
+
+        path = self.result_path(job_id)
+        for remove_path in [os.path.splitext(path)[0] + ".json", path]:
+            try:
+                os.remove(remove_path)
+            except FileNotFoundError:
+                pass
+
+        return
+
+    def entries(self):
+        """List (last used time, size, json path) of the cached results."""
+
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return entries
+
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            meta_path = os.path.join(self.directory, name)
+            csv_path = os.path.splitext(meta_path)[0] + ".csv"
+            try:
+                entries.append(
+                    (os.path.getmtime(meta_path), os.path.getsize(csv_path), meta_path)
+                )
+            except OSError:
+                continue
+
+        return entries
+
+    def evict(self):
+        """Remove the least recently used results until the cache fits in max_size."""
+
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, meta_path in entries:
+            if total <= self.max_size:
+                break
+            for remove_path in [meta_path, os.path.splitext(meta_path)[0] + ".csv"]:
+                try:
+                    os.remove(remove_path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+        return
+
+    def clear(self):
+        """Remove every cached result."""
+
+        for _, _, meta_path in self.entries():
+            for remove_path in [meta_path, os.path.splitext(meta_path)[0] + ".csv"]:
+                try:
+                    os.remove(remove_path)
+                except FileNotFoundError:
+                    pass
+
+        return
+
+
+def file_sha256(path):
+    """sha256 hex digest of a file, read in chunks."""
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
@@ -0,0 +1,179 @@
+"""The `dewrangle` command, with a subcommand for each wrapper script.
+
+    dewrangle list_job_status -j <job_id>
+
+`dewrangle batch` reads one command per line from a file or stdin and runs
+them all in one process, sharing one client, its caches, and its connection
+pool, so many small commands pay for one startup:
+
+    dewrangle batch -f commands.txt
+"""
+import sys
+import shlex
+import argparse
+import importlib
+import traceback
+
+# script modules in dewrangle.scripts, run as subcommands
+COMMANDS = [
+    "add_and_hash_volume",
+    "create_study",
+    "delete_volume",
+    "diff_job_results",
+    "download_job_result",
+    "get_study_by_volume",
+    "hash_volume",
+    "hash_volume_list",
+    "list_billing_groups",
+    "list_credentials",
+    "list_job_status",
+    "list_study_id",
+    "list_volume_files",
+    "list_volume_jobs",
+    "list_volumes_in_study",
+]
+
+
+def usage():
+    """Usage message listing the subcommands."""
+
+    return "usage: dewrangle <command> [options], or dewrangle batch [-f FILE]\n\ncommands:\n{}\n".format(
+        "\n".join("  " + command for command in COMMANDS + ["batch"])
+    )
+
+
+def run_command(command, args):
+    """Run a script's main with its arguments. Dashes in the command name are accepted
+    for underscores, e.g. list-job-status."""
+
+    name = command.replace("-", "_")
+    if name not in COMMANDS:
+        raise ValueError("Unknown command: {}\n{}".format(command, usage()))
+
+    # scripts are imported on first use, so a command only loads what it needs
+    module = importlib.import_module("dewrangle.scripts." + name)
+
+    # argparse names the script after sys.argv[0] in its usage messages
+    argv = ["dewrangle " + name] + list(args)
+    sys.argv = argv
+
+    return module.main(argv)
+
+
+def parse_batch_args(args):
+    """Get batch arguments."""
+    parser = argparse.ArgumentParser(prog="dewrangle batch")
+    parser.add_argument(
+        "-f",
+        "--file",
+        help="Optional, file with one command per line, e.g. 'list_job_status -j <job_id>'. Default: read stdin",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--stop-on-error",
+        help="Optional, stop at the first command that fails. Default: run every command",
+        action="store_true",
+        required=False,
+    )
+
+    # parse and return arguments
+    args = parser.parse_args(args)
+    file = args.file
+    stop_on_error = args.stop_on_error
+
+    return file, stop_on_error
+
+
+class BatchLineError(ValueError):
+    """A batch line that isn't a command, e.g. an unknown command or an unbalanced quote."""
+
+
+def parse_line(line):
+    """Split a batch line into a command and its arguments, dropping a leading "dewrangle".
+    Returns an empty list if there is no command on the line."""
+
+    try:
+        args = shlex.split(line)
+    except ValueError as e:
+        raise BatchLineError(e) from None
+
+    if args[:1] == ["dewrangle"]:
+        args = args[1:]
+
+    if args and args[0].replace("-", "_") not in COMMANDS:
+        raise BatchLineError("unknown command {}".format(args[0]))
+
+    return args
+
+
+def run_batch(lines, stop_on_error=False):
+    """Run one command per line in this process, with one shared client.
+    Blank lines and lines starting with # are skipped, and a leading "dewrangle" is optional.
+    Returns the number of commands that failed."""
+
+    from .utils import get_default_client
+
+    failed = 0
+
+    # keep the shared client open across commands, the scripts' own blocks reuse it
+    with get_default_client():
+        for line_number, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            try:
+                args = parse_line(line)
+                if args:
+                    run_command(args[0], args[1:])
+            except SystemExit as e:
+                # argparse errors and --help exit, a failed command shouldn't end the batch
+                if e.code not in (0, None):
+                    failed += 1
+                    print("line {}: exited with {}".format(line_number, e.code), file=sys.stderr)
+            except BatchLineError as e:
+                failed += 1
+                print("line {}: {}".format(line_number, e), file=sys.stderr)
+            except Exception:
+                failed += 1
+                print("line {}: {}".format(line_number, line), file=sys.stderr)
+                traceback.print_exc()
+
+            if failed and stop_on_error:
+                break
+
+    return failed
+
+
+def main(args=None):
+    """Main, take args, run the subcommand."""
+
+    if args is None:
+        args = sys.argv[1:]
+
+    if not args or args[0] in ["-h", "--help"]:
+        print(usage())
+        return
+
+    if args[0] != "batch":
+        if args[0].replace("-", "_") not in COMMANDS:
+            sys.exit("Unknown command: {}\n{}".format(args[0], usage()))
+        run_command(args[0], args[1:])
+        return
+
+    file, stop_on_error = parse_batch_args(args[1:])
+
+    if file is None:
+        failed = run_batch(sys.stdin, stop_on_error)
+    else:
+        with open(file) as f:
+            failed = run_batch(f, stop_on_error)
+
+    if failed:
+        sys.exit("{} command(s) failed".format(failed))
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main()
@@ -0,0 +1,189 @@
+"""Compare two hash results of the same volume.
+
+Results are joined on path with a vectorized hash join and every path that
+differs is reported once in a compact change set:
+
+    path, change, old_size, new_size, changed
+
+where change is one of
+    added - only in the new result
+    removed - only in the old result
+    modified - the size or etag changed
+    hash_changed - same size and etag, but a hash changed
+and changed lists the columns that differ. Results too big to diff in memory
+are split into partitions by a hash of the path and diffed one partition at a time.
+"""
+import os
+import tempfile
+import pandas as pd
+from .results import RESULT_DTYPES, parse_result_csv
+
+# columns that tell a file was modified, and the hash columns
+MODIFIED_COLUMNS = ["size", "etag"]
+HASH_COLUMNS = ["md5", "sha1", "sha256", "crc32c"]
+
+CHANGE_COLUMNS = ["path", "change", "old_size", "new_size", "changed"]
+
+# rows read at a time when partitioning a result
+CHUNK_ROWS = 1000000
+
+
+def differs(old, new):
+    """Element-wise check that two columns differ where both have a value."""
+    return ((old != new) & old.notna() & new.notna()).fillna(False).astype(bool)
+
+
+def diff_results(old, new):
+    """Diff two job result dataframes on path.
+    Output: dataframe of the paths that changed with CHANGE_COLUMNS."""
+
+    merged = old.merge(
+        new, on="path", how="outer", suffixes=("_old", "_new"), indicator=True
+    )
+    both = merged["_merge"] == "both"
+
+    # columns present in both results, other than path
+    compare_columns = [
+        column
+        for column in MODIFIED_COLUMNS + HASH_COLUMNS
+        if column in old.columns and column in new.columns
+    ]
+    column_differs = {
+        column: differs(merged[column + "_old"], merged[column + "_new"]) & both
+        for column in compare_columns
+    }
+
+    modified = pd.Series(False, index=merged.index)
+    for column in MODIFIED_COLUMNS:
+        if column in column_differs:
+            modified |= column_differs[column]
+
+    hash_changed = pd.Series(False, index=merged.index)
+    for column in HASH_COLUMNS:
+        if column in column_differs:
+            hash_changed |= column_differs[column]
+    hash_changed &= ~modified
+
+    change = pd.Series(pd.NA, index=merged.index, dtype="string")
+    change[merged["_merge"] == "right_only"] = "added"
+    change[merged["_merge"] == "left_only"] = "removed"
+    change[modified] = "modified"
+    change[hash_changed] = "hash_changed"
+
+    changed_rows = change.notna()
+
+    # list the differing columns, e.g. "size;md5"
+    changed = pd.Series("", index=merged.index, dtype="string")
+    for column, column_diff in column_differs.items():
+        changed = changed.where(~column_diff, changed + column + ";")
+    changed = changed.str.rstrip(";")
+
+    changes = pd.DataFrame(
+        {
+            "path": merged["path"],
+            "change": change,
+            "old_size": merged["size_old"] if "size" in compare_columns else pd.NA,
+            "new_size": merged["size_new"] if "size" in compare_columns else pd.NA,
+            "changed": changed,
+        }
+    )
+
+    return changes[changed_rows].reset_index(drop=True)
+
+
+def partition_result(path, out_dir, name, partitions, chunk_rows=CHUNK_ROWS):
+    """Split a job result csv into partition csv files by a hash of the path,
+    reading chunk_rows rows at a time. Returns the list of partition paths."""
+
+    paths = [
+        os.path.join(out_dir, "{}_{}.csv".format(name, partition))
+        for partition in range(partitions)
+    ]
+    written = set()
+
+    reader = pd.read_csv(path, dtype=RESULT_DTYPES, chunksize=chunk_rows)
+    for chunk in reader:
+        buckets = pd.util.hash_pandas_object(chunk["path"], index=False) % partitions
+        for partition, rows in chunk.groupby(buckets.to_numpy()):
+            rows.to_csv(
+                paths[partition],
+                mode="a",
+                header=partition not in written,
+                index=False,
+            )
+            written.add(partition)
+
+    # make sure every partition exists, even if no path hashed to it
+    header = pd.read_csv(path, nrows=0).columns
+    for partition in set(range(partitions)) - written:
+        pd.DataFrame(columns=header).to_csv(paths[partition], index=False)
+
+    return paths
+
+
+def iter_diff_result_files(old_path, new_path, partitions=16, chunk_rows=CHUNK_ROWS):
+    """Diff two job result csv files that may not fit in memory, one partition at a time.
+    Both files are split into partitions by a hash of the path in a temp directory,
+    so memory use is about one partition of each result.
+    Yields a change set dataframe per partition."""
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        old_parts = partition_result(old_path, tmp_dir, "old", partitions, chunk_rows)
+        new_parts = partition_result(new_path, tmp_dir, "new", partitions, chunk_rows)
+
+        for old_part, new_part in zip(old_parts, new_parts):
+            yield diff_results(parse_result_csv(old_part), parse_result_csv(new_part))
+
+
+def diff_result_files(
+    old_path, new_path, partitions=None, out_path=None, chunk_rows=CHUNK_ROWS
+):
+    """Diff two job result csv files.
+    Without partitions, both are read in memory. With partitions, they are diffed in
+    that many partitions, see iter_diff_result_files.
+    Output: change set dataframe, or with out_path the change set is written there as csv,
+    one partition at a time, and the number of changes of each type is returned."""
+
+    if partitions is None:
+        changes = diff_results(parse_result_csv(old_path), parse_result_csv(new_path))
+        if out_path is None:
+            return changes
+        changes.to_csv(out_path, index=False)
+        return changes["change"].value_counts().to_dict()
+
+    if out_path is None:
+        return pd.concat(
+            iter_diff_result_files(old_path, new_path, partitions, chunk_rows),
+            ignore_index=True,
+        )
+
+    counts = {}
+    tmp_path = "{}.{}.tmp".format(out_path, os.getpid())
+    try:
+        pd.DataFrame(columns=CHANGE_COLUMNS).to_csv(tmp_path, index=False)
+        for changes in iter_diff_result_files(old_path, new_path, partitions, chunk_rows):
+            changes.to_csv(tmp_path, mode="a", header=False, index=False)
+            for change, count in changes["change"].value_counts().items():
+                counts[change] = counts.get(change, 0) + count
+        os.replace(tmp_path, out_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return counts
+
+
+def changed_prefixes(paths):
+    """Smallest set of directory prefixes that covers the changed paths,
+    e.g. s3://bucket/a/b/x and s3://bucket/a/y give s3://bucket/a/"""
+
+    directories = sorted({path.rsplit("/", 1)[0] + "/" for path in paths})
+
+    prefixes = []
+    for directory in directories:
+        # sorted, so a directory comes right after any prefix that covers it
+        if prefixes and directory.startswith(prefixes[-1]):
+            continue
+        prefixes.append(directory)
+
+    return prefixes
@@ -0,0 +1,300 @@
+"""Download large job results with concurrent HTTP range requests.
+
+The result is split into parts that several workers fetch at the same time and
+write into place in a partial file next to the destination. Progress is kept in
+a small state file, so an interrupted download can be resumed instead of
+started over, and a dropped connection only retries the rest of its part.
+Servers that don't support range requests are downloaded in a single stream.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import aiohttp
+
+# bytes read at a time when streaming a download to disk
+CHUNK_SIZE = 1024 * 1024
+
+# smallest part fetched by one range request
+MIN_PART_SIZE = 8 * 1024 * 1024
+
+# times a part is retried after a dropped connection
+RETRIES = 3
+
+# result downloads can take far longer than the session's default 5 minute limit,
+# so they have no total limit and only fail if the server stops sending data
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=60, sock_read=300)
+
+
+class ProgressReporter:
+    """Print download progress and throughput to stderr, at most every interval seconds."""
+
+    def __init__(self, name="", interval=1.0, file=sys.stderr):
+        self.name = name
+        self.interval = interval
+        self.file = file
+        self.start = None
+        self.start_done = 0
+        self.last = 0
+
+    def __call__(self, done, total):
+        now = time.monotonic()
+        if self.start is None:
+            # a resumed download starts with some bytes done already
+            self.start = now
+            self.start_done = done
+
+        if now - self.last < self.interval and done != total:
+            return
+        self.last = now
+
+        elapsed = now - self.start
+        rate = (done - self.start_done) / elapsed if elapsed else 0
+        mib = 2**20
+        if total:
+            message = "{:.1f} of {:.1f} MiB ({:.0%})".format(
+                done / mib, total / mib, done / total
+            )
+        else:
+            message = "{:.1f} MiB".format(done / mib)
+
+        print(
+            "{}{}, {:.1f} MiB/s".format(
+                self.name + ": " if self.name else "", message, rate / mib
+            ),
+            file=self.file,
+        )
+
+
+async def probe_range_support(session, url, **kwargs):
+    """Check if the server supports range requests for url.
+    Returns the total size in bytes, or None if ranges aren't supported."""
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    headers["Range"] = "bytes=0-0"
+
+    async with session.get(url, headers=headers, **kwargs) as response:
+        content_range = response.headers.get("Content-Range", "")
+        if response.status != 206 or "/" not in content_range:
+            return None
+
+        total = content_range.rsplit("/", 1)[1]
+        if not total.isdigit():
+            return None
+
+    return int(total)
+
+
+def split_parts(total, workers):
+    """Split total bytes into [start, end, done] parts, with a few parts per worker."""
+
+    part_size = max(MIN_PART_SIZE, -(-total // (workers * 4)))
+
+    return [
+        [start, min(start + part_size, total) - 1, 0]
+        for start in range(0, total, part_size)
+    ]
+
+
+def load_state(state_path, total):
+    """Read the parts of an interrupted download, or None if there is no matching state."""
+
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if state.get("total") != total:
+        return None
+
+    return state["parts"]
+
+
+def sync_file(f):
+    """Flush a file's buffered writes and have the os write them to disk."""
+
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def save_state(state_path, total, parts):
+    """Write the parts of a download so it can be resumed."""
+
+    tmp_path = "{}.{}.tmp".format(state_path, os.getpid())
+    with open(tmp_path, "w") as f:
+        json.dump({"total": total, "parts": parts}, f)
+    os.replace(tmp_path, state_path)
+
+
+async def download_ranges(
+    session,
+    url,
+    path,
+    total,
+    workers=4,
+    chunk_size=CHUNK_SIZE,
+    resume=False,
+    retries=RETRIES,
+    progress=None,
+    **kwargs
+):
+    """Download url to path with workers concurrent range requests.
+    The parts are written into path + ".part" and renamed to path when all are complete.
+    With resume, the parts already in the partial file of an earlier attempt are kept."""
+
+    part_path = path + ".part"
+    state_path = part_path + ".json"
+    headers = kwargs.pop("headers", None) or {}
+
+    parts = None
+    if resume and os.path.exists(part_path):
+        parts = load_state(state_path, total)
+    if parts is None:
+        parts = split_parts(total, workers)
+        with open(part_path, "wb") as f:
+            f.truncate(total)
+
+    done = sum(part[2] for part in parts)
+    if progress is not None:
+        progress(done, total)
+
+    queue = asyncio.Queue()
+    for part in parts:
+        if part[0] + part[2] <= part[1]:
+            queue.put_nowait(part)
+
+    async def fetch_part(f, part):
+        """Fetch the rest of a part, retrying dropped connections from where they stopped."""
+
+        nonlocal done
+
+        for attempt in range(retries + 1):
+            start, end = part[0] + part[2], part[1]
+            try:
+                range_headers = dict(headers, Range="bytes={}-{}".format(start, end))
+                async with session.get(url, headers=range_headers, **kwargs) as response:
+                    if response.status != 206:
+                        raise RuntimeError(
+                            "Range request for {} failed. Status code: {}".format(
+                                url, response.status
+                            )
+                        )
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        # never write past the end of the part
+                        chunk = chunk[: part[1] - part[0] - part[2] + 1]
+                        f.seek(part[0] + part[2])
+                        f.write(chunk)
+                        # the saved state counts this chunk as soon as part[2] grows,
+                        # including from other workers, so nothing may stay buffered
+                        f.flush()
+                        part[2] += len(chunk)
+                        done += len(chunk)
+                        if progress is not None:
+                            progress(done, total)
+                if part[0] + part[2] > part[1]:
+                    return
+                raise aiohttp.ClientPayloadError(
+                    "Connection closed before the end of the part"
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == retries:
+                    raise
+
+    async def worker():
+        with open(part_path, "r+b") as f:
+            while not queue.empty():
+                part = queue.get_nowait()
+                await fetch_part(f, part)
+                # the parts must be on disk before the state says they are done
+                sync_file(f)
+                save_state(state_path, total, parts)
+
+    tasks = [asyncio.ensure_future(worker()) for _ in range(workers)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # stop the other workers if one failed, and keep what was downloaded for a resume
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        with open(part_path, "r+b") as f:
+            sync_file(f)
+        save_state(state_path, total, parts)
+
+    os.replace(part_path, path)
+    os.remove(state_path)
+
+    return path
+
+
+async def download_stream(
+    session, url, path, chunk_size=CHUNK_SIZE, progress=None, **kwargs
+):
+    """Download url to path in a single stream.
+    The body is written to a temp file next to path and renamed when complete,
+    so path is never left partially written."""
+
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+
+    try:
+        async with session.get(url, **kwargs) as response:
+            # check if the request was successful
+            if response.status != 200:
+                raise RuntimeError(
+                    "Failed to fetch {}. Status code: {}".format(url, response.status)
+                )
+            total = response.content_length
+            done = 0
+            with open(tmp_path, "wb") as f:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    f.write(chunk)
+                    done += len(chunk)
+                    if progress is not None:
+                        progress(done, total)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return path
+
+
+async def download(
+    session,
+    url,
+    path,
+    chunk_size=CHUNK_SIZE,
+    workers=1,
+    resume=False,
+    progress=None,
+    **kwargs
+):
+    """Download url to path, with range requests when workers > 1 or resume is set
+    and the server supports them, otherwise in a single stream."""
+
+    kwargs.setdefault("timeout", DOWNLOAD_TIMEOUT)
+
+    if workers > 1 or resume:
+        total = await probe_range_support(session, url, **kwargs)
+        if total:
+            return await download_ranges(
+                session,
+                url,
+                path,
+                total,
+                workers,
+                chunk_size,
+                resume,
+                progress=progress,
+                **kwargs
+            )
+        print(
+            "Range requests aren't supported for {}, downloading in one stream".format(
+                url
+            ),
+            file=sys.stderr,
+        )
+
+    return await download_stream(session, url, path, chunk_size, progress, **kwargs)
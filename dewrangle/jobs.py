@@ -0,0 +1,125 @@
+"""Index of the jobs run on a volume.
+
+The jobs of a volume are fetched once and kept in array-backed columns:
+numpy datetime64 timestamps and categorical operation codes. The latest job
+and the latest completed job of each operation are found once when the index
+is built, so volumes with tens of thousands of jobs are cheap to query
+repeatedly.
+"""
+import numpy as np
+import pandas as pd
+
+# short job type names accepted for operations
+JOB_TYPES = {
+    "HASH": "VOLUME_HASH",
+    "VOLUME_HASH": "VOLUME_HASH",
+    "LIST": "VOLUME_LIST",
+    "VOLUME_LIST": "VOLUME_LIST",
+}
+
+
+def job_operation(job_type):
+    """Get the job operation from a job type, e.g. "hash" gives "VOLUME_HASH"."""
+
+    operation = JOB_TYPES.get(job_type.upper())
+    if operation is None:
+        raise ValueError("Unsupported job type: {}".format(job_type))
+
+    return operation
+
+
+def parse_timestamps(values):
+    """Parse createdAt or completedAt strings to a datetime64 array, NaT where missing.
+    The timestamps are UTC ISO 8601 strings ending in Z, which numpy parses without
+    the Z far faster than strptime."""
+    return np.array(
+        [value[:-1] if value else "NaT" for value in values], dtype="datetime64[us]"
+    )
+
+
+class VolumeJobIndex:
+    """The jobs run on a volume, with the latest job of each operation precomputed."""
+
+    def __init__(self, ids, operations, created, completed):
+        self.ids = np.asarray(ids, dtype=object)
+        operations = pd.Categorical(operations)
+        self.codes = operations.codes
+        self.operations = list(operations.categories)
+        self.created = parse_timestamps(created)
+        self.completed = parse_timestamps(completed)
+
+        # position of the latest job, and of the latest completed job, of each operation
+        self.latest_jobs = {}
+        self.latest_completed = {}
+        done = ~np.isnat(self.completed)
+        for code, operation in enumerate(self.operations):
+            positions = np.flatnonzero(self.codes == code)
+            self.latest_jobs[operation] = positions[np.argmax(self.created[positions])]
+
+            positions = positions[done[positions]]
+            if len(positions):
+                self.latest_completed[operation] = positions[
+                    np.argmax(self.created[positions])
+                ]
+
+    @classmethod
+    def from_nodes(cls, nodes):
+        """Build the index from job nodes with id, operation, createdAt, and completedAt."""
+
+        return cls(
+            [node["id"] for node in nodes],
+            [node["operation"] for node in nodes],
+            [node["createdAt"] for node in nodes],
+            [node["completedAt"] for node in nodes],
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def latest(self, operation, completed=False):
+        """Get the id of the most recently created job of an operation, or None if there is none.
+        With completed, only completed jobs count."""
+
+        latest_jobs = self.latest_completed if completed else self.latest_jobs
+        position = latest_jobs.get(operation)
+
+        return None if position is None else self.ids[position]
+
+    def job_ids(self, operation=None):
+        """List the ids of the jobs, optionally only those of an operation."""
+
+        if operation is None:
+            return list(self.ids)
+
+        if operation not in self.operations:
+            return []
+
+        return list(self.ids[self.codes == self.operations.index(operation)])
+
+    def to_df(self):
+        """Get the jobs as a dataframe with id, operation, createdAt, and completedAt columns."""
+
+        return pd.DataFrame(
+            {
+                "id": self.ids,
+                "operation": pd.Categorical.from_codes(self.codes, self.operations),
+                "createdAt": self.created,
+                "completedAt": self.completed,
+            }
+        )
+
+    def to_dict(self):
+        """Get the jobs as a dictionary of job id: {"operation", "createdAt", "completedAt"},
+        with datetime timestamps and completedAt None for jobs that are still running."""
+
+        created = pd.DatetimeIndex(self.created).to_pydatetime()
+        completed = pd.DatetimeIndex(self.completed).to_pydatetime()
+
+        return {
+            job_id: {
+                "operation": self.operations[code],
+                "createdAt": created[i],
+                "completedAt": None if pd.isna(completed[i]) else completed[i],
+            }
+            for i, (job_id, code) in enumerate(zip(self.ids, self.codes))
+        }
@@ -0,0 +1,719 @@
+"""Registry of the Graphql documents used by the Dewrangle query functions.
+
+Documents are stored as text keyed by operation name and parsed with gql() the
+first time they are used, so each one is only parsed once per process.
+"""
+from gql import gql
+from graphql import validate
+
+QUERIES = {
+    "VolumeCreateMutation": """
+        mutation VolumeCreateMutation($input: VolumeCreateInput!) {
+            volumeCreate(input: $input) {
+                errors {
+                    ... on MutationError {
+                        message
+                        field
+                    }
+                }
+                volume {
+                    name
+                    id
+                }
+            }
+        }
+    """,
+    "StudyCreateMutation": """
+        mutation StudyCreateMutation($input: StudyCreateInput!) {
+            studyCreate(input: $input) {
+                errors {
+                    ... on MutationError {
+                        message
+                        field
+                    }
+                }
+                study {
+                    name
+                    id
+                }
+            }
+        }
+    """,
+    "VolumeListMutation": """
+        mutation VolumeListMutation($id: ID!) {
+            volumeList(id: $id) {
+                errors {
+                    ... on MutationError {
+                        message
+                        field
+                    }
+                }
+                job {
+                    id
+                }
+            }
+        }
+    """,
+    "VolumeListHashMutation": """
+        mutation VolumeListHashMutation($id: ID!, $input: VolumeListAndHashInput!) {
+            volumeListAndHash(id: $id, input: $input) {
+                errors {
+                    ... on MutationError {
+                        message
+                        field
+                    }
+                }
+                job {
+                    id
+                }
+            }
+        }
+    """,
+    "Study_Credentials_Query": """
+        query Study_Credentials_Query($id: ID!, $first: Int, $after: String) {
+            study: node(id: $id) {
+                id
+                ... on Study {
+                    credentials(first: $first, after: $after) {
+                        pageInfo {
+                            hasNextPage
+                            endCursor
+                        }
+                        edges {
+                            node {
+                                id
+                                name
+                                key
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    """,
+    "Organizations_Query": """
+        query Organizations_Query($first: Int, $after: String) {
+            viewer {
+                organizationUsers(first: $first, after: $after) {
+                    pageInfo {
+                        hasNextPage
+                        endCursor
+                    }
+                    edges {
+                        node {
+                            organization {
+                                id
+                                name
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    """,
+    "Study_Org_Query": """
+        query Study_Org_Query($id: ID!) {
+            study: node(id: $id) {
+                ... on Study {
+                    organization {
+                        id
+                    }
+                }
+            }
+        }
+    """,
+    "All_Studies_Query": """
+        query All_Studies_Query($first: Int, $after: String) {
+            viewer {
+                organizationUsers(first: $first, after: $after) {
+                    pageInfo {
+                        hasNextPage
+                        endCursor
+                    }
+                    edges {
+                        node {
+                            organization {
+                                name
+                                id
+                                studies(first: $first) {
+                                    pageInfo {
+                                        hasNextPage
+                                        endCursor
+                                    }
+                                    edges {
+                                        node {
+                                            name
+                                            id
+                                            globalId
+                                        }
+                                    }
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    """,
+    "Org_Studies_Query": """
+        query Org_Studies_Query($id: ID!, $first: Int, $after: String) {
+            organization: node(id: $id) {
+                ... on Organization {
+                    studies(first: $first, after: $after) {
+                        pageInfo {
+                            hasNextPage
+                            endCursor
+                        }
+                        edges {
+                            node {
+                                name
+                                id
+                                globalId
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    """,
+    "Study_Volumes_Query": """
+        query Study_Volumes_Query($id: ID!, $first: Int, $after: String) {
+            study: node(id: $id) {
+                ... on Study {
+                    volumes(first: $first, after: $after) {
+                        pageInfo {
+                            hasNextPage
+                            endCursor
+                        }
+                        edges {
+                            node {
+                                id
+                                name
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    """,
+    "VolumeDelete": """
+        mutation VolumeDelete($id: ID!) {
+            volumeDelete(id: $id) {
+                errors {
+                    ... on MutationError {
+                        message
+                        field
+                    }
+                }
+            }
+        }
+    """,
+    "Study_Context_Query": """
+        query Study_Context_Query($id: ID!, $first: Int) {
+            study: node(id: $id) {
+                id
+                ... on Study {
+                    organization {
+                        id
+                        billingGroups(first: $first) {
+                            pageInfo {
+                                hasNextPage
+                                endCursor
+                            }
+                            edges {
+                                node {
+                                    name
+                                    id
+                                }
+                            }
+                        }
+                    }
+                    volumes(first: $first) {
+                        pageInfo {
+                            hasNextPage
+                            endCursor
+                        }
+                        edges {
+                            node {
+                                id
+                                name
+                            }
+                        }
+                    }
+                    credentials(first: $first) {
+                        pageInfo {
+                            hasNextPage
+                            endCursor
+                        }
+                        edges {
+                            node {
+                                id
+                                name
+                                key
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    """,
+    "Org_Query": """
+        query Org_Query($id: ID!, $first: Int, $after: String) {
+            organization: node(id: $id) {
+                ... on Organization {
+                    billingGroups(first: $first, after: $after) {
+                        pageInfo {
+                            hasNextPage
+                            endCursor
+                        }
+                        edges {
+                            node {
+                                name
+                                id
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    """,
+    "Job_Query": """
+        query Job_Query($id: ID!, $first: Int) {
+            job: node(id: $id) {
+                id
+                ... on Job {
+                    operation
+                    createdAt
+                    completedAt
+                    errors(first: $first) {
+                        pageInfo {
+                            hasNextPage
+                            endCursor
+                        }
+                        edges {
+                            node {
+                                message
+                                id
+                            }
+                        }
+                    }
+                    billingGroup {
+                        name
+                    }
+                    cost {
+                        cents
+                    }
+                    parentJob {
+                        id
+                        operation
+                        createdAt
+                        completedAt
+                        errors(first: $first) {
+                            pageInfo {
+                                hasNextPage
+                                endCursor
+                            }
+                            edges {
+                                node {
+                                    message
+                                    id
+                                }
+                            }
+                        }
+                        billingGroup {
+                            name
+                        }
+                        cost {
+                            cents
+                        }
+                    }
+                    children {
+                        id
+                        operation
+                        createdAt
+                        completedAt
+                        errors(first: $first) {
+                            pageInfo {
+                                hasNextPage
+                                endCursor
+                            }
+                            edges {
+                                node {
+                                    message
+                                    id
+                                }
+                            }
+                        }
+                        billingGroup {
+                            name
+                        }
+                        cost {
+                            cents
+                        }
+                    }
+                }
+            }
+        }
+    """,
+    "Job_Errors_Query": """
+        query Job_Errors_Query($id: ID!, $first: Int, $after: String) {
+            job: node(id: $id) {
+                ... on Job {
+                    errors(first: $first, after: $after) {
+                        pageInfo {
+                            hasNextPage
+                            endCursor
+                        }
+                        edges {
+                            node {
+                                message
+                                id
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    """,
+    "Volume_Job_Query": """
+        query Volume_Job_Query($id: ID!, $first: Int, $after: String) {
+            volume: node(id: $id) {
+                id
+                ... on Volume {
+                    jobs(first: $first, after: $after) {
+                        pageInfo {
+                            hasNextPage
+                            endCursor
+                        }
+                        edges {
+                            node {
+                                id
+                                operation
+                                completedAt
+                                createdAt
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    """,
+}
+
+# fragments selected on every node of a bulk node lookup (see get_nodes_query)
+# with the variables they use
+FRAGMENTS = {
+    "NodeFields": (
+        """
+        fragment NodeFields on Node {
+            id
+        }
+    """,
+        "",
+    ),
+    "VolumeFields": (
+        """
+        fragment VolumeFields on Volume {
+            id
+            name
+        }
+    """,
+        "",
+    ),
+    "StudyVolumesFields": (
+        """
+        fragment StudyVolumesFields on Study {
+            volumes(first: $first) {
+                pageInfo {
+                    hasNextPage
+                    endCursor
+                }
+                edges {
+                    node {
+                        id
+                        name
+                    }
+                }
+            }
+        }
+    """,
+        "$first: Int",
+    ),
+    "JobStatusFields": (
+        """
+        fragment JobStatusFields on Job {
+            id
+            operation
+            createdAt
+            completedAt
+        }
+    """,
+        "",
+    ),
+    "JobResultFields": (
+        """
+        fragment JobResultFields on Job {
+            id
+            operation
+            completedAt
+            children {
+                id
+                operation
+            }
+        }
+    """,
+        "",
+    ),
+    "JobFields": (
+        """
+        fragment JobFields on Job {
+            id
+            operation
+            createdAt
+            completedAt
+            errors(first: $first) {
+                pageInfo {
+                    hasNextPage
+                    endCursor
+                }
+                edges {
+                    node {
+                        message
+                        id
+                    }
+                }
+            }
+            billingGroup {
+                name
+            }
+            cost {
+                cents
+            }
+            parentJob {
+                id
+                operation
+                createdAt
+                completedAt
+                errors(first: $first) {
+                    pageInfo {
+                        hasNextPage
+                        endCursor
+                    }
+                    edges {
+                        node {
+                            message
+                            id
+                        }
+                    }
+                }
+                billingGroup {
+                    name
+                }
+                cost {
+                    cents
+                }
+            }
+            children {
+                id
+                operation
+                createdAt
+                completedAt
+                errors(first: $first) {
+                    pageInfo {
+                        hasNextPage
+                        endCursor
+                    }
+                    edges {
+                        node {
+                            message
+                            id
+                        }
+                    }
+                }
+                billingGroup {
+                    name
+                }
+                cost {
+                    cents
+                }
+            }
+        }
+    """,
+        "$first: Int",
+    ),
+}
+
+# mutations run many times in one request by get_bulk_mutation, with their
+# arguments, the variables of one alias, and the fields selected on each result;
+# {0} is replaced with the alias number
+BULK_MUTATIONS = {
+    "volumeCreate": (
+        "input: $input{0}",
+        "$input{0}: VolumeCreateInput!",
+        """
+            errors {
+                ... on MutationError {
+                    message
+                    field
+                }
+            }
+            volume {
+                name
+                id
+            }
+        """,
+    ),
+    "volumeList": (
+        "id: $id{0}",
+        "$id{0}: ID!",
+        """
+            errors {
+                ... on MutationError {
+                    message
+                    field
+                }
+            }
+            job {
+                id
+            }
+        """,
+    ),
+    "volumeListAndHash": (
+        "id: $id{0}, input: $input{0}",
+        "$id{0}: ID!, $input{0}: VolumeListAndHashInput!",
+        """
+            errors {
+                ... on MutationError {
+                    message
+                    field
+                }
+            }
+            job {
+                id
+            }
+        """,
+    ),
+}
+
+DOCUMENTS = {}
+
+
+def get_query(name):
+    """Return the parsed document for a registered operation, parsing it on first use."""
+
+    document = DOCUMENTS.get(name)
+
+    if document is None:
+        document = gql(QUERIES[name])
+        DOCUMENTS[name] = document
+
+    return document
+
+
+def get_nodes_query(fragment, count):
+    """Return the parsed document looking up count nodes in one query, parsing it on first use.
+    Node i is aliased n<i> and takes its id from $id<i>, and each node selects its __typename
+    and a registered fragment."""
+
+    name = "Nodes_{}_{}".format(fragment, count)
+    document = DOCUMENTS.get(name)
+
+    if document is None:
+        fragment_text, fragment_variables = FRAGMENTS[fragment]
+
+        variables = ["$id{}: ID!".format(i) for i in range(count)]
+        if fragment_variables:
+            variables.append(fragment_variables)
+
+        nodes = [
+            "n{0}: node(id: $id{0}) {{ id __typename ...{1} }}".format(i, fragment)
+            for i in range(count)
+        ]
+
+        document = gql(
+            "query {}({}) {{\n{}\n}}\n{}".format(
+                name, ", ".join(variables), "\n".join(nodes), fragment_text
+            )
+        )
+        DOCUMENTS[name] = document
+
+    return document
+
+
+def fragment_type(fragment):
+    """Get the type a registered fragment is selected on, e.g. "Job" for JobFields."""
+    return FRAGMENTS[fragment][0].split(" on ")[1].split()[0]
+
+
+def get_bulk_mutation(mutation, count):
+    """Return the parsed document running a mutation count times in one request,
+    parsing it on first use. Run i is aliased m<i> and takes its variables with
+    the suffix i, e.g. $input0, see BULK_MUTATIONS."""
+
+    name = "Bulk_{}_{}".format(mutation, count)
+    document = DOCUMENTS.get(name)
+
+    if document is None:
+        arguments, variables, fields = BULK_MUTATIONS[mutation]
+
+        runs = [
+            "m{0}: {1}({2}) {{{3}}}".format(i, mutation, arguments.format(i), fields)
+            for i in range(count)
+        ]
+
+        document = gql(
+            "mutation {}({}) {{\n{}\n}}".format(
+                name,
+                ", ".join(variables.format(i) for i in range(count)),
+                "\n".join(runs),
+            )
+        )
+        DOCUMENTS[name] = document
+
+    return document
+
+
+def is_registered_query(document):
+    """Check if a document is one of the parsed registry documents."""
+    return any(document is registered for registered in DOCUMENTS.values())
+
+
+def validate_queries(schema):
+    """Validate every registered document against a GraphQLSchema.
+    Returns a dictionary of operation name: list of errors for the invalid documents."""
+
+    invalid = {}
+
+    for name in QUERIES:
+        document = get_query(name)
+        errors = [str(error) for error in validate(schema, document)]
+
+        # registry keys must match the operation defined in the document
+        operations = [
+            definition.name.value
+            for definition in document.definitions
+            if getattr(definition, "name", None) is not None
+        ]
+        if operations != [name]:
+            errors.append(
+                "Registered as {} but defines operation(s) {}".format(name, operations)
+            )
+
+        if errors:
+            invalid[name] = errors
+
+    for fragment in FRAGMENTS:
+        name = "Nodes_{}_1".format(fragment)
+        errors = [str(error) for error in validate(schema, get_nodes_query(fragment, 1))]
+        if errors:
+            invalid[name] = errors
+
+    for mutation in BULK_MUTATIONS:
+        name = "Bulk_{}_1".format(mutation)
+        errors = [
+            str(error) for error in validate(schema, get_bulk_mutation(mutation, 1))
+        ]
+        if errors:
+            invalid[name] = errors
+
+    return invalid
@@ -1,482 +1,192 @@
-"""Functions to run Dewrangle Graphql queries."""
-import os
-import sys
-import traceback
-import configparser
-import requests
-import pandas as pd
-from gql import gql, Client
-from gql.transport.aiohttp import AIOHTTPTransport
-from datetime import datetime
-
-
-def get_api_credential():
-    """Get api token from credential file."""
-    config = configparser.ConfigParser()
-    config.read(os.path.join(os.path.expanduser("~"), ".dewrangle", "credentials"))
-    return config["default"]["api_key"]
-
-
-def check_mutation_result(result):
-    """Check the result of a mutation and handle error(s)"""
-
-    for my_key in result:
-        my_error = result[my_key]["errors"]
-        if my_error is not None:
-            raise RuntimeError(
-                "The following error occurred when running mutation:\n{}".format(
-                    my_error
-                )
-            )
+"""Functions to run Dewrangle Graphql queries.
+
+Each function is a blocking wrapper around the matching AsyncDewrangleClient method.
+"""
+import asyncio
+from .async_client import (
+    AsyncDewrangleClient,
+    PAGE_SIZE,
+    NODE_BATCH_SIZE,
+    MUTATION_BATCH_SIZE,
+    POLL_MIN_INTERVAL,
+    POLL_MAX_INTERVAL,
+    CHUNK_SIZE,
+    DOWNLOAD_WORKERS,
+)
+from .cache import RESOLUTION_TTL, VOLUME_INDEX_MAX_AGE
+from .download import ProgressReporter
+from .utils import (
+    get_api_credential,
+    check_mutation_result,
+    pick_external_id,
+    process_volumes,
+    create_gql_client,
+    create_rest_creds,
+    get_default_client,
+    StudyContext,
+)
+
+
+def run_async_method(client, method, *args, **kwargs):
+    """Run one of the AsyncDewrangleClient methods on the gql client and wait for the result.
+    An open client runs it on its persistent session, otherwise a session is opened
+    and closed around the call. Without a client, the shared default client is used."""
 
-    return
+    if client is None:
+        client = get_default_client()
 
+    async def run():
+        async with AsyncDewrangleClient(client) as dw_client:
+            return await getattr(dw_client, method)(*args, **kwargs)
 
-def add_volume(client, study_id, prefix, region, bucket, aws_cred):
-    """Run Dewrangle create volume mutation."""
+    if getattr(client, "persistent_session", None) is not None:
+        return client.run(run())
 
-    # prepare mutation
-
-    mutation = gql(
-        """
-        mutation VolumeCreateMutation($input: VolumeCreateInput!) {
-            volumeCreate(input: $input) {
-                errors {
-                    ... on MutationError {
-                        message
-                        field
-                    }
-                }
-                volume {
-                    name
-                    id
-                }    
-            }
-        }
-        """
-    )
+    return asyncio.run(run())
 
-    params = {
-        "input": {
-            "name": bucket,
-            "region": region,
-            "studyId": study_id,
-            "credentialId": aws_cred,
-        }
-    }
 
-    if prefix is not None:
-        params["input"]["pathPrefix"] = prefix
+def iter_async_method(client, method, *args, **kwargs):
+    """Iterate over one of the AsyncDewrangleClient async generators from blocking code.
+    Items are fetched lazily on the client's persistent session, opening the client
+    for the duration of the iteration if it is not open already."""
 
-    # run mutation
-    result = client.execute(mutation, variable_values=params)
+    if client is None:
+        client = get_default_client()
 
-    check_mutation_result(result)
+    if not hasattr(client, "open"):
+        # plain gql clients can't keep a session between pages, so collect them in one go
+        async def collect():
+            async with AsyncDewrangleClient(client) as dw_client:
+                return [item async for item in getattr(dw_client, method)(*args, **kwargs)]
 
-    volume_id = result["volumeCreate"]["volume"]["id"]
+        yield from asyncio.run(collect())
+        return
 
-    return volume_id
+    opened = client.persistent_session is None
+    if opened:
+        client.open()
 
+    async def next_item(generator):
+        return await generator.__anext__()
 
-def create_study(client, study_name, org_id, run):
-    """Run Dewrangle create study mutation."""
+    try:
+        dw_client = AsyncDewrangleClient(client)
+        client.run(dw_client.connect())
+        generator = getattr(dw_client, method)(*args, **kwargs)
+        try:
+            while True:
+                try:
+                    item = client.run(next_item(generator))
+                except StopAsyncIteration:
+                    break
+                yield item
+        finally:
+            client.run(generator.aclose())
+    finally:
+        if opened:
+            client.close()
 
-    study_id = None
 
-    # prepare mutation
-    mutation = gql(
-        """
-        mutation StudyCreateMutation($input: StudyCreateInput!) {
-            studyCreate(input: $input) {
-                errors {
-                    ... on MutationError {
-                        message
-                        field
-                    }
-                }
-                study {
-                    name
-                    id
-                }    
-            }
-        }
-        """
+def add_volume(client, study_id, prefix, region, bucket, aws_cred):
+    """Run Dewrangle create volume mutation."""
+    return run_async_method(
+        client, "add_volume", study_id, prefix, region, bucket, aws_cred
     )
 
-    params = {
-        "input": {
-            "name": study_name,
-            "organizationId": org_id,
-        }
-    }
 
-    # check if run is given and run mutation
-    if run:
-        result = client.execute(mutation, variable_values=params)
-        check_mutation_result(result)
-        study_id = result["studyCreate"]["study"]["id"]
-    else:
-        print("{} was not created. Run option was not provided.".format(study_name))
+def add_volumes(rows, batch_size=MUTATION_BATCH_SIZE, client=None):
+    """Run Dewrangle create volume mutation for many volumes, batch_size per request.
+    Inputs: list of dicts with add_volume keyword arguments
+    (study_id, prefix, region, bucket, aws_cred).
+    Output: list of {"volume_id", "error"} dicts in the same order as rows."""
+    return run_async_method(client, "add_volumes", rows, batch_size)
 
-    return study_id
+
+def create_study(client, study_name, org_id, run):
+    """Run Dewrangle create study mutation."""
+    return run_async_method(client, "create_study", study_name, org_id, run)
 
 
 def list_volume(client, volume_id):
     """Run Dewrangle list volume mutation."""
-
-    # prepare mutation
-    mutation = gql(
-        """
-        mutation VolumeListMutation($id: ID!) {
-            volumeList(id: $id) {
-                errors {
-                    ... on MutationError {
-                        message
-                        field
-                    }
-                }
-                job {
-                    id
-                }
-            }
-        }
-        """
-    )
-
-    params = {"id": volume_id}
-
-    # run mutation
-    result = client.execute(mutation, variable_values=params)
-
-    check_mutation_result(result)
-
-    job_id = result["volumeList"]["job"]["id"]
-
-    return job_id
+    return run_async_method(client, "list_volume", volume_id)
 
 
 def list_and_hash_volume(client, volume_id, billing_id):
     """Run Dewrangle list and hash volume mutation."""
+    return run_async_method(client, "list_and_hash_volume", volume_id, billing_id)
 
-    # prepare mutation
-    mutation = gql(
-        """
-        mutation VolumeListHashMutation($id: ID!, $input: VolumeListAndHashInput!) {
-            volumeListAndHash(id: $id, input: $input) {
-                errors {
-                    ... on MutationError {
-                        message
-                        field
-                    }
-                }
-                job {
-                    id
-                }    
-            }
-        }
-        """
-    )
-
-    params = {"id": volume_id}
-    params["input"] = {"billingGroupId": billing_id}
 
-    # run mutation
-    result = client.execute(mutation, variable_values=params)
-
-    check_mutation_result(result)
-
-    job_id = result["volumeListAndHash"]["job"]["id"]
-
-    return job_id
+def list_and_hash_volumes(rows, batch_size=MUTATION_BATCH_SIZE, client=None):
+    """Run Dewrangle list and hash volume mutation for many volumes, batch_size per request.
+    Inputs: list of dicts with volume_id and billing_id.
+    Output: list of {"job_id", "error"} dicts in the same order as rows."""
+    return run_async_method(client, "list_and_hash_volumes", rows, batch_size)
 
 
-def pick_external_id(name, externals, external_type):
-    """From a dictionary of either credential or billing group ids, pick the one to use."""
-
-    ext_id = None
-
-    org = "other"
-    if external_type.lower() == "billing_group":
-        org = "organization"
-    elif external_type.lower() == "credential":
-        org = "study"
-
-    message = ""
-
-    if len(externals) == 1 and name is None:
-        ((ext_id, info),) = externals.items()
-        print("Only one {} available: {}".format(external_type, info["name"]))
-        ext_id = list(externals.keys())[0]
-    elif name:
-        for ext in externals:
-            if name == externals[ext]["name"]:
-                ext_id = ext
-        if ext_id is None:
-            message = "{} {} not found in {}".format(
-                external_type.capitalize(), name, org
-            )
-    elif len(externals) == 0:
-        message = "No credentials in study."
-    else:
-        message = "Multiple {} found in {} but none provided. Please run again and provide one of the following crdentials ids:{}{}".format(
-            external_type, org, "\n", externals
-        )
-
-    if ext_id is None:
-        raise ValueError(message)
-
-    return ext_id
+def get_study_context(study_id, client=None):
+    """Query the organization, billing groups, volumes, and credentials of a study in one
+    fused query. Output: StudyContext"""
+    return run_async_method(client, "get_study_context", study_id)
 
 
 def get_cred_id(client, study_id, cred_name=None):
     """Get credential id"""
-
-    cred_id = None
-
-    # get all credentials in study
-    credentials = get_study_credentials(client, study_id)
-
-    cred_id = pick_external_id(cred_name, credentials, "credential")
-
-    return cred_id
+    return run_async_method(client, "get_cred_id", study_id, cred_name)
 
 
 def get_study_credentials(client, study_id):
     """Get credential ids from a study."""
+    return run_async_method(client, "get_study_credentials", study_id)
 
-    # query all studies and credentials the user has access to.
-    # in the future, this should be a simpler query to get study id from study name
-    credentials = {}
 
-    # set up query to get all credentials in the study
-    query = gql(
-        """
-        query Study_Query($id: ID!) {
-            study: node(id: $id) {
-                id
-                ... on Study {
-                    credentials {
-                        edges {
-                            node {
-                                id
-                                name
-                                key
-                            }
-                        }
-                    }
-                }
-            }
-        }
-        """
+def iter_study_credentials(client, study_id, page_size=PAGE_SIZE, prefetch=False):
+    """Yield the credentials in a study, querying one page at a time."""
+    yield from iter_async_method(
+        client, "iter_study_credentials", study_id, page_size, prefetch
     )
 
-    params = {"id": study_id}
-
-    # run query
-    result = client.execute(query, variable_values=params)
-
-    # loop through query results, find the study we're looking for and it's volumes
-    for study in result:
-        for cred_edge in result[study]["credentials"]["edges"]:
-            cred = cred_edge["node"]
-            cid = cred["id"]
-            name = cred["name"]
-            key = cred["key"]
-            credentials[cid] = {"name": name, "key": key}
-
-    return credentials
-
 
 def get_org_id(client, org_name):
     """Query all available organizations, return org id"""
+    return run_async_method(client, "get_org_id", org_name)
 
-    org_id = ""
-    org_ids = []
-    # set up query to get all available studies
-    query = gql(
-        """
-        query {
-            viewer {
-                organizationUsers {
-                    edges {
-                        node {
-                            organization {
-                                id
-                                name
-                            }
-                        }
-                    }
-                }
-            }
-        }
-        """
-    )
-
-    # run query
-    result = client.execute(query)
-
-    # loop through query results, find the study we're looking for and it's volumes
-    for edge in result["viewer"]["organizationUsers"]["edges"]:
-        org = edge["node"]["organization"]
-        if org["name"] == org_name:
-            org_ids.append(org["id"])
-
-    if len(org_ids) == 1:
-        org_id = org_ids[0]
-    elif len(org_ids) == 0:
-        raise ValueError("Organization {} not found".format(org_name))
-    else:
-        raise ValueError(
-            "Organization {} found multiple times. Please delete or rename studies so there is only one {}".format(
-                org_name, org_name
-            )
-        )
 
-    return org_id
+def iter_organizations(client, page_size=PAGE_SIZE, prefetch=False):
+    """Yield the organizations the user belongs to, querying one page at a time."""
+    yield from iter_async_method(client, "iter_organizations", page_size, prefetch)
 
 
 def get_org_id_from_study(client, study_id):
     """Query study id and get the id of the organization it's in"""
-
-    org_id = ""
-    # set up query to get all available studies
-    query = gql(
-        """
-        query Study_Query($id: ID!) {
-            study: node(id: $id) {
-                ... on Study {
-                    organization {
-                        id
-                    }
-                }
-            }
-        }
-        """
-    )
-
-    params = {"id": study_id}
-
-    # run query
-    result = client.execute(query, params)
-
-    org_id = result["study"]["organization"]["id"]
-
-    return org_id
+    return run_async_method(client, "get_org_id_from_study", study_id)
 
 
 def get_all_studies(client):
     """Query all available studies, return study ids and names"""
+    return run_async_method(client, "get_all_studies")
 
-    studies = {}
 
-    # set up query to get all available studies
-    query = gql(
-        """
-        query {
-            viewer {
-                organizationUsers {
-                    edges {
-                        node {
-                            organization {
-                                name
-                                id
-                                studies {
-                                    edges {
-                                        node {
-                                            name
-                                            id
-                                            globalId
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        }
-        """
-    )
-
-    # run query
-    result = client.execute(query)
-
-    for org_edge in result["viewer"]["organizationUsers"]["edges"]:
-        for study_edge in org_edge["node"]["organization"]["studies"]["edges"]:
-            study = study_edge["node"]
-            id = study["id"]
-            name = study["name"]
-            global_id = study["globalId"]
-            studies[id] = {"name": name, "global_id": global_id}
-
-    return studies
+def iter_all_studies(client, page_size=PAGE_SIZE, prefetch=False):
+    """Yield all available studies, querying one page at a time."""
+    yield from iter_async_method(client, "iter_all_studies", page_size, prefetch)
 
 
 def get_study_id(client, study_name):
     """Query all available studies, return study id"""
-
-    study_id = ""
-    study_ids = []
-
-    # get a dictionary of all study ids and names
-    studies = get_all_studies(client)
-
-    # loop through query results, find the study we're looking for and it's volumes
-    for study in studies:
-        if study_name in [study, studies[study]["global_id"], studies[study]["name"]]:
-            print(studies[study]["global_id"])
-            study_ids.append(study)
-
-    if len(study_ids) == 1:
-        study_id = study_ids[0]
-    elif len(study_ids) == 0:
-        raise ValueError("Study {} not found".format(study_name))
-    else:
-        raise ValueError(
-            "Study {} found multiple times. Please delete or rename studies so there is only one {}".format(
-                study_name, study_name
-            )
-        )
-
-    return study_id
+    return run_async_method(client, "get_study_id", study_name)
 
 
 def get_study_volumes(client, study_id):
     """Query study id, and return volumes in that study"""
-    study_volumes = {}
-    # set up query to get all available studies
-    query = gql(
-        """
-        query Study_Query($id: ID!) {
-            study: node(id: $id) {
-                ... on Study {
-                    volumes {
-                        edges {
-                            node {
-                                id
-                                name
-                            }
-                        }
-                    }
-                }
-            }
-        }
-        """
-    )
+    return run_async_method(client, "get_study_volumes", study_id)
 
-    params = {"id": study_id}
 
-    # run query
-    result = client.execute(query, params)
-
-    for study in result:
-        for volume_edge in result["study"]["volumes"]["edges"]:
-            volume = volume_edge["node"]
-            vid = volume["id"]
-            vname = volume["name"]
-            study_volumes[vid] = vname
-
-    return study_volumes
+def iter_study_volumes(client, study_id, page_size=PAGE_SIZE, prefetch=False):
+    """Yield the volumes in a study, querying one page at a time."""
+    yield from iter_async_method(
+        client, "iter_study_volumes", study_id, page_size, prefetch
+    )
 
 
 '''
@@ -528,494 +238,275 @@ def make_cred(client, cred_name, study_id):
 
 def remove_volume_from_study(client, vid, run):
     """Remove a volume from the study using the study and volume ids."""
-
-    # prepare mutation
-    mutation = gql(
-        """
-        mutation VolumeDelete($id: ID!) {
-            volumeDelete(id: $id) {
-                errors {
-                    ... on MutationError {
-                        message
-                        field
-                    }
-                }
-            }
-        }
-        """
-    )
-
-    params = {"id": vid}
-
-    # check if run is given and run mutation
-    if run:
-        result = client.execute(mutation, params)
-        check_mutation_result(result)
-        print("{} successfully deleted".format(vid))
-    else:
-        print("{} was not deleted. Run option was not provided.".format(vid))
-
-    return
+    return run_async_method(client, "remove_volume_from_study", vid, run)
 
 
 def get_billing_groups(client, org_id):
     """Get available billing groups for an organization."""
+    return run_async_method(client, "get_billing_groups", org_id)
 
-    billing_groups = {}
 
-    # query all organizations, studies, and billing groups the user has access to.
-    # set up query to get all available studies
-    query = gql(
-        """
-        query Org_Query($id: ID!) {
-            organization: node(id: $id) {
-                ... on Organization {
-                    billingGroups {
-                        edges {
-                            node {
-                                name
-                                id
-                            }
-                        }
-                    }
-                }
-            }
-        }
-        """
+def iter_billing_groups(client, org_id, page_size=PAGE_SIZE, prefetch=False):
+    """Yield the billing groups in an organization, querying one page at a time."""
+    yield from iter_async_method(
+        client, "iter_billing_groups", org_id, page_size, prefetch
     )
 
-    params = {"id": org_id}
-
-    # run query
-    result = client.execute(query, params)
-
-    for bg in result["organization"]["billingGroups"]["edges"]:
-        name = bg["node"]["name"]
-        id = bg["node"]["id"]
-        billing_groups[id] = {"name": name}
-
-    return billing_groups
-
 
 def get_billing_id(client, org_id, billing=None):
     "Get billing group id. If a name is provided, check it exists. If not return org default."
-
-    # first get a list of organizations and billing groups
-    billing_groups = get_billing_groups(client, org_id)
-
-    billing_id = pick_external_id(billing, billing_groups, "billing_group")
-
-    return billing_id
-
-
-def process_volumes(study, volumes, **kwargs):
-    """Check if a volume is already loaded to a study.
-    Inputs: study id, dictionary of volumes in the study, optionally volume name or volume id.
-    Outputs: volume id"""
-    volume_id = kwargs.get("vid", None)
-    vname = kwargs.get("vname", None)
-
-    if volume_id:
-        if volume_id not in volumes.keys():
-            raise ValueError(
-                "Volume id not present in study. Ensure you are providing the whole volume id."
-            )
-    else:
-        # see how many times the volume was added to the study
-        matching_volumes = []
-        for vol in volumes:
-            if volumes[vol] == vname:
-                matching_volumes.append(vol)
-        count = len(matching_volumes)
-
-        if count == 0:
-            print("{} volume not found in {}".format(vname, study))
-        elif count == 1:
-            volume_id = matching_volumes[0]
-        else:
-            print(
-                "=============================================================================================="
-            )
-            print("Multiple volumes named {} found in {}".format(vname, study))
-            print(
-                "Rerun this script using the '--vid' option with the volume id of the volume you want to delete"
-            )
-            print("Matching volumes and ids are:")
-            for mvol in matching_volumes:
-                print("{}: {}".format(vname, mvol))
-            print(
-                "=============================================================================================="
-            )
-
-    return volume_id
+    return run_async_method(client, "get_billing_id", org_id, billing)
 
 
 def get_job_info(jobid, client=None):
     """Query job info with job id"""
+    return run_async_method(client, "get_job_info", jobid)
 
-    if client is None:
-        client = create_gql_client()
 
-    query = gql(
-        """
-        query Job_Query($id: ID!) {
-            job: node(id: $id) {
-                id
-                ... on Job {
-                    operation
-                    createdAt
-                    completedAt
-                    errors {
-                        edges {
-                            node {
-                                message
-                                id
-                            }
-                        }
-                    }
-                    billingGroup {
-                        name
-                    }
-                    cost {
-                        cents
-                    }
-                    parentJob {
-                        id
-                        operation
-                        createdAt
-                        completedAt
-                        errors {
-                            edges {
-                                node {
-                                    message
-                                    id
-                                }
-                            }
-                        }
-                        billingGroup {
-                            name
-                        }
-                        cost {
-                            cents
-                        }
-                    }
-                    children {
-                        id
-                        operation
-                        createdAt
-                        completedAt
-                        errors {
-                            edges {
-                                node {
-                                    message
-                                    id
-                                }
-                            }
-                        }
-                        billingGroup {
-                            name
-                        }
-                        cost {
-                            cents
-                        }
-                    }
-                }
-            }
-        }
-        """
-    )
+def get_nodes(ids, fragment="NodeFields", batch_size=NODE_BATCH_SIZE, client=None):
+    """Look up many nodes by id in batched aliased queries.
+    Output: dictionary of id: node, and dictionary of id: error message for ids not found
+    or of a different type than the fragment."""
+    return run_async_method(client, "get_nodes", ids, fragment, batch_size)
 
-    params = {"id": jobid}
 
-    # run query
-    result = client.execute(query, variable_values=params)
+def get_job_info_many(job_ids, batch_size=NODE_BATCH_SIZE, client=None):
+    """Query job info for many job ids in batched aliased queries.
+    Output: dictionary of job id: job info, and dictionary of job id: error message."""
+    return run_async_method(client, "get_job_info_many", job_ids, batch_size)
 
-    return result
 
+def get_volumes_many(volume_ids, batch_size=NODE_BATCH_SIZE, client=None):
+    """Query many volumes by id in batched aliased queries.
+    Output: dictionary of volume id: volume, and dictionary of volume id: error message."""
+    return run_async_method(client, "get_volumes_many", volume_ids, batch_size)
 
-def get_volume_jobs(client, vid):
-    """Query volume for a list of jobs"""
-    jobs = {}
 
-    query = gql(
-        """
-        query Volume_Job_Query($id: ID!) {
-            volume: node(id: $id) {
-                id
-                ... on Volume {
-                    jobs {
-                        edges {
-                            node {
-                                id
-                                operation
-                                completedAt
-                                createdAt
-                            }
-                        }
-                    }
-                }
-            }
-        }
-        """
+def iter_finished_jobs(
+    job_ids,
+    min_interval=POLL_MIN_INTERVAL,
+    max_interval=POLL_MAX_INTERVAL,
+    backoff=2,
+    timeout=None,
+    client=None,
+):
+    """Poll jobs with batched queries and yield each one as soon as it completes.
+    Yields {"job_id", "job", "error"} dicts in completion order."""
+    yield from iter_async_method(
+        client,
+        "iter_finished_jobs",
+        job_ids,
+        min_interval,
+        max_interval,
+        backoff,
+        timeout,
     )
 
-    params = {"id": vid}
-
-    # run query
-    result = client.execute(query, variable_values=params)
-
-    # format result
-    for vol in result:
-        for job in result[vol]["jobs"]:
-            for node in result[vol]["jobs"][job]:
-                id = node["node"]["id"]
-                # convert createdAt from string to datetime object
-                created = datetime.strptime(
-                    node["node"]["createdAt"], "%Y-%m-%dT%H:%M:%S.%fZ"
-                )
-                op = node["node"]["operation"]
-                comp = datetime.strptime(
-                    node["node"]["completedAt"], "%Y-%m-%dT%H:%M:%S.%fZ"
-                )
-                jobs[id] = {"operation": op, "createdAt": created, "completedAt": comp}
-
-    return jobs
-
-
-def get_most_recent_job(client, vid, job_type):
-    """Query volume and get most recent job"""
-    jid = None
-    recent_date = None
-
-    jobs = get_volume_jobs(client, vid)
-
-    if job_type.upper() in ["HASH", "VOLUME_HASH"]:
-        job_type = "VOLUME_HASH"
-    elif job_type.upper() in ["LIST", "VOLUME_LIST"]:
-        job_type = "VOLUME_LIST"
-    else:
-        raise ValueError("Unsupported job type: {}".format(job_type))
-
-    for job in jobs:
-        if jobs[job]["operation"] == job_type:
-            # check if date is most recent
-            if recent_date is None or jobs[job]["createdAt"] > recent_date:
-                recent_date = jobs[job]["createdAt"]
-                jid = job
-
-    if jid is None:
-        raise ValueError(
-            "no job(s) matching job type: {} found in volume".format(job_type)
-        )
-
-    return jid
-
-
-def request_to_df(url, **kwargs):
-    """Call api and return response as a pandas dataframe."""
-    my_data = []
-    with requests.get(url, **kwargs) as response:
-        # check if the request was successful
-        if response.status_code == 200:
-            for line in response.iter_lines():
-                my_data.append(line.decode().split(","))
-        else:
-            print(f"Failed to fetch the CSV. Status code: {response.status_code}")
-
-    my_cols = my_data.pop(0)
-    df = pd.DataFrame(my_data, columns=my_cols)
-    return df
-
-
-def get_study_from_volume(client, volume_name):
-    """Get study id from volume name.
-    Returns the study_id, a warning message if a study is loaded multiple times or not at all,
-    and a list of all study_ids where the volume is loaded."""
 
-    message = None
-    study_list = []
-
-    # setup and run query
-    # query the volumes in all studies in all organizations that you have access to
-    query = gql(
-        """
-        query {
-            viewer {
-                organizationUsers {
-                    edges {
-                        node {
-                            organization {
-                                studies {
-                                    edges {
-                                        node {
-                                            id
-                                            volumes {
-                                                edges {
-                                                    node {
-                                                        name
-                                                    } 
-                                                }
-                                            }
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        }
-        """
+def wait_for_jobs(
+    job_ids,
+    min_interval=POLL_MIN_INTERVAL,
+    max_interval=POLL_MAX_INTERVAL,
+    backoff=2,
+    timeout=None,
+    client=None,
+):
+    """Wait for jobs to complete, polling with batched queries that back off while nothing changes.
+    Output: list of {"job_id", "job", "error"} dicts in completion order."""
+    return run_async_method(
+        client,
+        "wait_for_jobs",
+        job_ids,
+        min_interval=min_interval,
+        max_interval=max_interval,
+        backoff=backoff,
+        timeout=timeout,
     )
 
-    result = client.execute(query)
 
-    study_ids = []
+def iter_job_errors(client, jobid, page_size=PAGE_SIZE, prefetch=False):
+    """Yield the errors of a job, querying one page at a time."""
+    yield from iter_async_method(client, "iter_job_errors", jobid, page_size, prefetch)
 
-    # find volume in list of studies
 
-    for org_edge in result["viewer"]["organizationUsers"]["edges"]:
-        # loop through studies and collect volume names
-        for study_edge in org_edge["node"]["organization"]["studies"]["edges"]:
-            study = study_edge["node"]
-            my_study_id = study["id"]
-            for volume_edge in study["volumes"]["edges"]:
-                if volume_edge["node"]["name"] == volume_name:
-                    study_ids.append(my_study_id)
+def get_volume_jobs(client, vid):
+    """Query volume for a list of jobs.
+    Output: dictionary of job id: {"operation", "createdAt", "completedAt"},
+    completedAt is None for jobs that are still running."""
+    return run_async_method(client, "get_volume_jobs", vid)
 
-    # check if the volume is found or if it's found multiple times
-    if len(study_ids) == 0:
-        message = "Volume not found"
-    elif len(study_ids) > 1:
-        study_ids = list(set(study_ids))
-        if len(study_ids) == 1:
-            message = "Volume loaded multiple times in one study"
-        else:
-            message = "Volume loaded to multiple studies"
 
-    return study_ids, message
+def get_volume_job_index(client, vid):
+    """Query all jobs of a volume once into a VolumeJobIndex."""
+    return run_async_method(client, "get_volume_job_index", vid)
 
 
-def load_and_hash_volume(
-    volume_name, study_name, region, prefix=None, billing=None, cred=None, client=None
-):
-    """Wrapper function that checks if a volume is loaded, and hashes it.
-    Inputs: AWS bucket name, study name, aws region, and optional volume prefix.
-    Output: job id of parent job creaated when volume is hashed."""
+def iter_volume_jobs(client, vid, page_size=PAGE_SIZE, prefetch=False):
+    """Yield the jobs run on a volume, querying one page at a time."""
+    yield from iter_async_method(client, "iter_volume_jobs", vid, page_size, prefetch)
 
-    if client is None:
-        client = create_gql_client()
-
-    job_id = None
 
-    try:
-        # get study and org ids
-        study_id = get_study_id(client, study_name)
-        org_id = get_org_id_from_study(client, study_id)
+def get_most_recent_job(client, vid, job_type, job_index=None):
+    """Query volume and get most recent job.
+    Pass a job_index from get_volume_job_index to look it up without querying again."""
+    return run_async_method(client, "get_most_recent_job", vid, job_type, job_index)
 
-        # get billing group id
-        billing_group_id = get_billing_id(client, org_id, billing)
 
-        # check if volume loaded to study
-        study_volumes = get_study_volumes(client, study_id)
-        volume_id = process_volumes(study_id, study_volumes, vname=volume_name)
+def request_to_df(url, engine="auto", **kwargs):
+    """Call api and return response as a pandas dataframe.
+    The csv is parsed with engine ("auto", "pandas", or "pyarrow")."""
 
-        if volume_id is None:
-            # if we need to load, get credential
-            aws_cred_id = get_cred_id(client, study_id, cred)
+    import requests
+    from .results import parse_result_csv
 
-            # load if it's not
-            volume_id = add_volume(
-                client, study_id, prefix, region, volume_name, aws_cred_id
+    with requests.get(url, **kwargs) as response:
+        # check if the request was successful
+        if response.status_code != 200:
+            raise RuntimeError(
+                "Failed to fetch the CSV. Status code: {}".format(response.status_code)
             )
+        body = response.content
 
-        # hash
-        job_id = list_and_hash_volume(client, volume_id, billing_group_id)
-
-    except Exception:
-        print(
-            "The following error occurred trying to hash {}: {}".format(
-                volume_name, traceback.format_exc()
-            ),
-            file=sys.stderr,
-        )
-
-    return job_id
-
-
-def download_job_result(jobid, client=None):
-    """Check if a job is complete, download results if it is.
-    If the job is a list and hash job, only download the hash result."""
-
-    endpoint, req_header = create_rest_creds()
+    return parse_result_csv(body, engine)
 
-    job_status = None
 
-    job_result = None
+def get_study_from_volume(client, volume_name, offline=False, max_age=RESOLUTION_TTL):
+    """Get study id from volume name.
+    Returns the study_id, a warning message if a study is loaded multiple times or not at all,
+    and a list of all study_ids where the volume is loaded.
+    The studies indexed more than max_age seconds ago are queried again first.
+    With offline, the volume is only looked up in the volume index on disk."""
+    return run_async_method(client, "get_study_from_volume", volume_name, offline, max_age)
 
-    job_info = get_job_info(jobid, client)
 
-    # check if it's done
-    if (
-        job_info["job"]["completedAt"] != ""
-        and job_info["job"]["completedAt"] is not None
-    ):
-        job_status = "Complete"
+def refresh_volume_index(client=None, max_age=VOLUME_INDEX_MAX_AGE):
+    """Query the volumes of the studies that are new or stale in the volume index.
+    Returns the number of studies queried."""
+    return run_async_method(client, "refresh_volume_index", max_age)
 
-    else:
-        job_status = "Incomplete"
 
-    if job_status == "Complete":
-        job_type = job_info["job"]["operation"]
-        # we can only download results for hash or list jobs so check that the job is one of those
-        if job_type in ["VOLUME_LIST", "VOLUME_HASH", "VOLUME_LIST_AND_HASH"]:
-            # if the job is a parent job, find the hash job to get it's result
-            if (
-                job_type == "VOLUME_LIST_AND_HASH"
-                and len(job_info["job"]["children"]) != 0
-            ):
-                for child_job in job_info["job"]["children"]:
-                    if child_job["operation"] == "VOLUME_HASH":
-                        jobid = child_job["id"]
-            url = endpoint + jobid + "/result"
-            job_result = request_to_df(url, headers=req_header, stream=True)
-        else:
-            print("Job type {} does not have results to download".format(job_type))
+def load_and_hash_volume(
+    volume_name,
+    study_name,
+    region,
+    prefix=None,
+    billing=None,
+    cred=None,
+    client=None,
+    incremental=False,
+):
+    """Wrapper function that checks if a volume is loaded, and hashes it.
+    Inputs: AWS bucket name, study name, aws region, and optional volume prefix.
+    With incremental, a volume that hasn't changed since its last hash isn't hashed again.
+    Output: job id of parent job creaated when volume is hashed, or of the last hash
+    job if the volume was unchanged."""
+    return run_async_method(
+        client,
+        "load_and_hash_volume",
+        volume_name,
+        study_name,
+        region,
+        prefix,
+        billing,
+        cred,
+        incremental,
+    )
 
-    return job_status, job_result
 
+def load_and_hash_volumes(
+    rows,
+    max_concurrency=10,
+    client=None,
+    incremental=False,
+    batch_size=MUTATION_BATCH_SIZE,
+):
+    """Load and hash many volumes concurrently, see AsyncDewrangleClient.load_and_hash_volumes.
+    Output: list of {"job_id", "error"} dicts in the same order as rows."""
+    return run_async_method(
+        client, "load_and_hash_volumes", rows, max_concurrency, incremental, batch_size
+    )
 
-def create_gql_client(endpoint=None, api_key=None):
-    """Create GraphQL client connection"""
 
-    # default endpoint
-    if endpoint is None:
-        endpoint = "https://dewrangle.com/api/graphql"
+def check_volume_changes(volume_id, timeout=None, client=None):
+    """Check what changed in a volume since its last hash, with a list job.
+    Output: dictionary with the last "hash_job" id, the "list_job" id, the "changes"
+    dataframe of added, removed, and modified files, and the changed directory "prefixes"."""
+    return run_async_method(client, "check_volume_changes", volume_id, timeout)
 
-    if api_key:
-        req_header = {"X-Api-Key": api_key}
-    else:
-        req_header = {"X-Api-Key": get_api_credential()}
 
-    transport = AIOHTTPTransport(
-        url=endpoint,
-        headers=req_header,
+def download_job_result(jobid, client=None, engine="auto"):
+    """Check if a job is complete, download results if it is.
+    If the job is a list and hash job, only download the hash result.
+    The result is parsed with engine ("auto", "pandas", or "pyarrow")."""
+    return run_async_method(client, "download_job_result", jobid, engine)
+
+
+def download_job_result_to_file(
+    jobid,
+    path,
+    chunk_size=CHUNK_SIZE,
+    client=None,
+    output_format=None,
+    compression="default",
+    row_group_size=None,
+    workers=1,
+    resume=False,
+    progress=None,
+):
+    """Check if a job is complete, stream its result straight to path if it is.
+    If the job is a list and hash job, only download the hash result.
+    output_format is "csv", "parquet", or "arrow" (Arrow IPC), by default picked from the
+    extension of path.
+    With workers > 1 the result is fetched with concurrent range requests, and with resume
+    an interrupted download continues from its partial file. progress is called with the
+    bytes done and the total, e.g. ProgressReporter().
+    Returns the job status and the path written, or None if there was nothing to download."""
+    return run_async_method(
+        client,
+        "download_job_result_to_file",
+        jobid,
+        path,
+        chunk_size,
+        output_format,
+        compression,
+        row_group_size,
+        workers,
+        resume,
+        progress,
     )
-    client = Client(transport=transport, fetch_schema_from_transport=True)
-
-    return client
 
 
-def create_rest_creds(endpoint=None, api_key=None):
-    """Create Rest connection"""
-
-    # default endpoint
-    if endpoint is None:
-        endpoint = "https://dewrangle.com/api/rest/jobs/"
+def download_job_results(
+    job_ids,
+    out_dir,
+    workers=DOWNLOAD_WORKERS,
+    output_format="csv",
+    client=None,
+    compression="default",
+    row_group_size=None,
+):
+    """Download the results of many jobs into out_dir, workers at a time on one pooled session.
+    Jobs are looked up in batched queries first, and incomplete jobs are skipped.
+    Output: list of {"job_id", "status", "path", "bytes", "seconds", "error"} dicts,
+    with duplicate ids downloaded once."""
+    return run_async_method(
+        client,
+        "download_job_results",
+        job_ids,
+        out_dir,
+        workers,
+        output_format,
+        compression=compression,
+        row_group_size=row_group_size,
+    )
 
-    if api_key:
-        req_header = {"X-Api-Key": api_key}
-    else:
-        req_header = {"X-Api-Key": get_api_credential()}
 
-    return endpoint, req_header
+def diff_job_results(old_job, new_job, partitions=None, out_path=None, client=None):
+    """Diff the hash results of two jobs of the same volume.
+    Returns the paths that were added, removed, modified (size or etag changed), or whose
+    hash changed. With partitions, results too big for memory are diffed one partition at
+    a time, and with out_path the change set is written there as csv and the number of
+    changes of each type is returned."""
+    return run_async_method(
+        client, "diff_job_results", old_job, new_job, partitions, out_path
+    )
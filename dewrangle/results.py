@@ -0,0 +1,262 @@
+"""Parse Dewrangle job result csv files into pandas dataframes.
+
+Results are parsed with the pandas C engine or, when pyarrow is installed, the
+multi-threaded pyarrow csv reader. Known columns get explicit dtypes so sizes
+come back as integers and hashes are never mistaken for numbers.
+
+With pyarrow, results can also be converted to Parquet or Arrow IPC files, which
+are much faster to reopen than csv. Uncompressed Arrow IPC files are read
+through a memory map without copying.
+"""
+import os
+import io
+import shutil
+
+# dtypes of the known job result columns, other columns are inferred
+RESULT_DTYPES = {
+    "path": "string",
+    "size": "Int64",
+    "etag": "string",
+    "md5": "string",
+    "sha1": "string",
+    "sha256": "string",
+    "crc32c": "string",
+}
+
+ENGINES = ["auto", "pandas", "pyarrow"]
+
+# output formats and the default compression of each
+OUTPUT_FORMATS = {"csv": None, "parquet": "zstd", "arrow": None}
+
+# file extension of each output format
+FORMAT_EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+
+def has_pyarrow():
+    """Check if pyarrow can be imported."""
+
+    try:
+        import pyarrow.csv  # noqa: F401
+    except ImportError:
+        return False
+
+    return True
+
+
+def pick_engine(engine="auto"):
+    """Resolve the parsing engine, "auto" uses pyarrow when it is installed."""
+
+    if engine not in ENGINES:
+        raise ValueError(
+            "Unsupported engine: {}. Use one of {}".format(engine, ", ".join(ENGINES))
+        )
+
+    if engine == "auto":
+        engine = "pyarrow" if has_pyarrow() else "pandas"
+    elif engine == "pyarrow":
+        require_pyarrow("The pyarrow engine")
+
+    return engine
+
+
+def require_pyarrow(feature):
+    """Raise an ImportError naming the feature if pyarrow isn't installed."""
+
+    if not has_pyarrow():
+        raise ImportError(
+            "{} needs pyarrow, install it with: pip install pyarrow".format(feature)
+        )
+
+    return
+
+
+def arrow_column_types():
+    """Arrow types of the known job result columns."""
+
+    import pyarrow as pa
+
+    return {
+        column: pa.int64() if dtype == "Int64" else pa.string()
+        for column, dtype in RESULT_DTYPES.items()
+    }
+
+
+def table_to_df(table):
+    """Convert an arrow table to a dataframe with nullable pandas dtypes.
+    Strings come back as string[pyarrow], where the pandas engine gives string[python]."""
+
+    import pandas as pd
+    import pyarrow as pa
+
+    # string columns stay in arrow memory instead of being copied into python objects
+    pandas_types = {
+        pa.string(): pd.StringDtype("pyarrow"),
+        pa.int64(): pd.Int64Dtype(),
+    }
+
+    return table.to_pandas(types_mapper=pandas_types.get)
+
+
+def parse_result_csv(source, engine="auto"):
+    """Parse a job result csv into a dataframe.
+    Inputs: path, binary file object, or bytes with the csv, and the engine to parse with
+    ("auto", "pandas", or "pyarrow").
+    Output: pandas dataframe with the known columns typed as in RESULT_DTYPES."""
+
+    engine = pick_engine(engine)
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+
+    if engine == "pyarrow":
+        return parse_with_pyarrow(source)
+
+    import pandas as pd
+
+    return pd.read_csv(source, dtype=RESULT_DTYPES, engine="c")
+
+
+def parse_with_pyarrow(source):
+    """Parse a job result csv with the multi-threaded pyarrow reader."""
+
+    from pyarrow import csv
+
+    table = csv.read_csv(
+        source,
+        read_options=csv.ReadOptions(use_threads=True),
+        convert_options=csv.ConvertOptions(column_types=arrow_column_types()),
+    )
+
+    return table_to_df(table)
+
+
+def pick_format(path, output_format=None):
+    """Get the output format from its name, or from the extension of path."""
+
+    if output_format is None:
+        extension = os.path.splitext(path)[1].lower()
+        formats = {ext: fmt for fmt, ext in FORMAT_EXTENSIONS.items()}
+        formats[".feather"] = "arrow"
+        output_format = formats.get(extension, "csv")
+
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(
+            "Unsupported output format: {}. Use one of {}".format(
+                output_format, ", ".join(OUTPUT_FORMATS)
+            )
+        )
+
+    return output_format
+
+
+def convert_result_csv(
+    csv_path, path, output_format="parquet", compression="default", row_group_size=None
+):
+    """Convert a job result csv to a Parquet or Arrow IPC file, one block of rows at a time.
+    compression is a Parquet codec ("zstd", "snappy", ...) or an Arrow IPC one ("lz4", "zstd"),
+    "default" for the format's default, or None. Leave Arrow IPC files uncompressed to
+    read them through a memory map without copying.
+    row_group_size caps the rows in a Parquet row group or an Arrow record batch.
+    The file is written to a temp file and renamed when complete."""
+
+    require_pyarrow("Writing {} files".format(output_format))
+
+    import pyarrow as pa
+    from pyarrow import csv, ipc, parquet
+
+    output_format = pick_format(path, output_format)
+    if compression == "default":
+        compression = OUTPUT_FORMATS[output_format]
+
+    reader = csv.open_csv(
+        csv_path,
+        read_options=csv.ReadOptions(use_threads=True, block_size=64 * 2**20),
+        convert_options=csv.ConvertOptions(column_types=arrow_column_types()),
+    )
+
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+
+    try:
+        if output_format == "parquet":
+            writer = parquet.ParquetWriter(
+                tmp_path, reader.schema, compression=compression or "none"
+            )
+        else:
+            writer = ipc.new_file(
+                tmp_path,
+                reader.schema,
+                options=ipc.IpcWriteOptions(compression=compression),
+            )
+
+        with writer:
+            for batch in reader:
+                table = pa.Table.from_batches([batch])
+                if output_format == "parquet":
+                    writer.write_table(table, row_group_size=row_group_size)
+                else:
+                    writer.write_table(table, max_chunksize=row_group_size)
+
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return path
+
+
+def save_result_csv(
+    csv_path, path, output_format="csv", compression="default", row_group_size=None
+):
+    """Save a copy of a job result csv to path as csv, Parquet, or Arrow IPC,
+    leaving csv_path as it is. See convert_result_csv for the options."""
+
+    if output_format != "csv":
+        return convert_result_csv(
+            csv_path, path, output_format, compression, row_group_size
+        )
+
+    # copy to a temp file and rename so path is never partially written
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        shutil.copyfile(csv_path, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return path
+
+
+def read_result(path, output_format=None, as_table=False):
+    """Read a job result file written as csv, Parquet, or Arrow IPC.
+    Arrow IPC files are memory mapped, so uncompressed files are read without copying.
+    Output: pandas dataframe, or the pyarrow Table itself with as_table."""
+
+    output_format = pick_format(path, output_format)
+
+    if output_format == "csv":
+        if as_table:
+            require_pyarrow("Reading csv as a table")
+            from pyarrow import csv
+
+            return csv.read_csv(
+                path,
+                convert_options=csv.ConvertOptions(column_types=arrow_column_types()),
+            )
+        return parse_result_csv(path)
+
+    require_pyarrow("Reading {} files".format(output_format))
+
+    import pyarrow as pa
+    from pyarrow import ipc, parquet
+
+    if output_format == "parquet":
+        table = parquet.read_table(path, memory_map=True)
+    else:
+        with pa.memory_map(path) as source:
+            table = ipc.open_file(source).read_all()
+
+    if as_table:
+        return table
+
+    return table_to_df(table)
@@ -0,0 +1,129 @@
+"""Cached Dewrangle Graphql schema.
+
+Clients validate queries against a local copy of the schema instead of running
+an introspection query every time they connect. The copy is fetched from the
+server and cached under ~/.dewrangle/schema/ (one file per endpoint). Stale or
+missing cache files are refreshed in a background thread, and queries aren't
+validated until a fetched schema is cached.
+"""
+import os
+import sys
+import time
+import hashlib
+import threading
+import functools
+from graphql import (
+    build_schema,
+    build_client_schema,
+    get_introspection_query,
+    print_schema,
+)
+
+# refresh cached schemas once a day
+SCHEMA_TTL = 24 * 60 * 60
+
+SCHEMA_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".dewrangle", "schema")
+
+REFRESHING = set()
+REFRESH_LOCK = threading.Lock()
+
+
+def schema_cache_path(endpoint):
+    """Path of the cached schema for an endpoint."""
+    key = hashlib.sha256(endpoint.encode()).hexdigest()[:16]
+    return os.path.join(SCHEMA_CACHE_DIR, key + ".graphql")
+
+
+def fetch_schema_sdl(endpoint, api_key):
+    """Run an introspection query on the endpoint and return the schema as SDL."""
+
+    import requests
+
+    response = requests.post(
+        endpoint,
+        json={"query": get_introspection_query()},
+        headers={"X-Api-Key": api_key},
+        timeout=30,
+    )
+    response.raise_for_status()
+
+    result = response.json()
+    if result.get("errors"):
+        raise RuntimeError(
+            "The following error occurred fetching the schema:\n{}".format(
+                result["errors"]
+            )
+        )
+
+    return print_schema(build_client_schema(result["data"]))
+
+
+def refresh_schema_cache(endpoint, api_key):
+    """Fetch the schema from the endpoint and write it to the cache."""
+
+    sdl = fetch_schema_sdl(endpoint, api_key)
+
+    path = schema_cache_path(endpoint)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # write to a temp file and rename so readers never see a partial schema
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "w") as f:
+        f.write(sdl)
+    os.replace(tmp_path, path)
+
+    return sdl
+
+
+def refresh_schema_cache_in_background(endpoint, api_key):
+    """Start a thread to refresh the cached schema, unless one is running.
+    The thread isn't a daemon, so a short run still waits for the schema to be
+    cached at exit instead of fetching it again on the next run."""
+
+    with REFRESH_LOCK:
+        if endpoint in REFRESHING:
+            return
+        REFRESHING.add(endpoint)
+
+    def refresh():
+        try:
+            refresh_schema_cache(endpoint, api_key)
+        except Exception as e:
+            print(
+                "Unable to refresh the cached schema for {}: {}".format(endpoint, e),
+                file=sys.stderr,
+            )
+        finally:
+            with REFRESH_LOCK:
+                REFRESHING.discard(endpoint)
+
+    thread = threading.Thread(target=refresh)
+    thread.start()
+
+    return thread
+
+
+def load_schema_sdl(endpoint, api_key, ttl=SCHEMA_TTL):
+    """Get the schema for an endpoint from the cache, or None if it isn't cached yet.
+    A missing cache file, or one older than ttl seconds, is refreshed in the background."""
+
+    path = schema_cache_path(endpoint)
+
+    try:
+        with open(path) as f:
+            sdl = f.read()
+        age = time.time() - os.path.getmtime(path)
+    except OSError:
+        sdl = None
+        age = None
+
+    if age is None or age > ttl:
+        refresh_schema_cache_in_background(endpoint, api_key)
+
+    return sdl
+
+
+@functools.lru_cache(maxsize=8)
+def build_cached_schema(sdl):
+    """Build a GraphQLSchema from SDL, reusing schemas already built in this process."""
+    return build_schema(sdl)
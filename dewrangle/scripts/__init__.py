@@ -0,0 +1 @@
+"""The wrapper scripts, each run with `dewrangle <script>` or `python scripts/<script>.py`."""
@@ -0,0 +1,58 @@
+"""Diff the hash results of two Dewrangle jobs of the same volume"""
+import sys
+import argparse
+import dewrangle as qf
+
+
+def parse_args(args):
+    """Get arguments."""
+    # optional args
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Optional, output file for the change set. Default: 'old_job'_'new_job'_diff.csv",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "-p",
+        "--partitions",
+        help="Optional, diff results too big for memory in this many partitions. Default: diff in memory",
+        type=int,
+        default=None,
+        required=False,
+    )
+    # required args
+    required_args = parser.add_argument_group("required arguments")
+    required_args.add_argument("--old", help="Job ID of the older hash job", required=True)
+    required_args.add_argument("--new", help="Job ID of the newer hash job", required=True)
+
+    # parse and return arguments
+    args = parser.parse_args(args[1:])
+    old_job = args.old
+    new_job = args.new
+    out = args.output
+    partitions = args.partitions
+
+    return old_job, new_job, out, partitions
+
+
+def main(args):
+    """Main, take args, run script."""
+    old_job, new_job, out_file, partitions = parse_args(args)
+
+    if out_file is None:
+        out_file = "{}_{}_diff.csv".format(old_job, new_job)
+
+    counts = qf.diff_job_results(old_job, new_job, partitions, out_file)
+
+    for change in ["added", "removed", "modified", "hash_changed"]:
+        print("{}: {}".format(change, counts.get(change, 0)))
+
+    print("Change set written to {}".format(out_file))
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main(sys.argv)
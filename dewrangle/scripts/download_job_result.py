@@ -0,0 +1,182 @@
+"""Download output from Dewrangle job"""
+import sys
+import argparse
+import dewrangle as qf
+
+
+def parse_args(args):
+    """Get arguments."""
+    # optional args
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Optional, Output basename. Default: 'job_id'_output",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        help="Optional, output format: csv, parquet, or arrow (Arrow IPC). Default: csv",
+        choices=["csv", "parquet", "arrow"],
+        default="csv",
+        required=False,
+    )
+    parser.add_argument(
+        "--compression",
+        help="Optional, compression codec for parquet (default zstd) or arrow (default none, "
+        "keep it uncompressed to memory map the file), e.g. zstd, snappy, lz4, none",
+        default="default",
+        required=False,
+    )
+    parser.add_argument(
+        "--row-group-size",
+        help="Optional, maximum rows per parquet row group or arrow record batch",
+        type=int,
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="Optional, number of concurrent range requests used to download the result, "
+        "or with --job-file the number of results downloaded at the same time. Default: 4",
+        type=int,
+        default=4,
+        required=False,
+    )
+    parser.add_argument(
+        "--resume",
+        help="Optional, continue an interrupted download from its partial file",
+        action="store_true",
+        required=False,
+    )
+    parser.add_argument(
+        "-d",
+        "--out-dir",
+        help="Optional, with --job-file, directory to save the results in. Default: current directory",
+        default=".",
+        required=False,
+    )
+    # required args
+    required_args = parser.add_argument_group("required arguments, one of")
+    job_args = required_args.add_mutually_exclusive_group(required=True)
+    job_args.add_argument("-j", "--jobid", help="Job ID")
+    job_args.add_argument(
+        "--job-file",
+        help="File with one job id per line, download all of their results",
+    )
+
+    # parse and return arguments
+    args = parser.parse_args(args[1:])
+    job = args.jobid
+    out = args.output
+    out_format = args.format
+    compression = None if args.compression == "none" else args.compression
+    row_group_size = args.row_group_size
+    workers = args.workers
+    resume = args.resume
+    job_file = args.job_file
+    out_dir = args.out_dir
+
+    return (
+        job,
+        out,
+        out_format,
+        compression,
+        row_group_size,
+        workers,
+        resume,
+        job_file,
+        out_dir,
+    )
+
+
+def download_job_file(job_file, out_dir, out_format, compression, row_group_size, workers):
+    """Download the results of every job id in a file and report on each."""
+
+    with open(job_file) as f:
+        job_ids = [line.strip() for line in f if line.strip()]
+
+    reports = qf.download_job_results(
+        job_ids,
+        out_dir,
+        workers,
+        out_format,
+        compression=compression,
+        row_group_size=row_group_size,
+    )
+
+    total_bytes = 0
+    for report in reports:
+        if report["error"] is not None:
+            print("{}: {}".format(report["job_id"], report["error"]))
+        elif report["path"] is None:
+            print("{}: {}, skipped".format(report["job_id"], report["status"]))
+        else:
+            total_bytes += report["bytes"]
+            print(
+                "{}: {} bytes in {:.2f}s, written to {}".format(
+                    report["job_id"], report["bytes"], report["seconds"], report["path"]
+                )
+            )
+
+    downloaded = len([report for report in reports if report["path"] is not None])
+    print(
+        "Downloaded {} of {} job result(s), {:.1f} MiB".format(
+            downloaded, len(reports), total_bytes / 2**20
+        )
+    )
+
+
+def main(args):
+    """Main, take args, run script."""
+    (
+        job_id,
+        out_base,
+        out_format,
+        compression,
+        row_group_size,
+        workers,
+        resume,
+        job_file,
+        out_dir,
+    ) = parse_args(args)
+
+    #client = qf.create_client()
+
+    if job_file is not None:
+        download_job_file(
+            job_file, out_dir, out_format, compression, row_group_size, workers
+        )
+        return
+
+    extension = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}[out_format]
+
+    if out_base is None:
+        out_file = job_id + "_output" + extension
+    else:
+        out_file = out_base + extension
+
+    # stream the result straight to the output file
+    status, res = qf.download_job_result_to_file(
+        job_id,
+        out_file,
+        output_format=out_format,
+        compression=compression,
+        row_group_size=row_group_size,
+        workers=workers,
+        resume=resume,
+        progress=qf.ProgressReporter(job_id),
+    )
+
+    print(status)
+
+    if res is not None:
+        print("Result written to {}".format(res))
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main(sys.argv)
@@ -0,0 +1,92 @@
+"""Get a list of study ids from volume names."""
+import sys
+import argparse
+import dewrangle as qf
+
+
+def parse_args(args):
+    """Get arguments."""
+    # optional args
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--offline",
+        help="Optional, only look volumes up in the volume index from earlier runs, without querying Dewrangle. Default: refresh the index first",
+        action="store_true",
+        required=False,
+    )
+    parser.add_argument(
+        "--max-age",
+        help="Optional, seconds the volume index of a study is trusted before it is queried again, e.g. 86400 to reuse a day old index. Default: {}".format(
+            qf.RESOLUTION_TTL
+        ),
+        type=int,
+        default=qf.RESOLUTION_TTL,
+        required=False,
+    )
+    # required args
+    required_args = parser.add_argument_group("required arguments")
+    required_args.add_argument(
+        "-v", "--volume", help="Comma separated list of volume names", required=True
+    )
+
+    # parse and return arguments
+    args = parser.parse_args(args[1:])
+    volumes = args.volume
+    offline = args.offline
+    max_age = args.max_age
+
+    return volumes, offline, max_age
+
+
+def main(args):
+    """Main, take args, run script."""
+    volume_names, offline, max_age = parse_args(args)
+
+    # set up api and authentication
+    with qf.get_default_client() as client:
+        # setup output categories
+        not_founds = []
+        multiples = {}
+        good_volumes = {}
+
+        # convert from names to ids
+        volumes = list(set(volume_names.split(",")))
+        for vol in volumes:
+            study_ids, message = qf.get_study_from_volume(client, vol, offline, max_age)
+            if message == "Volume not found":
+                not_founds.append(vol)
+            elif message is not None and "Volume loaded" in message:
+                multiples[vol] = study_ids
+            else:
+                good_volumes[vol] = study_ids
+
+        # process results
+        print(
+            "====================================================================================="
+        )
+        print("Volumes only loaded once:")
+        print("Volume: study_id")
+        for vol in good_volumes:
+            print("{}: {}".format(vol, good_volumes[vol]))
+        print(
+            "====================================================================================="
+        )
+        print("Volumes that are not loaded:")
+        print(not_founds)
+        print(
+            "====================================================================================="
+        )
+        print("Volumes loaded to multiple studies or in multiple times in the same study")
+        print("Volume: study_id")
+        for vol in multiples:
+            print("{}: {}".format(vol, multiples[vol]))
+        print(
+            "====================================================================================="
+        )
+
+    print("Done!")
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main(sys.argv)
@@ -0,0 +1,96 @@
+"""Hash all volumes in a list."""
+import sys
+import time
+import argparse
+import pandas as pd
+import dewrangle as qf
+
+
+def parse_args(args):
+    """Get arguments."""
+    # optional args
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-n",
+        "--max-concurrency",
+        help="Optional, number of volumes to load and hash at the same time. Default: 10",
+        type=int,
+        default=10,
+        required=False,
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        help="Optional, skip volumes that haven't changed since their last hash. Default: hash every volume",
+        action="store_true",
+        required=False,
+    )
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        help="Optional, number of volume create or hash mutations sent in one request. Default: 50",
+        type=int,
+        default=50,
+        required=False,
+    )
+    # required args
+    required_args = parser.add_argument_group("required arguments")
+    required_args.add_argument(
+        "-f", "--file", help="File with volumes to be loaded.", required=True
+    )
+
+    # parse and return arguments
+    args = parser.parse_args(args[1:])
+    file = args.file
+    max_concurrency = args.max_concurrency
+    incremental = args.incremental
+    batch_size = args.batch_size
+
+    return file, max_concurrency, incremental, batch_size
+
+
+def main(args):
+    """Main, take args, run script."""
+    file, max_concurrency, incremental, batch_size = parse_args(args)
+
+    # read file to df
+    df = pd.read_csv(file)
+    df = df.replace({float("nan"): None})
+
+    print(df)
+
+    rows = [
+        {
+            "volume_name": row["bucket"],
+            "study_name": row["account"],
+            "region": row["region"],
+            "prefix": row["prefix"],
+        }
+        for row in df.to_dict("records")
+    ]
+
+    # call wrapper function
+    start = time.perf_counter()
+    results = qf.load_and_hash_volumes(
+        rows,
+        max_concurrency=max_concurrency,
+        incremental=incremental,
+        batch_size=batch_size,
+    )
+    elapsed = time.perf_counter() - start
+
+    df["job_id"] = [res["job_id"] for res in results]
+    df["error"] = [res["error"] for res in results]
+
+    print(df)
+
+    print(
+        "Submitted {} of {} volume(s) in {:.1f}s ({:.2f} volumes/s)".format(
+            df["job_id"].notna().sum(), len(df), elapsed, len(df) / elapsed
+        )
+    )
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main(sys.argv)
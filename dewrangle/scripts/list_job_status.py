@@ -0,0 +1,76 @@
+"""List job status."""
+import sys
+import argparse
+import dewrangle as qf
+
+
+def parse_args(args):
+    """Get arguments."""
+    # optional args
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-w",
+        "--wait",
+        help="Optional, wait for the job(s) to complete and list each one as it finishes",
+        action="store_true",
+        required=False,
+    )
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        help="Optional, seconds to wait before giving up. Default: wait forever",
+        type=float,
+        default=None,
+        required=False,
+    )
+    # required args
+    required_args = parser.add_argument_group("required arguments")
+    required_args.add_argument(
+        "-j", "--jobid", help="Job ID(s)", nargs="+", required=True
+    )
+
+    # parse and return arguments
+    args = parser.parse_args(args[1:])
+    jobs = args.jobid
+    wait = args.wait
+    timeout = args.timeout
+
+    return jobs, wait, timeout
+
+
+def main(args):
+    """Main, take args, run script."""
+    jobs, wait, timeout = parse_args(args)
+
+    if wait:
+        # poll all jobs together, listing each as soon as it completes
+        for res in qf.iter_finished_jobs(jobs, timeout=timeout):
+            if res["error"] is not None:
+                print("{}: {}".format(res["job_id"], res["error"]))
+            else:
+                print("{} completed at {}".format(res["job_id"], res["job"]["completedAt"]))
+    else:
+        # query jobs
+        job_infos, errors = qf.get_job_info_many(jobs)
+
+        for job in jobs:
+            if job in errors:
+                print("{}: {}".format(job, errors[job]))
+                continue
+
+            job_res = job_infos[job]
+
+            print(job_res)
+
+            if (
+                job_res["job"]["completedAt"] != ""
+                and job_res["job"]["completedAt"] is not None
+            ):
+                print("Job Completed!")
+
+    print("Done!")
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main(sys.argv)
@@ -0,0 +1,56 @@
+"""List ids for a study."""
+import sys
+import argparse
+import dewrangle as qf
+
+
+def parse_args(args):
+    """Get arguments."""
+    # optional args
+    parser = argparse.ArgumentParser()
+    # required args
+    required_args = parser.add_argument_group("required arguments")
+    required_args.add_argument("-s", "--study", help="Study name, global id, or study id", required=True)
+
+    # parse and return arguments
+    args = parser.parse_args(args[1:])
+    study = args.study
+
+    return study
+
+
+def main(args):
+    """Main, take args, run script."""
+    study_name = parse_args(args)
+
+    # set up api and authentication
+    with qf.get_default_client() as client:
+        # get our study id
+        study_id = qf.get_study_id(client, study_name)
+
+        # get the study's org id
+        org_id = qf.get_org_id_from_study(client, study_id)
+
+        # get all studies and find ours (cached by get_study_id)
+        all_studies = qf.get_all_studies(client)
+
+        # get the info for our study
+        study_info = all_studies[study_id]
+
+        url = "dewrangle.com/" + org_id + "/" + study_id
+
+        print(
+            "====================================================================================="
+        )
+        print("Study id: study name, global_id, url")
+        print("{}: {}, {}, {}".format(study_id, study_info["name"], study_info["global_id"], url))
+        print(
+            "====================================================================================="
+        )
+
+    print("Done!")
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main(sys.argv)
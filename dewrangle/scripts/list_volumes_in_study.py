@@ -0,0 +1,49 @@
+"""List volumes in a study."""
+import sys
+import argparse
+import dewrangle as qf
+
+
+def parse_args(args):
+    """Get arguments."""
+    # optional args
+    parser = argparse.ArgumentParser()
+    # required args
+    required_args = parser.add_argument_group("required arguments")
+    required_args.add_argument("-s", "--study", help="Study name, global id, or study id", required=True)
+
+    # parse and return arguments
+    args = parser.parse_args(args[1:])
+    study = args.study
+
+    return study
+
+
+def main(args):
+    """Main, take args, run script."""
+    study_name = parse_args(args)
+
+    # set up api and authentication
+    with qf.get_default_client() as client:
+        # convert from names to ids
+        study_id = qf.get_study_id(client, study_name)
+        print(study_id)
+        volumes = qf.get_study_volumes(client, study_id)
+
+        print(
+            "====================================================================================="
+        )
+        print("Volumes attached to study:")
+        for vol in volumes:
+            print("{}: {}".format(volumes[vol], vol))
+
+        print(
+            "====================================================================================="
+        )
+
+    print("Done!")
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main(sys.argv)
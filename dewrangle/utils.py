@@ -0,0 +1,423 @@
+"""Helper functions shared by the Dewrangle query functions."""
+import os
+import atexit
+import asyncio
+import threading
+import configparser
+import aiohttp
+from gql import Client
+from gql.transport.aiohttp import AIOHTTPTransport
+from .cache import (
+    ResolutionCache,
+    ResultCache,
+    VolumeIndex,
+    RESOLUTION_TTL,
+    RESULT_CACHE_SIZE,
+    resolution_cache_path,
+    volume_index_path,
+)
+from .queries import is_registered_query
+from .schema import load_schema_sdl, build_cached_schema
+
+
+class PooledAIOHTTPTransport(AIOHTTPTransport):
+    """AIOHTTPTransport whose session keeps a pool of keep-alive connections."""
+
+    def __init__(self, url, pool_size=100, keepalive_timeout=30, **kwargs):
+        super().__init__(url, **kwargs)
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+
+    async def connect(self):
+        """Create the aiohttp session with a connection pool bound to the running loop."""
+
+        self.client_session_args = dict(self.client_session_args or {})
+        self.client_session_args["connector"] = aiohttp.TCPConnector(
+            limit=self.pool_size, keepalive_timeout=self.keepalive_timeout
+        )
+
+        await super().connect()
+
+
+class DewrangleGqlClient(Client):
+    """gql Client for Dewrangle.
+
+    Registered query documents are only validated once per schema.
+    Used as a context manager, the client connects once and keeps its session
+    open in a background event loop, so every query function given this client
+    reuses the same pooled connections until the block exits:
+
+        with create_gql_client() as client:
+            job_id = load_and_hash_volume(bucket, study, region, client=client)
+
+    Opening an open client again only counts the open, and the session is closed
+    by the matching last close, so nested blocks share one session.
+    """
+
+    def __init__(
+        self,
+        *args,
+        resolution_cache=None,
+        result_cache=None,
+        volume_index=None,
+        **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.resolution_cache = resolution_cache
+        self.result_cache = result_cache
+        self.volume_index = volume_index
+        self.validated_schema = None
+        self.validated_queries = set()
+        self.loop = None
+        self.loop_thread = None
+        self.persistent_session = None
+        self.open_count = 0
+
+    def validate(self, document):
+        """Validate a document, skipping registered documents that already passed."""
+
+        if not is_registered_query(document):
+            return super().validate(document)
+
+        # start over if the schema was replaced
+        if self.validated_schema is not self.schema:
+            self.validated_schema = self.schema
+            self.validated_queries = set()
+
+        if id(document) not in self.validated_queries:
+            super().validate(document)
+            self.validated_queries.add(id(document))
+
+        return
+
+    def open(self):
+        """Connect once and keep the session open until close() is called."""
+
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+            self.loop_thread.start()
+            try:
+                self.persistent_session = self.run(self.connect_async())
+            except Exception:
+                self.stop_loop()
+                raise
+
+        self.open_count += 1
+
+        return self
+
+    def close(self):
+        """Close the persistent session and stop the background event loop,
+        once every open has been closed."""
+
+        self.open_count = max(self.open_count - 1, 0)
+
+        if self.loop is not None and self.open_count == 0:
+            try:
+                self.run(self.close_async())
+            finally:
+                self.stop_loop()
+                # write the lookups cached while the client was open, once
+                if self.resolution_cache is not None:
+                    self.resolution_cache.flush()
+
+        return
+
+    def stop_loop(self):
+        """Stop and clean up the background event loop."""
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join()
+        self.loop.close()
+        self.loop = None
+        self.loop_thread = None
+        self.persistent_session = None
+
+    def run(self, coro):
+        """Run a coroutine on the background event loop and wait for the result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def execute(self, document, *args, **kwargs):
+        """Execute a document, on the persistent session if the client is open."""
+
+        if self.persistent_session is not None:
+            return self.run(self.persistent_session.execute(document, *args, **kwargs))
+
+        return super().execute(document, *args, **kwargs)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *args):
+        self.close()
+
+
+DEFAULT_CLIENT = None
+DEFAULT_CLIENT_LOCK = threading.Lock()
+
+
+def get_default_client():
+    """Get the shared client used when a query function is not given one.
+    The client is opened on first use and closed when the interpreter exits."""
+
+    global DEFAULT_CLIENT
+
+    with DEFAULT_CLIENT_LOCK:
+        if DEFAULT_CLIENT is None:
+            DEFAULT_CLIENT = create_gql_client().open()
+            atexit.register(DEFAULT_CLIENT.close)
+
+    return DEFAULT_CLIENT
+
+
+def get_api_credential():
+    """Get api token from credential file."""
+    config = configparser.ConfigParser()
+    config.read(os.path.join(os.path.expanduser("~"), ".dewrangle", "credentials"))
+    return config["default"]["api_key"]
+
+
+def check_mutation_result(result, raise_errors=True):
+    """Check the result of a mutation and handle error(s).
+    With raise_errors=False, the errors of each mutation in a bulk request are
+    returned instead of raised, as a dictionary of alias: error message, so one
+    failed mutation doesn't abort the rest of the batch."""
+
+    errors = {}
+
+    for my_key in result:
+        if result[my_key] is None:
+            errors[my_key] = "No result returned for mutation"
+            if raise_errors:
+                raise RuntimeError(
+                    "No result returned for mutation {}".format(my_key)
+                )
+            continue
+        my_error = result[my_key]["errors"]
+        if my_error:
+            errors[my_key] = "; ".join(
+                "{}: {}".format(error["field"], error["message"])
+                if error.get("field")
+                else str(error.get("message", error))
+                for error in my_error
+            )
+            if raise_errors:
+                raise RuntimeError(
+                    "The following error occurred when running mutation:\n{}".format(
+                        my_error
+                    )
+                )
+
+    return errors
+
+
+def pick_external_id(name, externals, external_type):
+    """From a dictionary of either credential or billing group ids, pick the one to use."""
+
+    ext_id = None
+
+    org = "other"
+    if external_type.lower() == "billing_group":
+        org = "organization"
+    elif external_type.lower() == "credential":
+        org = "study"
+
+    message = ""
+
+    if len(externals) == 1 and name is None:
+        ((ext_id, info),) = externals.items()
+        print("Only one {} available: {}".format(external_type, info["name"]))
+        ext_id = list(externals.keys())[0]
+    elif name:
+        for ext in externals:
+            if name == externals[ext]["name"]:
+                ext_id = ext
+        if ext_id is None:
+            message = "{} {} not found in {}".format(
+                external_type.capitalize(), name, org
+            )
+    elif len(externals) == 0:
+        message = "No credentials in study."
+    else:
+        message = "Multiple {} found in {} but none provided. Please run again and provide one of the following crdentials ids:{}{}".format(
+            external_type, org, "\n", externals
+        )
+
+    if ext_id is None:
+        raise ValueError(message)
+
+    return ext_id
+
+
+class StudyContext:
+    """What loading and hashing a volume needs to know about a study: its organization,
+    the organization's billing groups, and the volumes and credentials in the study.
+    Billing groups and credentials are dictionaries of id: {"name", ...}, volumes of id: name."""
+
+    def __init__(self, study_id, org_id, billing_groups, volumes, credentials):
+        self.study_id = study_id
+        self.org_id = org_id
+        self.billing_groups = billing_groups
+        self.volumes = volumes
+        self.credentials = credentials
+
+    def billing_id(self, billing=None):
+        """Get billing group id. If a name is provided, check it exists. If not return org default."""
+        return pick_external_id(billing, self.billing_groups, "billing_group")
+
+    def cred_id(self, cred_name=None):
+        """Get credential id"""
+        return pick_external_id(cred_name, self.credentials, "credential")
+
+    def volume_id(self, volume_name):
+        """Get the id of a volume loaded to the study, or None if it isn't."""
+        return process_volumes(self.study_id, self.volumes, vname=volume_name)
+
+
+def process_volumes(study, volumes, **kwargs):
+    """Check if a volume is already loaded to a study.
+    Inputs: study id, dictionary of volumes in the study, optionally volume name or volume id.
+    Outputs: volume id"""
+    volume_id = kwargs.get("vid", None)
+    vname = kwargs.get("vname", None)
+
+    if volume_id:
+        if volume_id not in volumes.keys():
+            raise ValueError(
+                "Volume id not present in study. Ensure you are providing the whole volume id."
+            )
+    else:
+        # see how many times the volume was added to the study
+        matching_volumes = []
+        for vol in volumes:
+            if volumes[vol] == vname:
+                matching_volumes.append(vol)
+        count = len(matching_volumes)
+
+        if count == 0:
+            print("{} volume not found in {}".format(vname, study))
+        elif count == 1:
+            volume_id = matching_volumes[0]
+        else:
+            print(
+                "=============================================================================================="
+            )
+            print("Multiple volumes named {} found in {}".format(vname, study))
+            print(
+                "Rerun this script using the '--vid' option with the volume id of the volume you want to delete"
+            )
+            print("Matching volumes and ids are:")
+            for mvol in matching_volumes:
+                print("{}: {}".format(vname, mvol))
+            print(
+                "=============================================================================================="
+            )
+
+    return volume_id
+
+
+def create_gql_client(
+    endpoint=None,
+    api_key=None,
+    schema="cache",
+    pool_size=100,
+    keepalive_timeout=30,
+    cache_ttl=RESOLUTION_TTL,
+    cache_to_disk=False,
+    result_cache_size=RESULT_CACHE_SIZE,
+    volume_index_to_disk=True,
+):
+    """Create GraphQL client connection.
+    Name to id lookups (organizations, studies, billing groups, credentials, volumes)
+    are cached for cache_ttl seconds, and with cache_to_disk also stored under
+    ~/.dewrangle/cache/resolution so later runs can reuse them.
+    Completed job results are cached under ~/.dewrangle/cache/results, up to
+    result_cache_size bytes (0 turns the result cache off).
+    The studies each volume name is loaded in are indexed for get_study_from_volume,
+    with volume_index_to_disk under ~/.dewrangle/cache/volumes (the default).
+    Use the client as a context manager to keep one pooled session open for its lifetime,
+    with at most pool_size connections kept alive for keepalive_timeout seconds.
+    schema sets where queries are validated from:
+    "cache" - schema fetched and cached under ~/.dewrangle/schema, refreshed in the background,
+    queries aren't validated until it is cached (default)
+    "fetch" - introspection query every time the client connects
+    None - skip schema validation entirely"""
+
+    # default endpoint
+    if endpoint is None:
+        endpoint = "https://dewrangle.com/api/graphql"
+
+    if not api_key:
+        api_key = get_api_credential()
+
+    req_header = {"X-Api-Key": api_key}
+
+    transport = PooledAIOHTTPTransport(
+        url=endpoint,
+        pool_size=pool_size,
+        keepalive_timeout=keepalive_timeout,
+        headers=req_header,
+    )
+
+    cache_path = None
+    if cache_to_disk:
+        cache_path = resolution_cache_path(endpoint, api_key)
+    resolution_cache = ResolutionCache(cache_ttl, cache_path)
+
+    result_cache = None
+    if result_cache_size:
+        result_cache = ResultCache(max_size=result_cache_size, namespace=endpoint)
+
+    index_path = None
+    if volume_index_to_disk:
+        index_path = volume_index_path(endpoint, api_key)
+    volume_index = VolumeIndex(index_path)
+
+    sdl = None
+    if schema == "cache":
+        sdl = load_schema_sdl(endpoint, api_key)
+    elif schema not in ["fetch", None]:
+        raise ValueError("Unsupported schema option: {}".format(schema))
+
+    if schema == "fetch":
+        client = DewrangleGqlClient(
+            transport=transport,
+            fetch_schema_from_transport=True,
+            resolution_cache=resolution_cache,
+            result_cache=result_cache,
+            volume_index=volume_index,
+        )
+    elif sdl is None:
+        # no validation until a schema fetched from the server is cached
+        client = DewrangleGqlClient(
+            transport=transport,
+            resolution_cache=resolution_cache,
+            result_cache=result_cache,
+            volume_index=volume_index,
+        )
+    else:
+        client = DewrangleGqlClient(
+            schema=build_cached_schema(sdl),
+            transport=transport,
+            resolution_cache=resolution_cache,
+            result_cache=result_cache,
+            volume_index=volume_index,
+        )
+
+    return client
+
+
+def create_rest_creds(endpoint=None, api_key=None):
+    """Create Rest connection"""
+
+    # default endpoint
+    if endpoint is None:
+        endpoint = "https://dewrangle.com/api/rest/jobs/"
+
+    if api_key:
+        req_header = {"X-Api-Key": api_key}
+    else:
+        req_header = {"X-Api-Key": get_api_credential()}
+
+    return endpoint, req_header
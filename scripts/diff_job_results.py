@@ -0,0 +1,8 @@
+"""Diff the hash results of two Dewrangle jobs of the same volume"""
+import sys
+from dewrangle.scripts.diff_job_results import main
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main(sys.argv)
@@ -0,0 +1,8 @@
+"""List ids for a study."""
+import sys
+from dewrangle.scripts.list_study_id import main
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main(sys.argv)